@@ -1,12 +1,35 @@
-from services.data_processing import process_player_match_history
-from flask import Flask, render_template, redirect, url_for, request, jsonify
+from services.data_processing import process_player_match_history, attribute_lp_changes, build_post_game_index, previous_post_game
+from services.leaderboard_snapshot import LeaderboardSnapshot, SNAPSHOT_VACIO, descongelar
+from services.leaderboard_events import DifusorClasificacion, SSE_HEARTBEAT, SSE_MAX_CONNECTION, SSE_RETRY_MS
+from services.warm_cache import guardar_cache, cargar_cache, cargar_json_repo, fecha_modificacion_cache
+from services.ddragon_cache import guardar_ddragon, cargar_ddragon, marcar_comprobado
+from services.scheduler import intentar_liderazgo, iniciar_hilo
+from services.cache_backend import crear_backend
+from services.timeseries import serie_para_grafico
+from services.window_aggregates import obtener_agregados
+from services.streaks import EstadoRachas, reconstruir_rachas, rachas_jugador
+from services.records import RecordTracker, RECORD_KEYS, RECORDS_NA_SI_CERO
+from services.match_merge import pagina_fusionada, decodificar_cursor, fusionar
+from services.history_buckets import AlmacenSemanas, agrupar_por_semana
+from services.render_cache import CacheRender
+from services.fragment_cache import CacheFragmentos
+from services.compression import elegir_codificacion, comprimir, es_comprimible, variante_fichero, COMPRESSIBLE_MIMETYPES
+from services.static_assets import localizar_recurso, huella_recurso, url_remota, ASSET_MAX_AGE
+from services.icon_mirror import EspejoIconos
+from services.image_variants import es_imagen, anchos_variantes, elegir_formato, obtener_variante, IMAGE_MIMETYPES
+from services.data_versions import RegistroVersiones
+from services.aggregation import agregar_por_grupos, clasificador_por_cola, filtrar_clasificador
+from services.champion_aggregates import actualizar_campeones, filas_campeones, guardar_tabla_campeones, cargar_tabla_campeones
+from services.lp_store import (normalizar_historial, expandir_historial, anadir_snapshot, fusionar_historiales,
+                               nombre_segmento, snapshot_antes, LP_SEGMENTS_DIR)
+from flask import Flask, Response, render_template, redirect, url_for, request, jsonify, send_file, make_response
 import requests
 import os
 import time
 import threading
 import json
 import base64
-import bisect
+import hashlib
 from datetime import datetime, timedelta, timezone
 from collections import Counter, defaultdict
 from concurrent.futures import ThreadPoolExecutor
@@ -18,7 +41,101 @@ app = Flask(__name__)
 # Inyectar 'str' en el contexto de Jinja2 para que esté disponible en todas las plantillas.
 @app.context_processor
 def utility_processor():
-    return dict(str=str)
+    return dict(str=str, asset_url=asset_url, image_srcset=image_srcset)
+
+
+def asset_url(ruta):
+    """
+    URL con huella de contenido de un recurso del repositorio (p. ej. 'banners/Banner5.png'),
+    servida con caché inmutable. Si el fichero no está en este despliegue se usa la copia de GitHub.
+    """
+    ruta_abs = localizar_recurso(ruta)
+    if ruta_abs is None:
+        return url_remota(ruta)
+    return url_for('asset', huella=huella_recurso(ruta_abs), ruta=ruta)
+
+
+@app.route('/assets/<huella>/<path:ruta>')
+def asset(huella, ruta):
+    """Sirve un recurso estático con caché inmutable (y precomprimido si es texto)."""
+    ruta_abs = localizar_recurso(ruta)
+    if ruta_abs is None:
+        return render_template('404.html'), 404
+    actual = huella_recurso(ruta_abs)
+    if huella != actual:
+        # Enlace a una versión anterior del fichero: se redirige a la actual sin caché larga
+        return redirect(url_for('asset', huella=actual, ruta=ruta))
+
+    return _servir_inmutable(ruta_abs)
+
+
+def _servir_inmutable(ruta_abs):
+    """Respuesta para un fichero cuya URL cambia con su contenido: caché de un año y variante comprimida si es texto."""
+    respuesta = send_file(ruta_abs, conditional=True, max_age=ASSET_MAX_AGE)
+    codificacion = elegir_codificacion(request.headers.get('Accept-Encoding', ''))
+    if (codificacion and respuesta.status_code == 200
+            and es_comprimible(respuesta.mimetype, os.path.getsize(ruta_abs))):
+        respuesta.direct_passthrough = False
+        respuesta.set_data(variante_fichero(ruta_abs, os.path.getmtime(ruta_abs), codificacion))
+        respuesta.headers['Content-Encoding'] = codificacion
+    if respuesta.mimetype in COMPRESSIBLE_MIMETYPES:
+        respuesta.vary.add('Accept-Encoding')
+    respuesta.headers['Cache-Control'] = f'public, max-age={ASSET_MAX_AGE}, immutable'
+    return respuesta
+
+
+def image_srcset(ruta):
+    """
+    Valor del atributo `srcset` de una imagen del repositorio, con una URL por ancho disponible.
+    Vacío (el navegador usa `src`) si no hay Pillow o la imagen no está en este despliegue.
+    """
+    ruta_abs = localizar_recurso(ruta) if es_imagen(ruta) else None
+    if ruta_abs is None:
+        return ''
+    huella = huella_recurso(ruta_abs)
+    return ', '.join(f"{url_for('imagen', huella=huella, ancho=ancho, ruta=ruta)} {ancho}w"
+                     for ancho in anchos_variantes(ruta_abs))
+
+
+@app.route('/img/<huella>/<int:ancho>/<path:ruta>')
+def imagen(huella, ancho, ruta):
+    """Sirve una variante redimensionada de una imagen, en AVIF/WebP si el navegador los acepta."""
+    ruta_abs = localizar_recurso(ruta) if es_imagen(ruta) else None
+    if ruta_abs is None:
+        return render_template('404.html'), 404
+    actual = huella_recurso(ruta_abs)
+    anchos = anchos_variantes(ruta_abs)
+    if huella != actual or ancho not in anchos:
+        # Versión anterior del fichero, ancho no ofrecido o sin Pillow: al original, sin caché larga
+        return redirect(url_for('asset', huella=actual, ruta=ruta))
+
+    formato = elegir_formato(request.headers.get('Accept', ''), ruta_abs)
+    fichero = obtener_variante(ruta, ruta_abs, actual, ancho, formato)
+    if fichero is None:
+        return redirect(url_for('asset', huella=actual, ruta=ruta))
+    respuesta = send_file(fichero, mimetype=IMAGE_MIMETYPES[formato], conditional=True, max_age=ASSET_MAX_AGE)
+    respuesta.vary.add('Accept')
+    respuesta.headers['Cache-Control'] = f'public, max-age={ASSET_MAX_AGE}, immutable'
+    return respuesta
+
+
+@app.after_request
+def comprimir_respuesta(response):
+    """Comprime (br/gzip) las respuestas dinámicas de texto según el Accept-Encoding del cliente."""
+    if (response.direct_passthrough or response.is_streamed or response.status_code != 200
+            or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+    response.vary.add('Accept-Encoding')
+    datos = response.get_data()
+    codificacion = elegir_codificacion(request.headers.get('Accept-Encoding', ''))
+    if not codificacion or not es_comprimible(response.mimetype, len(datos)):
+        return response
+    response.set_data(comprimir(datos, codificacion))
+    response.headers['Content-Encoding'] = codificacion
+    etag, debil = response.get_etag()
+    if etag and not debil:
+        response.set_etag(etag, weak=True) # Otra representación del mismo recurso
+    return response
 
 # --- CONFIGURACIÓN DE ZONA HORARIA Y LOCALIZACIÓN ---
 # Define la zona horaria de visualización (UTC+2) para asegurar consistencia.
@@ -181,18 +298,23 @@ BASE_URL_DDRAGON = "https://ddragon.leagueoflegends.com"
 LP_HISTORY_FILE_PATH = "lp_history.json"
 
 # Caché para almacenar los datos de los jugadores principales (resumen de ELO)
+# Los datos viven en una instantánea inmutable y versionada (LEADERBOARD_SNAPSHOT) que se
+# sustituye con una sola asignación en cada ciclo; los lectores no necesitan bloqueo.
 cache = {
-    "datos_jugadores": [],
-    "timestamp": 0
+    "update_count": 0
 }
 CACHE_TIMEOUT = 130  # 2 minutos para el resumen principal de jugadores
-cache_lock = threading.Lock()
+cache_lock = threading.Lock() # Solo protege a los escritores (contador y publicación)
+LEADERBOARD_SNAPSHOT = SNAPSHOT_VACIO
+DIFUSOR_CLASIFICACION = DifusorClasificacion() # Deltas de cada instantánea para los clientes SSE
 
 # Global cache for pre-calculated global statistics
 GLOBAL_STATS_CACHE = {
     "data": None,
     "all_matches": [],
-    "timestamp": 0
+    "champion_list": [],
+    "timestamp": 0,
+    "version": 0
 }
 GLOBAL_STATS_LOCK = threading.Lock()
 GLOBAL_STATS_UPDATE_INTERVAL = 3600 # Update global stats every hour (3600 seconds)
@@ -200,7 +322,8 @@ GLOBAL_STATS_UPDATE_INTERVAL = 3600 # Update global stats every hour (3600 secon
 # --- CACHÉ PARA PEAK ELO ---
 PEAK_ELO_CACHE = {
     "data": {},
-    "timestamp": 0
+    "timestamp": 0,
+    "version": 0
 }
 PEAK_ELO_LOCK = threading.Lock()
 PEAK_ELO_TTL = 300 # 5 minutos de caché para evitar saturar la API
@@ -208,16 +331,20 @@ PEAK_ELO_TTL = 300 # 5 minutos de caché para evitar saturar la API
 # Cache for pre-calculated personal records
 PERSONAL_RECORDS_CACHE = {
     "data": {},
-    "timestamp": 0
+    "timestamp": 0,
+    "version": 0
 }
 PERSONAL_RECORDS_LOCK = threading.Lock()
 PERSONAL_RECORDS_UPDATE_INTERVAL = 3600 # Update personal records every hour (3600 seconds)
 
-# --- NUEVA CACHÉ EN MEMORIA PARA EL HISTORIAL DE PARTIDAS DE LOS JUGADORES ---
-# Almacena el historial completo de partidas por PUUID en memoria.
-# { puuid: { 'data': historial_json, 'timestamp': last_update_time } }
-PLAYER_MATCH_HISTORY_CACHE = {}
+# --- CACHÉ PARA EL HISTORIAL DE PARTIDAS DE LOS JUGADORES ---
+# Almacena el historial completo de partidas por PUUID: puuid -> { 'data': historial_json, 'timestamp': last_update_time }
+# En memoria por defecto; con CACHE_BACKEND=sqlite se comparte entre todos los workers.
+PLAYER_MATCH_HISTORY_CACHE = crear_backend('match_history')
 PLAYER_MATCH_HISTORY_LOCK = threading.Lock()
+
+# Versiones de los datos derivados, para ETags y respuestas 304 (ver services/data_versions.py)
+DATA_VERSIONS = RegistroVersiones()
 PLAYER_MATCH_HISTORY_CACHE_TIMEOUT = 300 # 5 minutos para el historial de partidas individual
 
 # --- CONFIGURACIÓN DE SPLITS ---
@@ -231,6 +358,46 @@ SPLITS = {
 ACTIVE_SPLIT_KEY = "s16_split1"
 SEASON_START_TIMESTAMP = int(SPLITS[ACTIVE_SPLIT_KEY]["start_date"].timestamp())
 
+# --- REFRESCOS EN SEGUNDO PLANO (stale-while-revalidate) ---
+# Evita lanzar dos refrescos simultáneos de la misma caché.
+BACKGROUND_REFRESH_IN_FLIGHT = set()
+BACKGROUND_REFRESH_LOCK = threading.Lock()
+REFRESCOS_PERMITIDOS_SEGUIDOR = {'ddragon'} # Refrescos que cada proceso hace por su cuenta
+
+def _es_proceso_lider():
+    """
+    True si este proceso persiste las cachés compartidas: el líder, o el único proceso cuando
+    no hay hilos de fondo. Los seguidores guardan sus cálculos solo en memoria.
+    """
+    return BACKGROUND_JOBS_STATE['rol'] != 'seguidor'
+
+def _refrescar_en_segundo_plano(nombre, objetivo, *args):
+    """
+    Lanza `objetivo(*args)` en un hilo demonio si no hay ya un refresco en curso con ese nombre.
+    Permite servir datos cacheados (aunque estén caducados) mientras se recalculan.
+    """
+    if not _es_proceso_lider() and nombre not in REFRESCOS_PERMITIDOS_SEGUIDOR:
+        # El líder recalcula y persiste esta caché; el seguidor la recarga de disco.
+        return False
+    with BACKGROUND_REFRESH_LOCK:
+        if nombre in BACKGROUND_REFRESH_IN_FLIGHT:
+            return False
+        BACKGROUND_REFRESH_IN_FLIGHT.add(nombre)
+
+    def _ejecutar():
+        try:
+            objetivo(*args)
+        except Exception as e:
+            print(f"[_refrescar_en_segundo_plano] Error refrescando '{nombre}': {e}")
+        finally:
+            with BACKGROUND_REFRESH_LOCK:
+                BACKGROUND_REFRESH_IN_FLIGHT.discard(nombre)
+
+    hilo = threading.Thread(target=_ejecutar, daemon=True)
+    hilo.start()
+    print(f"[_refrescar_en_segundo_plano] Refresco de '{nombre}' lanzado en segundo plano.")
+    return True
+
 # --- CONFIGURACIÓN DEL CONTROL DE TASA DE API ---
 API_REQUEST_QUEUE = queue.Queue() # Cola para todas las peticiones a la API
 API_RESPONSE_EVENTS = {} # Diccionario para almacenar eventos de respuesta por ID de petición
@@ -333,11 +500,22 @@ def _api_rate_limiter_worker():
             print(f"[_api_rate_limiter_worker] Error inesperado en el worker del control de tasa: {e}")
             time.sleep(1) # Espera antes de continuar para evitar bucles de error
 
+RATE_LIMITER_STATE = {'hilo': None}
+RATE_LIMITER_START_LOCK = threading.Lock()
+
+def _asegurar_rate_limiter():
+    """Arranca (una vez por proceso) el hilo que vacía la cola de peticiones a la API de Riot."""
+    with RATE_LIMITER_START_LOCK:
+        hilo = RATE_LIMITER_STATE['hilo']
+        if hilo is None or not hilo.is_alive():
+            RATE_LIMITER_STATE['hilo'] = iniciar_hilo('api_rate_limiter_thread', _api_rate_limiter_worker)
+
 # Modificación de make_api_request para usar la cola
 def make_api_request(url, retries=3, backoff_factor=0.5, is_spectator_api=False):
     """
     Envía una petición a la cola de la API y espera su respuesta, respetando el control de tasa.
     """
+    _asegurar_rate_limiter()
     with REQUEST_ID_COUNTER_LOCK:
         global REQUEST_ID_COUNTER
         request_id = REQUEST_ID_COUNTER
@@ -372,33 +550,39 @@ def make_api_request(url, retries=3, backoff_factor=0.5, is_spectator_api=False)
     
     return response
 
-DDRAGON_VERSION = "14.9.1"
-
-def actualizar_version_ddragon():
-    global DDRAGON_VERSION
-    print("[actualizar_version_ddragon] Intentando obtener la última versión de Data Dragon.")
+DDRAGON_VERSION = "14.9.1" # Versión de respaldo hasta cargar la caché de disco
+DDRAGON_CHECK_INTERVAL = 6 * 3600 # Cada cuánto se comprueba si hay un parche nuevo
+DDRAGON_RETRY_INTERVAL = 300 # Reintento más frecuente mientras no haya datos
+DDRAGON_STATE = {'cargado': False, 'checked_at': 0}
+DDRAGON_LOCK = threading.Lock()
+# Copia local de los iconos del parche actual (ver services/icon_mirror.py); la descarga la hace el líder
+ICONOS = EspejoIconos()
+ICON_MIRROR_RETRY_INTERVAL = 1800
+ICON_MIRROR_STATE = {'intentos': {}} # versión -> momento del último intento de copia
+ICON_MACROS_TEMPLATE = '_iconos.html'
+
+def obtener_ultima_version_ddragon():
+    """Devuelve la última versión publicada de Data Dragon, o None si no se pudo obtener."""
+    print("[obtener_ultima_version_ddragon] Intentando obtener la última versión de Data Dragon.")
     try:
         url = f"{BASE_URL_DDRAGON}/api/versions.json"
         # Esta llamada no usa make_api_request porque es una API diferente (DDragon, no Riot Games)
         response = requests.get(url, timeout=5) 
         if response.status_code == 200:
-            DDRAGON_VERSION = response.json()[0]
-            print(f"[actualizar_version_ddragon] Versión de Data Dragon establecida a: {DDRAGON_VERSION}")
-        else:
-            print(f"[actualizar_version_ddragon] Error al obtener la versión de Data Dragon. Status: {response.status_code}. Usando versión de respaldo: {DDRAGON_VERSION}")
-    except requests.exceptions.RequestException as e:
-        print(f"[actualizar_version_ddragon] Error al obtener la versión de Data Dragon: {e}. Usando versión de respaldo: {DDRAGON_VERSION}")
-
-actualizar_version_ddragon()
+            return response.json()[0]
+        print(f"[obtener_ultima_version_ddragon] Error al obtener la versión de Data Dragon. Status: {response.status_code}.")
+    except (requests.exceptions.RequestException, ValueError, IndexError) as e:
+        print(f"[obtener_ultima_version_ddragon] Error al obtener la versión de Data Dragon: {e}.")
+    return None
 
 ALL_CHAMPIONS = {} # ID to Name (e.g., {266: 'Aatrox'})
 ALL_CHAMPION_NAMES_TO_IDS = {} # Name to ID (e.g., {'Aatrox': 266})
 ALL_RUNES = {}
 ALL_SUMMONER_SPELLS = {}
 
-def obtener_todos_los_campeones():
+def obtener_todos_los_campeones(version=None):
     print("[obtener_todos_los_campeones] Obteniendo datos de campeones de Data Dragon.")
-    url_campeones = f"{BASE_URL_DDRAGON}/cdn/{DDRAGON_VERSION}/data/es_ES/champion.json"
+    url_campeones = f"{BASE_URL_DDRAGON}/cdn/{version or DDRAGON_VERSION}/data/es_ES/champion.json"
     # Esta llamada no usa make_api_request porque es una API diferente (DDragon, no Riot Games)
     response = requests.get(url_campeones, timeout=10) 
     if response and response.status_code == 200:
@@ -408,10 +592,10 @@ def obtener_todos_los_campeones():
     print("[obtener_todos_los_campeones] No se pudieron obtener los datos de campeones.")
     return {}
 
-def obtener_todas_las_runas():
+def obtener_todas_las_runas(version=None):
     """Carga los datos de las runas desde Data Dragon."""
     print("[obtener_todas_las_runas] Obteniendo datos de runas de Data Dragon.")
-    url = f"{BASE_URL_DDRAGON}/cdn/{DDRAGON_VERSION}/data/es_ES/runesReforged.json"
+    url = f"{BASE_URL_DDRAGON}/cdn/{version or DDRAGON_VERSION}/data/es_ES/runesReforged.json"
     # Esta llamada no usa make_api_request porque es una API diferente (DDragon, no Riot Games)
     data = requests.get(url, timeout=10)
     runes = {}
@@ -426,10 +610,10 @@ def obtener_todas_las_runas():
         print("[obtener_todas_las_runas] No se pudieron obtener los datos de runas.")
     return runes
 
-def obtener_todos_los_hechizos():
+def obtener_todos_los_hechizos(version=None):
     """Carga los datos de los hechizos de invocador desde Data Dragon."""
     print("[obtener_todos_los_hechizos] Obteniendo datos de hechizos de invocador de Data Dragon.")
-    url = f"{BASE_URL_DDRAGON}/cdn/{DDRAGON_VERSION}/data/es_ES/summoner.json"
+    url = f"{BASE_URL_DDRAGON}/cdn/{version or DDRAGON_VERSION}/data/es_ES/summoner.json"
     # Esta llamada no usa make_api_request porque es una API diferente (DDragon, no Riot Games)
     data = requests.get(url, timeout=10)
     spells = {}
@@ -441,28 +625,116 @@ def obtener_todos_los_hechizos():
         print("[obtener_todos_los_hechizos] No se pudieron obtener los datos de hechizos de invocador.")
     return spells
 
+def _aplicar_datos_ddragon(version, campeones, runas, hechizos):
+    """
+    Vuelca los datos de un parche en los diccionarios globales. Se actualizan in situ
+    (nunca se reasignan ni se vacían) para que los lectores no vean un mapa vacío.
+    """
+    global DDRAGON_VERSION
+    ALL_CHAMPIONS.update(campeones)
+    ALL_CHAMPION_NAMES_TO_IDS.update({v: k for k, v in ALL_CHAMPIONS.items()})
+    ALL_RUNES.update(runas)
+    ALL_SUMMONER_SPELLS.update(hechizos)
+    DDRAGON_VERSION = version
+
 def actualizar_ddragon_data():
-    """Actualiza todos los datos de DDragon (campeones, runas, hechizos) en las variables globales."""
-    global DDRAGON_VERSION, ALL_CHAMPIONS, ALL_RUNES, ALL_SUMMONER_SPELLS, ALL_CHAMPION_NAMES_TO_IDS
-    print("[actualizar_ddragon_data] Iniciando actualización de todos los datos de Data Dragon.")
-    actualizar_version_ddragon() # Asegura que la versión de DDRAGON sea la más reciente
-    
-    # Update ALL_CHAMPIONS (ID to Name)
-    ALL_CHAMPIONS_TEMP = obtener_todos_los_campeones()
-    ALL_CHAMPIONS.update(ALL_CHAMPIONS_TEMP) # Use .update() to ensure it's populated
+    """
+    Comprueba la última versión de Data Dragon y, si hay un parche nuevo (o faltan datos),
+    descarga campeones, runas y hechizos y los persiste en disco. Pensada para ejecutarse
+    en segundo plano: si la descarga falla se conservan los datos actuales.
+    """
+    print("[actualizar_ddragon_data] Comprobando si hay una versión nueva de Data Dragon.")
+    ultima_version = obtener_ultima_version_ddragon()
+    DDRAGON_STATE['checked_at'] = time.time()
+    if not ultima_version:
+        print(f"[actualizar_ddragon_data] Versión no disponible. Se mantiene la versión {DDRAGON_VERSION}.")
+        return
 
-    # Create ALL_CHAMPION_NAMES_TO_IDS (Name to ID)
-    ALL_CHAMPION_NAMES_TO_IDS.clear() # Clear before populating
-    ALL_CHAMPION_NAMES_TO_IDS.update({v: k for k, v in ALL_CHAMPIONS.items()})
-    print(f"[actualizar_ddragon_data] ALL_CHAMPION_NAMES_TO_IDS cargado. Ejemplo: {list(ALL_CHAMPION_NAMES_TO_IDS.items())[:5]}")
+    if ultima_version == DDRAGON_VERSION and ALL_CHAMPIONS and ALL_RUNES and ALL_SUMMONER_SPELLS:
+        print(f"[actualizar_ddragon_data] Los datos de Data Dragon ya están en la versión {DDRAGON_VERSION}.")
+        marcar_comprobado(DDRAGON_VERSION, DDRAGON_STATE['checked_at'])
+        return
+
+    try:
+        campeones = obtener_todos_los_campeones(ultima_version)
+        runas = obtener_todas_las_runas(ultima_version)
+        hechizos = obtener_todos_los_hechizos(ultima_version)
+    except (requests.exceptions.RequestException, ValueError, KeyError) as e:
+        print(f"[actualizar_ddragon_data] Error descargando los datos de la versión {ultima_version}: {e}")
+        return
+    if not campeones or not runas or not hechizos:
+        print(f"[actualizar_ddragon_data] Datos incompletos para la versión {ultima_version}. Se conservan los actuales.")
+        return
+
+    with DDRAGON_LOCK:
+        _aplicar_datos_ddragon(ultima_version, campeones, runas, hechizos)
+    guardar_ddragon(ultima_version, campeones, runas, hechizos, DDRAGON_STATE['checked_at'])
+    print(f"[actualizar_ddragon_data] Datos de Data Dragon actualizados a la versión {ultima_version}.")
+
+def asegurar_datos_ddragon(bloqueante=False):
+    """
+    Carga perezosa de Data Dragon: en la primera llamada lee la caché de disco (sin red) y,
+    si no hay datos o ha pasado el intervalo de comprobación, lanza el refresco en segundo plano.
+    Es barata tras la primera llamada, así que se invoca antes de cada uso.
+    Con bloqueante=True (hilos de fondo que procesan partidas) se descarga en el acto si no hay datos.
+    """
+    if not DDRAGON_STATE['cargado']:
+        with DDRAGON_LOCK:
+            if not DDRAGON_STATE['cargado']:
+                datos = cargar_ddragon()
+                if datos:
+                    _aplicar_datos_ddragon(datos['version'], datos['champions'], datos['runes'], datos['summoner_spells'])
+                    DDRAGON_STATE['checked_at'] = datos['checked_at']
+                    print(f"[asegurar_datos_ddragon] Datos de Data Dragon {DDRAGON_VERSION} cargados desde disco.")
+                DDRAGON_STATE['cargado'] = True
+
+    if bloqueante and not (ALL_CHAMPIONS and ALL_RUNES and ALL_SUMMONER_SPELLS):
+        actualizar_ddragon_data()
+        return
+
+    intervalo = DDRAGON_CHECK_INTERVAL if ALL_CHAMPIONS else DDRAGON_RETRY_INTERVAL
+    if time.time() - DDRAGON_STATE['checked_at'] > intervalo:
+        _refrescar_en_segundo_plano('ddragon', actualizar_ddragon_data)
+
+    version = DDRAGON_VERSION
+    if (ALL_CHAMPIONS and not ICONOS.completa(version)
+            and time.time() - ICON_MIRROR_STATE['intentos'].get(version, 0) > ICON_MIRROR_RETRY_INTERVAL):
+        if _refrescar_en_segundo_plano('iconos', ICONOS.sincronizar, version):
+            ICON_MIRROR_STATE['intentos'][version] = time.time()
+
+@app.before_request
+def _asegurar_ddragon_antes_de_peticion():
+    asegurar_datos_ddragon()
 
 
-    ALL_RUNES = obtener_todas_las_runas()
-    ALL_SUMMONER_SPELLS = obtener_todos_los_hechizos()
-    print("[actualizar_ddragon_data] Data Dragon champion, rune, and summoner spell data updated.")
+def _version_iconos():
+    """Versión de Data Dragon, estado de su copia local y huella de las macros de iconos, para las claves de las cachés de HTML."""
+    return (DDRAGON_VERSION, ICONOS.estado(DDRAGON_VERSION), _huella_plantilla(ICON_MACROS_TEMPLATE))
 
-# Cargar los datos de DDragon al inicio
-actualizar_ddragon_data()
+
+@app.template_global('icono_ddragon')
+def icono_ddragon(categoria, clave):
+    """{'src', 'clase'} de un icono de Data Dragon: del atlas, de la copia local o del CDN de Riot."""
+    icono = ICONOS.icono(DDRAGON_VERSION, categoria, clave)
+    if icono['fichero']:
+        return {'src': url_for('icono_local', version=DDRAGON_VERSION, fichero=icono['fichero']), 'clase': ''}
+    return icono
+
+
+@app.template_global('iconos_css_url')
+def iconos_css_url():
+    """URL de la hoja CSS de los atlas de iconos del parche actual, o None si aún no hay atlas."""
+    css = ICONOS.css(DDRAGON_VERSION)
+    return url_for('icono_local', version=DDRAGON_VERSION, fichero=css) if css else None
+
+
+@app.route('/iconos/<version>/<path:fichero>')
+def icono_local(version, fichero):
+    """Sirve un icono, atlas u hoja CSS de la copia local de Data Dragon (inmutables por versión)."""
+    ruta_abs = ICONOS.ruta(version, fichero)
+    if ruta_abs is None:
+        return render_template('404.html'), 404
+    return _servir_inmutable(ruta_abs)
 
 
 
@@ -799,12 +1071,36 @@ def calcular_valor_clasificacion(tier, rank, league_points):
 
     return valor_base_tier + valor_division + league_points
 
-def leer_peak_elo():
-    """Lee los datos de peak Elo desde la API de GitHub para evitar caché de CDN."""
+def descomponer_valor_clasificacion(valor):
+    """
+    Inversa aproximada de calcular_valor_clasificacion: devuelve (tier, rank, league_points).
+    Por encima de 2800 no se distingue Master/Grandmaster/Challenger; se usan los mismos
+    umbrales que el gráfico de ELO del perfil.
+    """
+    if valor >= 2800:
+        tier = "CHALLENGER" if valor >= 3200 else "GRANDMASTER" if valor >= 3000 else "MASTER"
+        return tier, "I", valor - 2800
+    tiers = ["IRON", "BRONZE", "SILVER", "GOLD", "PLATINUM", "EMERALD", "DIAMOND"]
+    ranks = ["IV", "III", "II", "I"]
+    return tiers[min(valor // 400, 6)], ranks[(valor % 400) // 100], valor % 100
+
+def leer_peak_elo(permitir_obsoleto=False):
+    """
+    Lee los datos de peak Elo desde la API de GitHub para evitar caché de CDN.
+    Con `permitir_obsoleto=True` devuelve la caché aunque haya caducado y la refresca en segundo plano.
+    """
     # 1. Intentar leer de la caché local primero
     with PEAK_ELO_LOCK:
         if PEAK_ELO_CACHE['data'] and (time.time() - PEAK_ELO_CACHE['timestamp'] < PEAK_ELO_TTL):
             return True, PEAK_ELO_CACHE['data']
+        if permitir_obsoleto and PEAK_ELO_CACHE['data']:
+            datos_obsoletos = PEAK_ELO_CACHE['data']
+        else:
+            datos_obsoletos = None
+
+    if datos_obsoletos is not None:
+        _refrescar_en_segundo_plano('peak_elo', leer_peak_elo)
+        return True, datos_obsoletos
 
     # 2. Si no está en caché, leer de la API de GitHub
     url = "https://api.github.com/repos/Sepevalle/SoloQ-Cerditos/contents/peak_elo.json"
@@ -823,9 +1119,7 @@ def leer_peak_elo():
             data = json.loads(file_content)
             
             # Actualizar caché
-            with PEAK_ELO_LOCK:
-                PEAK_ELO_CACHE['data'] = data
-                PEAK_ELO_CACHE['timestamp'] = time.time()
+            _actualizar_cache_peak_elo(data)
                 
             print("[leer_peak_elo] Peak elo leído exitosamente desde API.")
             return True, data
@@ -846,8 +1140,26 @@ def leer_peak_elo():
 
     return False, {}
 
+def _actualizar_cache_peak_elo(data):
+    """
+    Actualiza la caché de peak Elo en memoria y, en el proceso líder, la persiste en disco
+    para el arranque en caliente y para los seguidores.
+    """
+    with PEAK_ELO_LOCK:
+        PEAK_ELO_CACHE['data'] = data
+        PEAK_ELO_CACHE['timestamp'] = time.time()
+        PEAK_ELO_CACHE['version'] += 1
+        version = PEAK_ELO_CACHE['version']
+        timestamp = PEAK_ELO_CACHE['timestamp']
+    if _es_proceso_lider():
+        guardar_cache('peak_elo', data, version, timestamp)
+
 def guardar_peak_elo_en_github(peak_elo_dict):
-    """Guarda o actualiza el archivo peak_elo.json en GitHub."""
+    """Guarda o actualiza el archivo peak_elo.json en GitHub (solo el proceso líder)."""
+    _actualizar_cache_peak_elo(peak_elo_dict)
+    if not _es_proceso_lider():
+        # El líder detectará el mismo pico en su siguiente cálculo y lo guardará
+        return
     url = "https://api.github.com/repos/Sepevalle/SoloQ-Cerditos/contents/peak_elo.json"
     token = os.environ.get('GITHUB_TOKEN')
     if not token:
@@ -908,19 +1220,61 @@ def leer_puuids():
     return {}
 
 # --- CACHÉ PARA LP HISTORY ---
-LP_HISTORY_CACHE = {
-    "data": {},
-    "timestamp": 0
-}
+# Compartida entre workers con CACHE_BACKEND=sqlite (clave única 'lp_history').
+LP_HISTORY_CACHE = crear_backend('lp_history')
 LP_HISTORY_LOCK = threading.Lock()
 LP_HISTORY_TTL = 300 # 5 minutos de caché
+LP_HISTORY_RELOAD_LOCK = threading.Lock() # Una sola recarga a la vez; el resto espera y usa su resultado
+# Segmentos de LP ya leídos y normalizados, por (ruta, sha). Un segmento no cambia después de
+# escribirse, así que en cada recarga solo se descargan los que no estaban.
+LP_SEGMENTS_PARSED = {}
+LP_SEGMENTS_PARSED_LOCK = threading.Lock()
 
 def leer_lp_history():
-    """Lee el archivo lp_history.json desde GitHub, con caché en memoria."""
+    """
+    Devuelve el historial de LP en la vista expandida {puuid: {cola: [snapshots]}}
+    que usa el cálculo de LP (ver leer_lp_history_tramos).
+    """
+    return expandir_historial(leer_lp_history_tramos())
+
+def leer_lp_history_tramos():
+    """
+    Lee el historial de LP desde GitHub, con caché en memoria: la base lp_history.json
+    más los segmentos aún no compactados de LP_SEGMENTS_DIR.
+    Devuelve el formato por tramos de services/lp_store: {puuid: {cola: [tramos]}}.
+    """
+    vigente = _lp_history_cacheado()
+    if vigente is not None:
+        return vigente
+
+    with LP_HISTORY_RELOAD_LOCK:
+        # Si otro hilo lo recargó mientras se esperaba, se usa su resultado
+        vigente = _lp_history_cacheado()
+        if vigente is not None:
+            return vigente
+        return _recargar_lp_history_tramos()
+
+def _lp_history_cacheado():
+    """Historial de LP cacheado si aún no ha caducado; None si hay que recargarlo."""
     with LP_HISTORY_LOCK:
-        if LP_HISTORY_CACHE['data'] and (time.time() - LP_HISTORY_CACHE['timestamp'] < LP_HISTORY_TTL):
-            return LP_HISTORY_CACHE['data']
+        cached = LP_HISTORY_CACHE.get('lp_history_runs')
+        if cached and cached['data'] and (time.time() - cached['timestamp'] < LP_HISTORY_TTL):
+            return cached['data']
+    return None
+
+def _huella_lp(colas):
+    """Huella barata de los tramos de LP de un jugador: nº de tramos y última observación por cola."""
+    return tuple((cola, len(tramos), tramos[-1]['last_seen'] if tramos else None)
+                 for cola, tramos in sorted(colas.items()))
 
+def _registrar_version_lp(puuid, colas):
+    """Confirma la versión de datos del historial de LP de un jugador. Devuelve su huella."""
+    huella = _huella_lp(colas)
+    DATA_VERSIONS.registrar(f"lp_history:{puuid}", huella)
+    return huella
+
+def _recargar_lp_history_tramos():
+    """Descarga la base y los segmentos nuevos y deja el resultado en LP_HISTORY_CACHE."""
     url = "https://api.github.com/repos/Sepevalle/SoloQ-Cerditos/contents/lp_history.json"
     token = os.environ.get('GITHUB_TOKEN')
     headers = {"Accept": "application/vnd.github.v3+json"}
@@ -933,24 +1287,31 @@ def leer_lp_history():
         if resp.status_code == 200:
             content = resp.json()
             file_content = base64.b64decode(content['content']).decode('utf-8')
-            data = json.loads(file_content)
-            with LP_HISTORY_LOCK:
-                LP_HISTORY_CACHE['data'] = data
-                LP_HISTORY_CACHE['timestamp'] = time.time()
-            print("[leer_lp_history] lp_history.json leído y cacheado exitosamente.")
-            return data
+            data = normalizar_historial(json.loads(file_content))
         elif resp.status_code == 404:
             print("[leer_lp_history] El archivo lp_history.json no existe en API.")
-            return {}
+            data = {}
         else:
             print(f"[leer_lp_history] Error API: {resp.status_code}")
             resp.raise_for_status()
+
+        for _, _, segmento in _leer_segmentos_lp(token):
+            fusionar_historiales(data, segmento)
+
+        if data:
+            with LP_HISTORY_LOCK:
+                LP_HISTORY_CACHE.set('lp_history_runs', data)
+            for puuid, colas in data.items():
+                _registrar_version_lp(puuid, colas)
+            print("[leer_lp_history] Historial de LP leído y cacheado exitosamente.")
+        return data
     except Exception as e:
         print(f"[leer_lp_history] Error leyendo lp_history.json de API: {e}")
     
     with LP_HISTORY_LOCK:
-        if LP_HISTORY_CACHE['data']:
-            return LP_HISTORY_CACHE['data']
+        cached = LP_HISTORY_CACHE.get('lp_history_runs')
+        if cached and cached['data']:
+            return cached['data']
             
     return {}
 
@@ -1017,6 +1378,23 @@ def _read_player_match_history_from_github(puuid, riot_id=None):
         print(f"[_read_player_match_history_from_github] Error leyendo el historial para {identifier} de API GitHub: {e}")
     return {}
 
+def _huella_historial(historial):
+    """Huella barata del contenido de un historial: nº de partidas, la más reciente y nº de remakes."""
+    matches = historial.get('matches', [])
+    return (len(matches), matches[0].get('match_id') if matches else None, len(historial.get('remakes', [])))
+
+
+def _registrar_version_historial(puuid, historial):
+    """Confirma la versión de datos del historial de un jugador (avanza solo si ha cambiado)."""
+    DATA_VERSIONS.registrar(f"match_history:{puuid}", _huella_historial(historial))
+
+
+def _cachear_historial(puuid, historial):
+    """Guarda el historial en la caché y avanza su versión de datos si ha cambiado. Llamar con PLAYER_MATCH_HISTORY_LOCK."""
+    PLAYER_MATCH_HISTORY_CACHE.set(puuid, historial)
+    _registrar_version_historial(puuid, historial)
+
+
 def get_player_match_history(puuid, riot_id=None):
     """
     Obtiene el historial de partidas de un jugador, usando la caché en memoria primero.
@@ -1028,14 +1406,12 @@ def get_player_match_history(puuid, riot_id=None):
         
         if cached_data and (time.time() - cached_data['timestamp'] < PLAYER_MATCH_HISTORY_CACHE_TIMEOUT):
             print(f"[get_player_match_history] Devolviendo historial cacheados para {identifier}.")
+            _registrar_version_historial(puuid, cached_data['data']) # La caché puede ser compartida entre workers
             return cached_data['data']
         
         print(f"[get_player_match_history] Historial para {identifier} no cacheados o estancados. Leyendo de GitHub.")
         historial = _read_player_match_history_from_github(puuid, riot_id=riot_id)
-        PLAYER_MATCH_HISTORY_CACHE[puuid] = {
-            'data': historial,
-            'timestamp': time.time()
-        }
+        _cachear_historial(puuid, historial)
         print(f"[get_player_match_history] Historial para {identifier} leído de GitHub y cacheado.")
         return historial
 
@@ -1100,15 +1476,20 @@ def guardar_historial_jugador_github(puuid, historial_data, riot_id=None):
 
 
 # --- CACHÉ EN MEMORIA PARA SNAPSHOTS DE LP (EVITA LLAMADAS EXTRA A API) ---
+# { puuid: { cola: [tramos] } } en el formato por tramos de services/lp_store
 LP_SNAPSHOTS_BUFFER = {}
 LP_SNAPSHOTS_BUFFER_LOCK = threading.Lock()
 LP_SNAPSHOTS_LAST_SAVE = 0
 LP_SNAPSHOTS_SAVE_INTERVAL = 3600  # Guardar snapshots cada 1 hora en GitHub
+LP_SEGMENTS_LAST_COMPACTION = 0
+LP_SEGMENTS_COMPACTION_INTERVAL = 24 * 3600 # Compactar los segmentos de LP una vez al día
+LP_SEGMENTS_MIN_TO_COMPACT = 1
 
-def _calcular_lp_inmediato(match, current_elo_by_queue, matches_by_queue):
+def _calcular_lp_inmediato(match, current_elo_by_queue, post_game_index):
     """
     Calcula el LP ganado/perdido en una partida usando snapshots históricos.
-    OPTIMIZACIÓN: Recibe diccionario pre-indexado {queue_id: [matches]} para O(1) acceso.
+    OPTIMIZACIÓN: Recibe el índice ordenado de post-game por cola (build_post_game_index),
+    así que la partida anterior se localiza con búsqueda binaria en O(log n).
     
     Retorna: {"lp_change": valor, "pre_game_elo": X, "post_game_elo": Y} o None
     """
@@ -1124,24 +1505,8 @@ def _calcular_lp_inmediato(match, current_elo_by_queue, matches_by_queue):
     if not post_game_elo:
         return None
     
-    # OPTIMIZACIÓN: Buscar en diccionario pre-indexado en lugar de filtrar O(n) cada vez
-    queue_matches = matches_by_queue.get(queue_id, [])
-    if not queue_matches:
-        return None
-    
-    # Encontrar la partida anterior más reciente con Elo post-game válido
-    previous_matches = [
-        m for m in queue_matches
-        if m.get('game_end_timestamp', 0) < game_end_ts and
-           m.get('post_game_valor_clasificacion') is not None
-    ]
-    
-    if not previous_matches:
-        return None
-    
-    # La partida más reciente anterior = Elo pre-game aproximado
-    most_recent_match = max(previous_matches, key=lambda x: x.get('game_end_timestamp', 0))
-    pre_game_elo = most_recent_match.get('post_game_valor_clasificacion')
+    # La partida anterior más reciente con Elo post-game válido = Elo pre-game aproximado
+    pre_game_elo = previous_post_game(post_game_index, queue_id, game_end_ts)
     
     if not pre_game_elo:
         return None
@@ -1158,7 +1523,8 @@ def _calcular_lp_inmediato(match, current_elo_by_queue, matches_by_queue):
 def _registrar_snapshot_lp(puuid, elo_info, riot_id=None):
     """
     Registra un snapshot de LP en memoria sin hacer llamadas a API.
-    Se guarda en GitHub cada hora automáticamente.
+    Se guarda en GitHub cada hora automáticamente. Si el ELO no ha cambiado solo
+    se alarga el tramo actual (last_seen) en lugar de añadir otro snapshot.
     """
     identifier = riot_id if riot_id else f"PUUID: {puuid}"
     timestamp = int(datetime.now(timezone.utc).timestamp() * 1000)
@@ -1180,7 +1546,7 @@ def _registrar_snapshot_lp(puuid, elo_info, riot_id=None):
                 )
                 
                 # Registrar snapshot
-                LP_SNAPSHOTS_BUFFER[puuid][queue_type].append({
+                anadir_snapshot(LP_SNAPSHOTS_BUFFER[puuid][queue_type], {
                     "timestamp": timestamp,
                     "elo": valor,
                     "league_points_raw": entry.get('leaguePoints', 0)
@@ -1189,7 +1555,9 @@ def _registrar_snapshot_lp(puuid, elo_info, riot_id=None):
 
 def _guardar_snapshots_en_github():
     """
-    Guarda los snapshots acumulados en GitHub.
+    Guarda los snapshots acumulados en GitHub en el segmento del día de la app dentro del
+    registro de LP. Solo se lee y reescribe ese segmento (no el historial completo), así que
+    el coste de cada guardado depende solo de lo registrado ese día.
     Se ejecuta periódicamente sin bloquear el flujo principal.
     """
     global LP_SNAPSHOTS_LAST_SAVE
@@ -1198,36 +1566,106 @@ def _guardar_snapshots_en_github():
         if not LP_SNAPSHOTS_BUFFER:
             return
         
-        # Leer historial existente desde GitHub
-        lp_history, lp_history_sha = _read_json_from_github_internal(LP_HISTORY_FILE_PATH, os.environ.get('GITHUB_TOKEN'))
-        
-        # Combinar snapshots en memoria con histórico
-        for puuid, queues_data in LP_SNAPSHOTS_BUFFER.items():
-            if puuid not in lp_history:
-                lp_history[puuid] = {"RANKED_SOLO_5x5": [], "RANKED_FLEX_SR": []}
-            
-            for queue_type, snapshots in queues_data.items():
-                lp_history[puuid][queue_type].extend(snapshots)
-                # Limitar a últimos 1000 snapshots por cola para no crecer infinitamente
-                lp_history[puuid][queue_type] = lp_history[puuid][queue_type][-1000:]
-        
-        # Guardar en GitHub
-        success = _write_to_github_internal(LP_HISTORY_FILE_PATH, lp_history, lp_history_sha, os.environ.get('GITHUB_TOKEN'))
+        segmento = {
+            puuid: {queue_type: [dict(t) for t in tramos] for queue_type, tramos in queues_data.items() if tramos}
+            for puuid, queues_data in LP_SNAPSHOTS_BUFFER.items()
+        }
+        token = os.environ.get('GITHUB_TOKEN')
+        ruta = f"{LP_SEGMENTS_DIR}/{nombre_segmento(int(time.time() * 1000), 'app')}"
+        # Si falla la lectura no hay sha y GitHub rechaza sobrescribir el segmento: se reintenta después
+        del_dia, sha = _read_json_from_github_internal(ruta, token)
+        del_dia = fusionar_historiales(normalizar_historial(del_dia), segmento)
+        success = _write_to_github_internal(ruta, del_dia, sha, token)
         
         if success:
             LP_SNAPSHOTS_BUFFER.clear()
             LP_SNAPSHOTS_LAST_SAVE = time.time()
-            print("[_guardar_snapshots_en_github] Snapshots guardados exitosamente en GitHub")
+            with LP_HISTORY_LOCK:
+                cached = LP_HISTORY_CACHE.get('lp_history_runs')
+                if cached and cached['data']:
+                    LP_HISTORY_CACHE.set('lp_history_runs', fusionar_historiales(cached['data'], segmento),
+                                         cached['timestamp'])
+                    for puuid in segmento:
+                        _registrar_version_lp(puuid, cached['data'][puuid])
+            print(f"[_guardar_snapshots_en_github] Segmento {ruta} guardado exitosamente en GitHub")
+
+    if time.time() - LP_SEGMENTS_LAST_COMPACTION > LP_SEGMENTS_COMPACTION_INTERVAL:
+        _refrescar_en_segundo_plano('lp_compaction', _compactar_segmentos_lp)
+
+def _leer_segmentos_lp(token, ref="main"):
+    """
+    Lee los segmentos pendientes de compactar en la revisión `ref`. Devuelve [(ruta, sha, datos)]
+    en orden cronológico, con los datos ya normalizados. Solo se descargan los que no están en
+    LP_SEGMENTS_PARSED; los datos devueltos son compartidos y no se deben modificar.
+    """
+    with LP_SEGMENTS_PARSED_LOCK:
+        conocidos = dict(LP_SEGMENTS_PARSED)
+
+    segmentos = []
+    descargados = 0
+    for entrada in sorted(_list_github_dir_internal(LP_SEGMENTS_DIR, token, ref), key=lambda e: e['name']):
+        if entrada.get('type') != 'file' or not entrada['name'].endswith('.json'):
+            continue
+        datos = conocidos.get((entrada['path'], entrada.get('sha')))
+        sha = entrada.get('sha')
+        if datos is None:
+            datos, sha = _read_json_from_github_internal(entrada['path'], token, ref)
+            if not sha:
+                continue
+            datos = normalizar_historial(datos)
+            descargados += 1
+        segmentos.append((entrada['path'], sha, datos))
+
+    # Los segmentos que ya no aparecen (compactados y borrados) salen de la caché
+    with LP_SEGMENTS_PARSED_LOCK:
+        LP_SEGMENTS_PARSED.clear()
+        LP_SEGMENTS_PARSED.update(((ruta, sha), datos) for ruta, sha, datos in segmentos)
+    if descargados:
+        print(f"[_leer_segmentos_lp] {descargados} segmentos nuevos descargados ({len(segmentos)} pendientes de compactar).")
+    return segmentos
+
+def _compactar_segmentos_lp():
+    """
+    Compactador del registro de LP: fusiona los segmentos en lp_history.json y los borra en un
+    único commit. Todo se lee en el mismo commit de main que se usa como padre; si un escritor
+    sube algo mientras tanto, GitHub rechaza el commit y se reintenta en la siguiente pasada
+    (no se borra nada que no se haya fusionado).
+    """
+    global LP_SEGMENTS_LAST_COMPACTION
+    LP_SEGMENTS_LAST_COMPACTION = time.time()
+    token = os.environ.get('GITHUB_TOKEN')
+    if not token:
+        return
+
+    cabeza = _cabeza_github_internal(token)
+    if not cabeza:
+        return
+    commit_padre, arbol_padre = cabeza
+    segmentos = _leer_segmentos_lp(token, commit_padre)
+    if len(segmentos) < LP_SEGMENTS_MIN_TO_COMPACT:
+        return
 
-def _read_json_from_github_internal(file_path, token):
-    """Lee un archivo JSON desde GitHub (función auxiliar interna)."""
+    lp_history, _ = _read_json_from_github_internal(LP_HISTORY_FILE_PATH, token, commit_padre)
+    lp_history = normalizar_historial(lp_history)
+    for _, _, segmento in segmentos:
+        fusionar_historiales(lp_history, segmento)
+
+    cambios = {LP_HISTORY_FILE_PATH: lp_history}
+    cambios.update((ruta, None) for ruta, _, _ in segmentos)
+    if not _commit_github_internal(cambios, f"Compactar {len(segmentos)} segmentos de LP", commit_padre, arbol_padre, token):
+        print("[_compactar_segmentos_lp] No se pudo compactar el registro de LP. Se reintentará más tarde.")
+        return
+    print(f"[_compactar_segmentos_lp] {len(segmentos)} segmentos fusionados en {LP_HISTORY_FILE_PATH} en un commit.")
+
+def _read_json_from_github_internal(file_path, token, ref=None):
+    """Lee un archivo JSON desde GitHub, opcionalmente en la revisión `ref` (función auxiliar interna)."""
     url = f"https://api.github.com/repos/Sepevalle/SoloQ-Cerditos/contents/{file_path}"
     headers = {"Accept": "application/vnd.github.v3+json"}
     if token:
         headers["Authorization"] = f"token {token}"
     
     try:
-        resp = requests.get(url, headers=headers, timeout=30)
+        resp = requests.get(url, headers=headers, params={"ref": ref} if ref else None, timeout=30)
         if resp.status_code == 200:
             content = resp.json()
             file_content = base64.b64decode(content['content']).decode('utf-8')
@@ -1262,6 +1700,81 @@ def _write_to_github_internal(file_path, data, sha, token):
     return False
 
 
+def _list_github_dir_internal(dir_path, token, ref="main"):
+    """
+    Lista los ficheros de un directorio del repositorio en la revisión `ref` con la API de
+    árboles de git (función auxiliar interna). A diferencia de la API de contenidos, que corta
+    en 1000 entradas, un árbol admite hasta 100 000 y avisa si se trunca.
+    Devuelve [{'name', 'path', 'sha', 'type'}] con type 'file' o 'dir'.
+    """
+    base = "https://api.github.com/repos/Sepevalle/SoloQ-Cerditos/git/trees"
+    headers = {"Accept": "application/vnd.github.v3+json"}
+    if token:
+        headers["Authorization"] = f"token {token}"
+
+    try:
+        arbol = ref
+        for parte in dir_path.strip("/").split("/"):
+            resp = requests.get(f"{base}/{arbol}", headers=headers, timeout=30)
+            if resp.status_code != 200:
+                return []
+            arbol = next((e['sha'] for e in resp.json().get('tree', []) if e['path'] == parte and e['type'] == 'tree'), None)
+            if arbol is None: # El directorio no existe (p. ej. todo compactado)
+                return []
+        resp = requests.get(f"{base}/{arbol}", headers=headers, timeout=30)
+        if resp.status_code != 200:
+            return []
+        datos = resp.json()
+        if datos.get('truncated'):
+            print(f"[_list_github_dir_internal] ADVERTENCIA: el listado de {dir_path} está truncado; faltan entradas.")
+        return [{'name': e['path'], 'path': f"{dir_path}/{e['path']}", 'sha': e['sha'],
+                 'type': 'file' if e['type'] == 'blob' else 'dir'} for e in datos.get('tree', [])]
+    except Exception as e:
+        print(f"[_list_github_dir_internal] Error: {e}")
+    return []
+
+def _cabeza_github_internal(token):
+    """(sha del commit, sha de su árbol) de la punta de main, o None (función auxiliar interna)."""
+    base = "https://api.github.com/repos/Sepevalle/SoloQ-Cerditos/git"
+    headers = {"Authorization": f"token {token}", "Accept": "application/vnd.github.v3+json"}
+    try:
+        ref = requests.get(f"{base}/ref/heads/main", headers=headers, timeout=30)
+        ref.raise_for_status()
+        commit_sha = ref.json()['object']['sha']
+        commit = requests.get(f"{base}/commits/{commit_sha}", headers=headers, timeout=30)
+        commit.raise_for_status()
+        return commit_sha, commit.json()['tree']['sha']
+    except Exception as e:
+        print(f"[_cabeza_github_internal] Error: {e}")
+    return None
+
+def _commit_github_internal(cambios, mensaje, commit_padre, arbol_padre, token):
+    """
+    Aplica varios cambios en un único commit sobre `commit_padre` y avanza main (función auxiliar
+    interna). `cambios` es {ruta: datos JSON, o None para borrar el fichero}. Si main ya no apunta
+    a `commit_padre` GitHub rechaza la actualización (no es fast-forward) y devuelve False.
+    """
+    base = "https://api.github.com/repos/Sepevalle/SoloQ-Cerditos/git"
+    headers = {"Authorization": f"token {token}", "Accept": "application/vnd.github.v3+json"}
+    entradas = [{"path": ruta, "mode": "100644", "type": "blob",
+                 **({"sha": None} if datos is None else {"content": json.dumps(datos, indent=2)})}
+                for ruta, datos in cambios.items()]
+    try:
+        arbol = requests.post(f"{base}/trees", headers=headers, timeout=60,
+                              json={"base_tree": arbol_padre, "tree": entradas})
+        arbol.raise_for_status()
+        commit = requests.post(f"{base}/commits", headers=headers, timeout=30,
+                               json={"message": mensaje, "tree": arbol.json()['sha'], "parents": [commit_padre]})
+        commit.raise_for_status()
+        resp = requests.patch(f"{base}/refs/heads/main", headers=headers, timeout=30,
+                              json={"sha": commit.json()['sha']})
+        if resp.status_code == 200:
+            return True
+        print(f"[_commit_github_internal] main ha avanzado durante el commit ({resp.status_code}).")
+    except Exception as e:
+        print(f"[_commit_github_internal] Error: {e}")
+    return False
+
 def _recalcular_lp_partidas_historicas(puuid, all_matches):
     """
     Recalcula LP para partidas históricas que no tienen LP asignado.
@@ -1269,14 +1782,9 @@ def _recalcular_lp_partidas_historicas(puuid, all_matches):
     """
     print(f"[_recalcular_lp_partidas_historicas] Iniciando recálculo de LP para {puuid}...")
     
-    # Crear índice por cola para acceso rápido
-    matches_by_queue = defaultdict(list)
-    for m in all_matches:
-        matches_by_queue[m.get('queue_id')].append(m)
-    
-    # Ordenar matches por timestamp para asegurar que tenemos los anteriores primero
-    for queue_id in matches_by_queue:
-        matches_by_queue[queue_id] = sorted(matches_by_queue[queue_id], key=lambda x: x.get('game_end_timestamp', 0))
+    # Índice ordenado de post-game por cola: la partida anterior se busca en O(log n).
+    # Se construye antes de asignar nada; las asignaciones solo afectan a partidas más nuevas.
+    post_game_index = build_post_game_index(all_matches)
     
     recalculated = 0
     for match in all_matches:
@@ -1286,20 +1794,10 @@ def _recalcular_lp_partidas_historicas(puuid, all_matches):
             if queue_id not in [420, 440]:
                 continue
             
-            queue_matches = matches_by_queue.get(queue_id, [])
-            game_end_ts = match.get('game_end_timestamp', 0)
-            
             # Buscar la partida anterior en la misma cola
-            previous_matches = [
-                m for m in queue_matches
-                if m.get('game_end_timestamp', 0) < game_end_ts and
-                   m.get('post_game_valor_clasificacion') is not None
-            ]
+            pre_game_elo = previous_post_game(post_game_index, queue_id, match.get('game_end_timestamp', 0))
             
-            if previous_matches:
-                most_recent_match = max(previous_matches, key=lambda x: x.get('game_end_timestamp', 0))
-                pre_game_elo = most_recent_match.get('post_game_valor_clasificacion')
-                
+            if pre_game_elo is not None:
                 # Obtener post-game elo del match actual
                 post_game_elo = match.get('post_game_valor_clasificacion')
                 if post_game_elo is None:
@@ -1346,15 +1844,14 @@ def procesar_jugador(args_tuple):
     if not needs_full_update and old_data_list:
         # Jugador inactivo: devolver datos antiguos con estado actualizado
         print(f"[procesar_jugador] Jugador {riot_id} inactivo. Retornando datos cacheados sin actualizar Elo.")
-        for data in old_data_list:
-            data['en_partida'] = is_currently_in_game
-        return old_data_list
+        # Las filas antiguas pertenecen a una instantánea publicada (inmutable): se copian.
+        return [dict(data, en_partida=is_currently_in_game) for data in old_data_list]
 
     # Solo obtener Elo si necesitamos actualización completa
     elo_info = obtener_elo(api_key_main, puuid, riot_id=riot_id)
     if not elo_info:
         print(f"[procesar_jugador] No se pudo obtener el Elo para {riot_id}. No se puede rastrear LP ni actualizar datos.")
-        return old_data_list if old_data_list else []
+        return [dict(data) for data in old_data_list] if old_data_list else []
 
     # OPTIMIZACIÓN: Convertir elo_info a un diccionario por queue para cálculo rápido de LP
     current_elo_by_queue = {}
@@ -1406,17 +1903,15 @@ def procesar_jugador(args_tuple):
                 with ThreadPoolExecutor(max_workers=5) as executor:
                     resultados_partidas = executor.map(obtener_info_partida, tareas_partidas)
                 
-                # OPTIMIZACIÓN: Pre-indexar partidas por cola para _calcular_lp_inmediato O(n) -> O(1)
-                matches_by_queue = defaultdict(list)
-                for m in existing_matches:
-                    matches_by_queue[m.get('queue_id')].append(m)
+                # OPTIMIZACIÓN: Pre-indexar los post-game por cola para _calcular_lp_inmediato O(log n)
+                post_game_index = build_post_game_index(existing_matches)
                 
                 for resultado in resultados_partidas:
                     if resultado:
                         # Asegurarse de que el game_end_timestamp sea posterior al inicio de la temporada
                         if resultado.get('game_end_timestamp', 0) / 1000 >= SEASON_START_TIMESTAMP:
                             # OPTIMIZACIÓN: Calcular LP inmediatamente cuando se obtiene la partida
-                            lp_info = _calcular_lp_inmediato(resultado, current_elo_by_queue, matches_by_queue)
+                            lp_info = _calcular_lp_inmediato(resultado, current_elo_by_queue, post_game_index)
                             if lp_info:
                                 resultado['lp_change_this_game'] = lp_info['lp_change']
                                 resultado['pre_game_valor_clasificacion'] = lp_info['pre_game_elo']
@@ -1468,10 +1963,7 @@ def procesar_jugador(args_tuple):
         
         # Actualizar la caché en memoria inmediatamente después de guardar
         with PLAYER_MATCH_HISTORY_LOCK:
-            PLAYER_MATCH_HISTORY_CACHE[puuid] = {
-                'data': updated_historial_data,
-                'timestamp': time.time()
-            }
+            _cachear_historial(puuid, updated_historial_data)
         print(f"[procesar_jugador] Historial de partidas de {riot_id} actualizado y guardado en GitHub.")
     
     # Continuar con el procesamiento de datos del jugador para la visualización en el frontend
@@ -1543,8 +2035,7 @@ def actualizar_cache():
         print("[actualizar_cache] ERROR CRÍTICO: La variable de entorno RIOT_API_KEY no está configurada. La aplicación no puede funcionar correctamente.")
         return
     
-    with cache_lock:
-        old_cache_data = cache.get('datos_jugadores', [])
+    old_cache_data = LEADERBOARD_SNAPSHOT.rows
     
     old_data_map_by_puuid = {}
     for d in old_cache_data:
@@ -1558,7 +2049,7 @@ def actualizar_cache():
 
     with cache_lock:
         cache['update_count'] = cache.get('update_count', 0) + 1
-    check_in_game_this_update = cache['update_count'] % 2 == 1
+        check_in_game_this_update = cache['update_count'] % 2 == 1
     # print(f"[actualizar_cache] Check de partida activa en este ciclo: {check_in_game_this_update}")
 
     puuid_dict = leer_puuids()
@@ -1613,129 +2104,38 @@ def actualizar_cache():
         historial = get_player_match_history(puuid, riot_id=jugador.get('game_name')) 
         all_matches_for_player = historial.get('matches', [])
 
-        # CALCULAR DINÁMICAMENTE el resumen de 24h
-        now_utc = datetime.now(timezone.utc)
-        one_day_ago_timestamp_ms = int((now_utc - timedelta(days=1)).timestamp() * 1000)
-        
-        lp_change_24h = 0
-        wins_24h = 0
-        losses_24h = 0
-
-        # Filtrar partidas de la cola correcta para el cálculo
-        partidas_de_la_cola_en_24h = [
-            m for m in all_matches_for_player 
-            if m.get('queue_id') == queue_id and m.get('game_end_timestamp', 0) > one_day_ago_timestamp_ms
-        ]
-
-        for match in partidas_de_la_cola_en_24h:
-            lp_change = match.get('lp_change_this_game')
-            if lp_change is not None:
-                lp_change_24h += lp_change
-            
-            if match.get('win'):
-                wins_24h += 1
-            else:
-                losses_24h += 1
-
-        jugador['lp_change_24h'] = lp_change_24h
-        jugador['wins_24h'] = wins_24h
-        jugador['losses_24h'] = losses_24h
+        # Agregados incrementales por ventana: solo se recorren las partidas nuevas
+        # y las que siguen dentro de la ventana de 7 días
+        ahora_ms = int(datetime.now(timezone.utc).timestamp() * 1000)
+        agregados = obtener_agregados(puuid, all_matches_for_player, ahora_ms, SEASON_START_TIMESTAMP * 1000)
 
-        partidas_jugador = [
-            p for p in all_matches_for_player
-            if p.get('queue_id') == queue_id and
-               p.get('game_end_timestamp', 0) / 1000 >= SEASON_START_TIMESTAMP
-        ]
+        resumen_24h = agregados.resumen(queue_id, '24h')
+        jugador['lp_change_24h'] = resumen_24h['lp_change']
+        jugador['wins_24h'] = resumen_24h['wins']
+        jugador['losses_24h'] = resumen_24h['losses']
 
         # Sobrescribir victorias y derrotas con los datos calculados localmente para la temporada actual.
         # Esto fuerza que se muestren a 0 si no hay partidas nuevas, ignorando los datos "viejos" de la API de Riot.
-        jugador['wins'] = sum(1 for p in partidas_jugador if p.get('win'))
-        jugador['losses'] = len(partidas_jugador) - jugador['wins']
+        resumen_temporada = agregados.resumen(queue_id, 'season')
+        jugador['wins'] = resumen_temporada['wins']
+        jugador['losses'] = resumen_temporada['losses']
+        jugador['kda'] = resumen_temporada['kda']
 
-        # Calcular KDA general para la temporada
-        total_kills = sum(p.get('kills', 0) for p in partidas_jugador)
-        total_deaths = sum(p.get('deaths', 0) for p in partidas_jugador)
-        total_assists = sum(p.get('assists', 0) for p in partidas_jugador)
-        jugador['kda'] = (total_kills + total_assists) / total_deaths if total_deaths > 0 else float(total_kills + total_assists)
-
-        # Calcular rachas de victorias/derrotas para el jugador en esta cola
-        rachas = calcular_rachas(partidas_jugador)
+        # Rachas de victorias/derrotas en esta cola (O(1) por partida nueva)
+        rachas = rachas_jugador(puuid, all_matches_for_player, queue_id, SEASON_START_TIMESTAMP * 1000)
         jugador['current_win_streak'] = rachas['current_win_streak']
         jugador['current_loss_streak'] = rachas['current_loss_streak']
         # Guardar también las rachas máximas, aunque no se usen en la vista principal, pueden ser útiles.
         jugador['max_win_streak'] = rachas['max_win_streak']
         jugador['max_loss_streak'] = rachas['max_loss_streak']
 
-        if not partidas_jugador:
-            continue
-
-        contador_campeones = Counter(p['champion_name'] for p in partidas_jugador)
-        if not contador_campeones:
-            continue
-        
-        top_3_campeones = contador_campeones.most_common(3)
-        
-        # OPTIMIZACIÓN: Pre-indexar partidas por campeón para evitar O(n²) búsquedas
-        partidas_por_campeon = defaultdict(list)
-        for p in partidas_jugador:
-            partidas_por_campeon[p['champion_name']].append(p)
-
-        for campeon_nombre, _ in top_3_campeones:
-            partidas_del_campeon = partidas_por_campeon[campeon_nombre]
-            
-            total_partidas = len(partidas_del_campeon)
-            wins = sum(1 for p in partidas_del_campeon if p.get('win'))
-            win_rate = (wins / total_partidas * 100) if total_partidas > 0 else 0
-
-            total_kills = sum(p.get('kills', 0) for p in partidas_del_campeon)
-            total_deaths = sum(p.get('deaths', 0) for p in partidas_del_campeon)
-            total_assists = sum(p.get('assists', 0) for p in partidas_del_campeon)
-            
-            avg_kills = total_kills / total_partidas if total_partidas > 0 else 0
-            avg_deaths = total_deaths / total_partidas if total_partidas > 0 else 0
-            avg_assists = total_assists / total_partidas if total_partidas > 0 else 0
-
-            kda = (total_kills + total_assists) / total_deaths if total_deaths > 0 else float(total_kills + total_assists)
-
-            best_kda_match_info = None
-            if partidas_del_campeon:
-                def get_kda_for_match(p):
-                    k = p.get('kills', 0)
-                    d = p.get('deaths', 0)
-                    a = p.get('assists', 0)
-                    return (k + a) / d if d > 0 else float(k + a)
-
-                best_match = max(partidas_del_campeon, key=get_kda_for_match)
-                
-                best_kda_value = get_kda_for_match(best_match)
-
-                best_kda_match_info = {
-                    "kda": best_kda_value,
-                    "kills": best_match.get('kills', 0),
-                    "deaths": best_match.get('deaths', 0),
-                    "assists": best_match.get('assists', 0),
-                    "timestamp": best_match.get('game_end_timestamp')
-                }
-
-            jugador['top_champion_stats'].append({
-                "champion_name": campeon_nombre,
-                "win_rate": win_rate,
-                "games_played": total_partidas,
-                "kda": kda,
-                "kills": total_kills,
-                "deaths": total_deaths,
-                "assists": total_assists,
-                "wins": wins,
-                "losses": total_partidas - wins,
-                "avg_kills": avg_kills,
-                "avg_deaths": avg_deaths,
-                "avg_assists": avg_assists,
-                "best_kda_match": best_kda_match_info
-            })
+        # Top 3 de campeones desde la tabla agregada (solo se incorporan las partidas nuevas)
+        actualizar_campeones(puuid, all_matches_for_player, SEASON_START_TIMESTAMP * 1000)
+        jugador['top_champion_stats'] = filas_campeones(puuid, queue_id, limite=3)
 
-    with cache_lock:
-        cache['datos_jugadores'] = todos_los_datos
-        cache['timestamp'] = time.time()
+    _publicar_snapshot_clasificacion(todos_los_datos)
+    guardar_tabla_campeones()
+    _refrescar_en_segundo_plano('perfiles_calientes', prerenderizar_perfiles_calientes)
     
     # OPTIMIZACIÓN: Guardar snapshots acumulados en GitHub cada hora
     global LP_SNAPSHOTS_LAST_SAVE
@@ -1745,10 +2145,40 @@ def actualizar_cache():
     
     print("[actualizar_cache] Actualización de la caché principal completada.")
 
-def obtener_datos_jugadores():
-    """Obtiene los datos cacheados de los jugadores."""
+def _publicar_snapshot_clasificacion(filas, timestamp=None, version=None, persistir=True):
+    """
+    Congela las filas en una nueva instantánea versionada y la publica con una única
+    asignación de referencia. Devuelve la instantánea publicada.
+    Por defecto la persiste en disco para el arranque en caliente.
+    """
+    global LEADERBOARD_SNAPSHOT
     with cache_lock:
-        return cache.get('datos_jugadores', []), cache.get('timestamp', 0)
+        anterior = LEADERBOARD_SNAPSHOT
+        nuevo = LeaderboardSnapshot.crear(
+            version if version is not None else LEADERBOARD_SNAPSHOT.version + 1,
+            timestamp if timestamp is not None else time.time(),
+            filas
+        )
+        LEADERBOARD_SNAPSHOT = nuevo
+    print(f"[_publicar_snapshot_clasificacion] Publicada la instantánea v{nuevo.version} con {len(nuevo.rows)} filas.")
+    if persistir:
+        guardar_cache('leaderboard', descongelar(nuevo.rows), nuevo.version, nuevo.timestamp)
+    # Los seguidores también pasan por aquí al recargar la instantánea del líder: cada proceso difunde a sus clientes
+    DIFUSOR_CLASIFICACION.publicar(anterior, nuevo, {'ultima_actualizacion': _formatear_actualizacion(nuevo.timestamp)})
+    return nuevo
+
+def _formatear_actualizacion(timestamp):
+    """Fecha de actualización (segundos UTC) en la zona horaria de visualización, como se muestra en la portada."""
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).astimezone(TARGET_TIMEZONE).strftime("%d/%m/%Y %H:%M:%S")
+
+def obtener_snapshot_clasificacion():
+    """Devuelve la instantánea vigente de la clasificación (lectura sin bloqueo)."""
+    return LEADERBOARD_SNAPSHOT
+
+def obtener_datos_jugadores():
+    """Obtiene los datos cacheados de los jugadores (filas congeladas) y su timestamp."""
+    snapshot = LEADERBOARD_SNAPSHOT
+    return snapshot.rows, snapshot.timestamp
 
 def get_peak_elo_key(jugador):
     """Genera una clave para el peak ELO usando el PUUID del jugador y la temporada actual."""
@@ -1758,58 +2188,23 @@ def calcular_rachas(partidas):
     """
     Calcula las rachas de victorias y derrotas más largas de una lista de partidas.
     Las partidas deben estar ordenadas por fecha, de más reciente a más antigua.
+    Además de las longitudes devuelve los match_id de inicio y fin de cada racha.
     """
     print(f"[calcular_rachas] Calculando rachas para {len(partidas)} partidas.")
-    if not partidas:
-        return {
-            'max_win_streak': 0, 
-            'max_loss_streak': 0,
-            'current_win_streak': 0,
-            'current_loss_streak': 0
-        }
-
-    max_win_streak = 0
-    max_loss_streak = 0
-    current_win_streak = 0
-    current_loss_streak = 0
-
-    # Calcular rachas máximas (iterando de la más antigua a la más nueva)
-    for partida in reversed(partidas): # reversed() itera de la más antigua a la más nueva
-        if partida.get('win'):
-            current_win_streak += 1
-            current_loss_streak = 0
-        else:
-            current_loss_streak += 1
-            current_win_streak = 0
-
-        if current_win_streak > max_win_streak:
-            max_win_streak = current_win_streak
-        if current_loss_streak > max_loss_streak:
-            max_loss_streak = current_loss_streak
-
-    # Calcular racha actual (iterando de la más nueva a la más antigua)
-    current_streak_type = 'win' if partidas[0].get('win') else 'loss'
-    current_streak_count = 0
-    for partida in partidas: # La lista ya viene de más nueva a más antigua
-        is_win = partida.get('win')
-        if (is_win and current_streak_type == 'win') or (not is_win and current_streak_type == 'loss'):
-            current_streak_count += 1
-        else:
-            break # La racha se rompió
-
-    final_current_win_streak = current_streak_count if current_streak_type == 'win' else 0
-    final_current_loss_streak = current_streak_count if current_streak_type == 'loss' else 0
-
-    print(f"[calcular_rachas] Rachas calculadas: Max V: {max_win_streak}, Max D: {max_loss_streak}, Actual: {final_current_win_streak}V/{final_current_loss_streak}D.")
-    return {'max_win_streak': max_win_streak, 'max_loss_streak': max_loss_streak, 'current_win_streak': final_current_win_streak, 'current_loss_streak': final_current_loss_streak}
+    rachas = reconstruir_rachas(reversed(partidas)).como_dict()
+    print(f"[calcular_rachas] Rachas calculadas: Max V: {rachas['max_win_streak']}, Max D: {rachas['max_loss_streak']}, "
+          f"Actual: {rachas['current_win_streak']}V/{rachas['current_loss_streak']}D.")
+    return rachas
 
 @app.route('/')
 def index():
     """Renderiza la página principal con la lista de jugadores."""
     print("[index] Petición recibida para la página principal.")
-    datos_jugadores, timestamp = obtener_datos_jugadores()
+    snapshot = obtener_snapshot_clasificacion()
+    # Copias por petición: la instantánea publicada es de solo lectura.
+    datos_jugadores = [dict(fila) for fila in snapshot.rows]
     
-    lectura_exitosa, peak_elo_dict = leer_peak_elo()
+    lectura_exitosa, peak_elo_dict = leer_peak_elo(permitir_obsoleto=True)
 
     if lectura_exitosa:
         actualizado = False
@@ -1833,11 +2228,7 @@ def index():
             jugador["peak_elo"] = jugador["valor_clasificacion"]
 
     split_activo_nombre = SPLITS[ACTIVE_SPLIT_KEY]['name']
-    # El timestamp de la caché está en segundos UTC (de time.time())
-    dt_utc = datetime.fromtimestamp(timestamp, tz=timezone.utc)
-    # Convertir a la zona horaria de visualización deseada (UTC+2)
-    dt_target = dt_utc.astimezone(TARGET_TIMEZONE)
-    ultima_actualizacion = dt_target.strftime("%d/%m/%Y %H:%M:%S")
+    ultima_actualizacion = _formatear_actualizacion(snapshot.timestamp)
     
     print("[index] Renderizando index.html.")
     has_player_data = bool(datos_jugadores) # Check if the list is not empty
@@ -1845,59 +2236,313 @@ def index():
                            ultima_actualizacion=ultima_actualizacion,
                            ddragon_version=DDRAGON_VERSION, 
                            split_activo_nombre=split_activo_nombre,
-                           has_player_data=has_player_data)
+                           has_player_data=has_player_data,
+                           snapshot_version=snapshot.version)
 
-@app.route('/historial_global')
-def historial_global():
-    """Renderiza la página de historial global de partidas para la temporada actual."""
-    print("[historial_global] Petición recibida para la página de historial global.")
-    
+HISTORIAL_GLOBAL_PAGE_SIZE = 50
+HISTORIAL_GLOBAL_MAX_PAGE_SIZE = 200
+HISTORIAL_GLOBAL_ROW_TEMPLATE = '_fila_historial_global.html'
+# Campos de la partida que aparecen en una fila: si cambia alguno, se re-renderiza su semana
+HISTORIAL_GLOBAL_ROW_FIELDS = ('match_id', 'puuid', 'game_end_timestamp', 'champion_name', 'win',
+                               'kills', 'deaths', 'assists', 'queue_id', 'lp_change_this_game')
+HISTORIAL_GLOBAL_ROW_EXTRA_FIELDS = ('jugador', 'game_name') # Añadidos a la partida por _fila_historial_global
+HISTORIAL_GLOBAL_SEMANAS = AlmacenSemanas()
+
+
+TEMPLATE_HASHES = {} # nombre -> (mtime, huella)
+ROW_FRAGMENTS = CacheFragmentos()
+
+
+def _huella_plantilla(nombre):
+    """Hash del código fuente de una plantilla: si se edita, lo precalculado con ella deja de valer."""
+    ruta = os.path.join(app.root_path, app.template_folder, nombre)
+    try:
+        mtime = os.path.getmtime(ruta)
+        cached = TEMPLATE_HASHES.get(nombre)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        with open(ruta, 'rb') as f:
+            huella = hashlib.sha1(f.read()).hexdigest()[:12]
+    except OSError:
+        return ''
+    TEMPLATE_HASHES[nombre] = (mtime, huella)
+    return huella
+
+
+def _renderizar_filas(plantilla, partidas, contexto=None, campos_clave=()):
+    """
+    Renderiza las filas de unas partidas reutilizando los fragmentos ya cacheados.
+
+    La clave de cada fila es (plantilla, huella de la plantilla, match_id, puuid, versión de LP,
+    versión de Data Dragon y de su copia de iconos, contexto, campos_clave de la partida): una partida terminada solo
+    se vuelve a renderizar si cambia alguno de ellos.
+
+    Args:
+        plantilla (str): Plantilla de la fila; recibe `match` y `ddragon_version`.
+        partidas (list): Partidas a renderizar, en orden.
+        contexto (dict): Variables comunes a todas las filas (deben ser repr-estables, p. ej. el Riot ID del perfil).
+        campos_clave (tuple): Campos añadidos a la partida que también se muestran en la fila.
+
+    Returns:
+        list: HTML de cada fila.
+    """
+    contexto = contexto or {}
+    huella = _huella_plantilla(plantilla)
+    ddragon_version = DDRAGON_VERSION
+    version_iconos = _version_iconos()
+    clave_contexto = repr(sorted(contexto.items()))
+    filas = []
+    for match in partidas:
+        clave = (plantilla, huella, match.get('match_id'), match.get('puuid'),
+                 (match.get('lp_change_this_game'), match.get('pre_game_valor_clasificacion'),
+                  match.get('post_game_valor_clasificacion')),
+                 version_iconos, clave_contexto, tuple(match.get(campo) for campo in campos_clave))
+        filas.append(ROW_FRAGMENTS.obtener_o_renderizar(
+            clave, lambda: render_template(plantilla, match=match, ddragon_version=ddragon_version, **contexto)))
+    return filas
+
+
+def _historiales_temporada():
+    """
+    Lee en paralelo los historiales de todos los jugadores.
+
+    Returns:
+        tuple: ({puuid: datos del jugador}, [historial de cada jugador])
+    """
     todos_los_jugadores, _ = obtener_datos_jugadores()
+    jugadores_por_puuid = {}
+    for jugador_data in todos_los_jugadores:
+        if jugador_data.get('puuid'):
+            jugadores_por_puuid.setdefault(jugador_data['puuid'], jugador_data)
     
-    all_matches_combined = []
-    
-    # Usamos un ThreadPoolExecutor para procesar los historiales de los jugadores en paralelo
+    # Usamos un ThreadPoolExecutor para leer los historiales de los jugadores en paralelo
     with ThreadPoolExecutor(max_workers=5) as executor:
-        futures = []
-        for jugador_data in todos_los_jugadores:
-            puuid = jugador_data.get('puuid')
-            riot_id = jugador_data.get('game_name')
-            if puuid:
-                # Cada future almacenará una lista de partidas para un jugador
-                futures.append(executor.submit(get_player_match_history, puuid, riot_id))
-        
-        for future in futures:
-            historial_jugador = future.result()
-            if historial_jugador and 'matches' in historial_jugador:
-                # Filtrar partidas por SEASON_START_TIMESTAMP y añadir a la lista combinada
-                for match in historial_jugador['matches']:
-                    if match.get('game_end_timestamp', 0) / 1000 >= SEASON_START_TIMESTAMP:
-                        all_matches_combined.append(match)
-
-    # OPTIMIZACIÓN: Usar set en lugar de dict para deduplicación O(1)
-    unique_matches_set = set()
-    final_matches = []
-    for match in all_matches_combined:
-        key = (match.get('match_id'), match.get('puuid'))
-        if key not in unique_matches_set:
-            unique_matches_set.add(key)
-            final_matches.append(match)
-
-    # Ordenar todas las partidas combinadas por game_end_timestamp, de más reciente a más antigua
-    final_matches.sort(key=lambda x: x.get('game_end_timestamp', 0), reverse=True)
-    
-    print(f"[historial_global] Se han agregado y ordenado {len(final_matches)} partidas para el historial global.")
+        futures = [executor.submit(get_player_match_history, puuid, jugador_data.get('game_name'))
+                   for puuid, jugador_data in jugadores_por_puuid.items()]
+        historiales = [(future.result() or {}).get('matches', []) for future in futures]
+    return jugadores_por_puuid, historiales
+
+
+def _fila_historial_global(match, jugadores_por_puuid):
+    """Datos de una fila del historial global: la partida más el nombre del jugador."""
+    jugador_data = jugadores_por_puuid.get(match.get('puuid'), {})
+    return dict(match, jugador=jugador_data.get('jugador', 'N/A'), game_name=jugador_data.get('game_name', ''))
+
+
+def precalcular_historial_global():
+    """
+    Sincroniza los cubos semanales del historial global: recorre la temporada una vez
+    (fusión k-way) y solo re-renderiza las semanas cuyo contenido ha cambiado.
+    """
+    jugadores_por_puuid, historiales = _historiales_temporada()
+    filas = (_fila_historial_global(match, jugadores_por_puuid)
+             for match in fusionar(historiales, desde_ms=SEASON_START_TIMESTAMP * 1000))
+    semanas = agrupar_por_semana(filas)
+    # Las filas se renderizan fuera de una petición: url_for necesita un contexto de petición
+    with app.test_request_context('/'):
+        renderizadas = HISTORIAL_GLOBAL_SEMANAS.sincronizar(
+            semanas,
+            lambda match: _renderizar_filas(HISTORIAL_GLOBAL_ROW_TEMPLATE, [match],
+                                            campos_clave=HISTORIAL_GLOBAL_ROW_EXTRA_FIELDS)[0],
+            HISTORIAL_GLOBAL_ROW_FIELDS + HISTORIAL_GLOBAL_ROW_EXTRA_FIELDS,
+            extra=(_version_iconos(), _huella_plantilla(HISTORIAL_GLOBAL_ROW_TEMPLATE)),
+        )
+    print(f"[precalcular_historial_global] {len(semanas)} semanas, {len(renderizadas)} re-renderizadas: {', '.join(renderizadas) or 'ninguna'}.")
+    return renderizadas
+
+
+@app.route('/historial_global')
+def historial_global():
+    """
+    Renderiza la página de historial global de partidas para la temporada actual.
+    - ?page=N&limit=50: páginas numeradas montadas con los cubos semanales precalculados.
+    - ?cursor=<timestamp:match_id:puuid>&limit=50: fusión en vivo de los historiales.
+    Sin parámetros se sirve la página 1 precalculada o, si aún no existe, la fusión en vivo.
+    """
+    print("[historial_global] Petición recibida para la página de historial global.")
+    cursor = request.args.get('cursor') or None
+    try:
+        limite = min(max(int(request.args.get('limit', HISTORIAL_GLOBAL_PAGE_SIZE)), 1), HISTORIAL_GLOBAL_MAX_PAGE_SIZE)
+        pagina = max(int(request.args.get('page', 1)), 1)
+        decodificar_cursor(cursor)
+    except ValueError:
+        return jsonify({"error": "Parámetros 'cursor', 'page' o 'limit' no válidos"}), 400
+
+    if not cursor:
+        filas_html, total = HISTORIAL_GLOBAL_SEMANAS.pagina(pagina, limite)
+        if filas_html is not None:
+            total_paginas = max((total + limite - 1) // limite, 1)
+            print(f"[historial_global] Página {pagina}/{total_paginas} servida desde los cubos semanales.")
+            return render_template('historial_global.html',
+                                   filas_html=filas_html,
+                                   page=pagina,
+                                   total_pages=total_paginas,
+                                   limit=limite)
+        # Aún no hay cubos: se generan en segundo plano y mientras tanto se fusiona en vivo
+        _refrescar_en_segundo_plano('historial_global', precalcular_historial_global)
+
+    jugadores_por_puuid, historiales = _historiales_temporada()
+
+    # Fusión k-way de los historiales (ya ordenados): solo se recorren las partidas de esta página
+    partidas, siguiente_cursor = pagina_fusionada(historiales, limite, cursor, SEASON_START_TIMESTAMP * 1000)
+    filas = [_fila_historial_global(match, jugadores_por_puuid) for match in partidas]
+    
+    print(f"[historial_global] Página de {len(filas)} partidas (cursor: {cursor or 'inicio'}).")
 
     return render_template('historial_global.html',
-                           global_match_history=final_matches,
+                           filas_html=_renderizar_filas(HISTORIAL_GLOBAL_ROW_TEMPLATE, filas,
+                                                        campos_clave=HISTORIAL_GLOBAL_ROW_EXTRA_FIELDS),
+                           cursor=cursor,
+                           next_cursor=siguiente_cursor,
+                           limit=limite,
                            ddragon_version=DDRAGON_VERSION)
 
 
 
+# --- CLASIFICACIÓN HISTÓRICA ("AS OF") ---
+# Checkpoints diarios: clasificación al cierre (UTC) de cada día ya terminado.
+# { (queue_type, dia_utc): filas }. Un día cerrado no cambia, así que no caduca.
+LEADERBOARD_AS_OF_CHECKPOINTS = {}
+LEADERBOARD_AS_OF_LOCK = threading.Lock()
+LEADERBOARD_AS_OF_MAX_CHECKPOINTS = 1000
+DAY_MS = 24 * 3600 * 1000
+
+def _clasificacion_en(lp_tramos, queue_type, timestamp_ms, nombres):
+    """
+    Reconstruye la clasificación de una cola en un instante: por jugador, búsqueda binaria
+    del último snapshot <= timestamp en sus tramos. O(jugadores * log tramos); no carga historiales.
+    """
+    filas = []
+    for puuid, colas in lp_tramos.items():
+        snapshot = snapshot_antes(colas.get(queue_type) or [], timestamp_ms + 1)
+        if not snapshot or not snapshot.get('elo'):
+            continue
+        tier, rank, league_points = descomponer_valor_clasificacion(snapshot['elo'])
+        jugador, game_name = nombres.get(puuid, (None, None))
+        filas.append({
+            'puuid': puuid,
+            'jugador': jugador,
+            'game_name': game_name,
+            'queue_type': queue_type,
+            'valor_clasificacion': snapshot['elo'],
+            'tier': tier,
+            'rank': rank,
+            'league_points': snapshot.get('league_points_raw', league_points),
+            'snapshot_timestamp': snapshot['timestamp']
+        })
+    filas.sort(key=lambda f: f['valor_clasificacion'], reverse=True)
+    for posicion, fila in enumerate(filas, start=1):
+        fila['posicion'] = posicion
+    return filas
+
+def obtener_clasificacion_historica(queue_type, timestamp_ms):
+    """
+    Clasificación de una cola tal y como estaba en `timestamp_ms`. Si el instante es el
+    cierre de un día ya terminado (y ya volcado desde el búfer de snapshots) se sirve
+    desde el checkpoint diario.
+    """
+    lp_tramos = leer_lp_history_tramos()
+    snapshot = obtener_snapshot_clasificacion()
+    nombres = {f.get('puuid'): (f.get('jugador'), f.get('game_name')) for f in snapshot.rows}
+
+    dia = (timestamp_ms + 1) // DAY_MS - 1 if (timestamp_ms + 1) % DAY_MS == 0 else None
+    dia_cerrado = dia is not None and (dia + 1) * DAY_MS < (time.time() - LP_SNAPSHOTS_SAVE_INTERVAL) * 1000
+    if dia_cerrado:
+        with LEADERBOARD_AS_OF_LOCK:
+            filas = LEADERBOARD_AS_OF_CHECKPOINTS.get((queue_type, dia))
+        if filas is not None:
+            return filas
+
+    filas = _clasificacion_en(lp_tramos, queue_type, timestamp_ms, nombres)
+    if dia_cerrado and filas:
+        with LEADERBOARD_AS_OF_LOCK:
+            if len(LEADERBOARD_AS_OF_CHECKPOINTS) >= LEADERBOARD_AS_OF_MAX_CHECKPOINTS:
+                LEADERBOARD_AS_OF_CHECKPOINTS.pop(next(iter(LEADERBOARD_AS_OF_CHECKPOINTS)))
+            LEADERBOARD_AS_OF_CHECKPOINTS[(queue_type, dia)] = filas
+    return filas
+
+@app.route('/api/leaderboard/as_of')
+def get_leaderboard_as_of():
+    """
+    API endpoint con la clasificación en un instante pasado.
+    ?timestamp=<ms UTC> o ?date=YYYY-MM-DD (cierre de ese día UTC), &queue=RANKED_SOLO_5x5|RANKED_FLEX_SR|420|440
+    """
+    queue_param = request.args.get('queue', 'RANKED_SOLO_5x5')
+    queue_type = {'420': 'RANKED_SOLO_5x5', '440': 'RANKED_FLEX_SR'}.get(queue_param, queue_param)
+    if queue_type not in ('RANKED_SOLO_5x5', 'RANKED_FLEX_SR'):
+        return jsonify({"error": "Cola no soportada"}), 400
+
+    try:
+        if request.args.get('date'):
+            inicio_dia = datetime.strptime(request.args['date'], '%Y-%m-%d').replace(tzinfo=timezone.utc)
+            timestamp_ms = int(inicio_dia.timestamp() * 1000) + DAY_MS - 1
+        else:
+            timestamp_ms = int(request.args.get('timestamp', time.time() * 1000))
+    except ValueError:
+        return jsonify({"error": "Parámetro 'timestamp' (ms) o 'date' (YYYY-MM-DD) inválido"}), 400
+
+    inicio = time.time()
+    filas = obtener_clasificacion_historica(queue_type, timestamp_ms)
+    print(f"[get_leaderboard_as_of] Clasificación {queue_type} a {timestamp_ms}: {len(filas)} filas en {(time.time() - inicio) * 1000:.1f} ms.")
+    return jsonify({'queue': queue_type, 'timestamp': timestamp_ms, 'players': filas})
+
+def _respuesta_con_etag(etag, calcular):
+    """
+    Responde 304 si el cliente ya tiene la versión `etag` (If-None-Match) sin llamar a `calcular`;
+    si no, devuelve `calcular()` con la ETag. Sin ETag (versión aún desconocida) se calcula siempre.
+    """
+    if etag and request.if_none_match.contains_weak(etag):
+        respuesta = make_response('', 304)
+        respuesta.set_etag(etag)
+    else:
+        respuesta = make_response(calcular())
+        if etag and respuesta.status_code == 200:
+            respuesta.set_etag(etag)
+    # El navegador puede guardar la respuesta, pero debe revalidarla (If-None-Match) antes de usarla
+    respuesta.headers['Cache-Control'] = 'no-cache'
+    return respuesta
+
+
+@app.route('/api/leaderboard/stream')
+def leaderboard_stream():
+    """
+    Server-Sent Events con los cambios por fila de la clasificación (ver services/leaderboard_events.py).
+    El cliente indica la versión de la instantánea que tiene con `?desde=` o, al reconectar, con Last-Event-ID.
+    """
+    desde = request.headers.get('Last-Event-ID') or request.args.get('desde')
+    try:
+        desde = int(desde) if desde else None
+    except ValueError:
+        desde = None
+    if not DIFUSOR_CLASIFICACION.conectar():
+        # Sin hueco: 204 hace que EventSource deje de reintentar y la portada funciona como antes
+        return '', 204
+
+    def generar():
+        version = desde
+        fin = time.time() + SSE_MAX_CONNECTION
+        try:
+            yield f"retry: {SSE_RETRY_MS}\n\n"
+            while time.time() < fin:
+                mensajes, version = DIFUSOR_CLASIFICACION.esperar(version, SSE_HEARTBEAT)
+                yield ''.join(mensajes) if mensajes else ": ping\n\n"
+        finally:
+            DIFUSOR_CLASIFICACION.desconectar()
+
+    return Response(generar(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
 @app.route('/api/players_and_accounts')
 def get_players_and_accounts():
+    snapshot = obtener_snapshot_clasificacion()
+    # Solo depende de la instantánea de la clasificación, cuya versión se comparte entre procesos
+    return _respuesta_con_etag(f"accounts-{snapshot.version}", lambda: _players_and_accounts(snapshot))
+
+
+def _players_and_accounts(snapshot):
     print("[get_players_and_accounts] Petición recibida para obtener jugadores y cuentas.")
-    datos_jugadores, _ = obtener_datos_jugadores()
+    datos_jugadores = snapshot.rows
     
     players_data = {}
     for jugador_info in datos_jugadores:
@@ -1921,18 +2566,94 @@ def get_players_and_accounts():
     print(f"[get_players_and_accounts] Devolviendo {len(players_data)} jugadores con sus cuentas.")
     return jsonify(players_data)
 
+PLAYER_PAGE_CACHE = CacheRender()
+PLAYER_PAGE_HOT_LIMIT = 10 # Perfiles más visitados que se re-renderizan por adelantado tras un cambio de datos
+
+
+def _version_perfil(game_name):
+    """
+    Versión de datos de la página de un jugador: cambia con la versión de la clasificación, la huella
+    de su historial y de su historial de LP, sus picos de elo, la versión de Data Dragon o la plantilla.
+    Solo usa contadores y huellas ya registrados (sin cargar el historial salvo que hayan caducado),
+    y todos dependen del contenido, así que los workers comparten las páginas guardadas.
+    Devuelve None si el jugador no está en la clasificación.
+    """
+    snapshot = obtener_snapshot_clasificacion()
+    filas = [fila for fila in snapshot.rows if fila.get('game_name') == game_name]
+    if not filas:
+        return None
+    puuid = filas[0].get('puuid')
+    huella_partidas = huella_lp = None
+    if puuid:
+        huella_partidas = DATA_VERSIONS.huella(f"match_history:{puuid}", max_edad=PLAYER_MATCH_HISTORY_CACHE_TIMEOUT)
+        if huella_partidas is None:
+            huella_partidas = _huella_historial(get_player_match_history(puuid, riot_id=game_name))
+        huella_lp = DATA_VERSIONS.huella(f"lp_history:{puuid}", max_edad=LP_HISTORY_TTL)
+        if huella_lp is None:
+            huella_lp = _registrar_version_lp(puuid, leer_lp_history_tramos().get(puuid, {}))
+    with PEAK_ELO_LOCK:
+        picos = [PEAK_ELO_CACHE['data'].get(get_peak_elo_key(fila)) for fila in filas]
+    clave = (snapshot.version, huella_partidas, huella_lp, picos, _version_iconos(), _huella_plantilla('jugador.html'))
+    return hashlib.sha1(repr(clave).encode('utf-8')).hexdigest()
+
+
+def _renderizar_perfil(game_name):
+    """Renderiza la página de perfil de un jugador. Devuelve None si el jugador no existe."""
+    perfil = _get_player_profile_data(game_name)
+    if not perfil:
+        return None
+    return render_template('jugador.html',
+                           perfil=perfil,
+                           ddragon_version=DDRAGON_VERSION,
+                           datetime=datetime,
+                           now=datetime.now())
+
+
+def prerenderizar_perfiles_calientes():
+    """Tras un cambio de datos, vuelve a renderizar solo los perfiles más visitados cuya versión ha cambiado."""
+    renderizados = 0
+    for clave in PLAYER_PAGE_CACHE.calientes(PLAYER_PAGE_HOT_LIMIT):
+        game_name = clave.split(':', 1)[1]
+        version = _version_perfil(game_name)
+        if version is None or PLAYER_PAGE_CACHE.version(clave) == version:
+            continue
+        with app.test_request_context('/'):
+            html = _renderizar_perfil(game_name)
+        if html is not None:
+            PLAYER_PAGE_CACHE.guardar(clave, version, html, contar_acceso=False)
+            renderizados += 1
+    print(f"[prerenderizar_perfiles_calientes] {renderizados} perfiles re-renderizados. Caché: {PLAYER_PAGE_CACHE.estadisticas()}")
+    return renderizados
+
+
 @app.route('/jugador/<path:game_name>')
 def perfil_jugador(game_name):
     """
     Muestra una página de perfil para un jugador específico, detectando
     el tipo de dispositivo para renderizar la plantilla adecuada.
+    La página se sirve desde la caché de páginas renderizadas si su versión de datos no ha cambiado.
     """
     print(f"[perfil_jugador] Petición recibida para el perfil de jugador: {game_name}")
-    perfil = _get_player_profile_data(game_name)
-    if not perfil:
+    clave = f"perfil:{game_name}"
+    version = _version_perfil(game_name)
+    if version is None:
         print(f"[perfil_jugador] Perfil de jugador {game_name} no encontrado. Retornando 404.")
         return render_template('404.html'), 404
 
+    if elegir_codificacion(request.headers.get('Accept-Encoding', ''), disponibles=('gzip',)):
+        comprimido = PLAYER_PAGE_CACHE.obtener_gzip(clave, version)
+        if comprimido is not None:
+            print(f"[perfil_jugador] Sirviendo {game_name} desde la caché de páginas renderizadas (gzip).")
+            respuesta = make_response(comprimido)
+            respuesta.headers['Content-Encoding'] = 'gzip'
+            respuesta.vary.add('Accept-Encoding')
+            return respuesta
+    else:
+        html = PLAYER_PAGE_CACHE.obtener(clave, version)
+        if html is not None:
+            print(f"[perfil_jugador] Sirviendo {game_name} desde la caché de páginas renderizadas.")
+            return html
+
     user_agent_string = request.headers.get('User-Agent', '').lower()
     is_mobile = any(keyword in user_agent_string for keyword in ['mobi', 'android', 'iphone', 'ipad'])
     
@@ -1940,13 +2661,57 @@ def perfil_jugador(game_name):
     
     print(f"[perfil_jugador] Dispositivo detectado como {'Móvil' if is_mobile else 'Escritorio'}. Renderizando {template_name} para {game_name}.")
 
-    return render_template(template_name,
-                           perfil=perfil,
-                           ddragon_version=DDRAGON_VERSION,
-                           datetime=datetime,
-                           now=datetime.now())
+    html = _renderizar_perfil(game_name)
+    if html is None:
+        print(f"[perfil_jugador] Perfil de jugador {game_name} no encontrado. Retornando 404.")
+        return render_template('404.html'), 404
+    PLAYER_PAGE_CACHE.guardar(clave, version, html)
+    return html
+
+
 
+PLAYER_MATCHES_PAGE_SIZE = 20
+PLAYER_MATCHES_MAX_PAGE_SIZE = 100
+PLAYER_MATCHES_DETAIL_FIELDS = ('all_participants',) # Solo se envían en el JSON con ?details=1
+PLAYER_MATCH_ROW_TEMPLATE = '_fila_partida_jugador.html'
 
+# Historial con el LP ya atribuido: { puuid: {'version': ..., 'partidas': [...]} }
+PROCESSED_HISTORY_CACHE = {}
+PROCESSED_HISTORY_LOCK = threading.Lock()
+
+
+def _historial_procesado(puuid, riot_id=None):
+    """
+    Historial del jugador con el LP atribuido, de más reciente a más antigua.
+    Solo se vuelve a procesar si cambian sus partidas o su historial de LP.
+    """
+    matches = get_player_match_history(puuid, riot_id=riot_id).get('matches', [])
+    lp_tramos = leer_lp_history_tramos().get(puuid, {})
+    version = (len(matches), matches[0].get('match_id') if matches else None,
+               _huella_lp(lp_tramos))
+    with PROCESSED_HISTORY_LOCK:
+        cached = PROCESSED_HISTORY_CACHE.get(puuid)
+        if cached and cached['version'] == version:
+            return cached['partidas']
+
+    partidas = process_player_match_history(matches, expandir_historial({puuid: lp_tramos}).get(puuid, {}))
+    with PROCESSED_HISTORY_LOCK:
+        PROCESSED_HISTORY_CACHE[puuid] = {'version': version, 'partidas': partidas}
+    return partidas
+
+
+ELO_CHART_DEFAULT_WIDTH = 600 # Puntos máximos de la serie embebida en el perfil
+ELO_CHART_MAX_WIDTH = 4000
+
+def _serie_elo_para_grafico(partidas, queue_id, ancho):
+    """Serie {'timestamp', 'elo'} de una cola a partir del post-game de las partidas, reducida a `ancho` puntos."""
+    puntos = sorted(
+        ({'timestamp': p['game_end_timestamp'], 'elo': p['post_game_valor_clasificacion']}
+         for p in partidas
+         if p.get('queue_id') == queue_id and p.get('post_game_valor_clasificacion') is not None),
+        key=lambda x: x['timestamp']
+    )
+    return serie_para_grafico(puntos, int(time.time() * 1000), SEASON_START_TIMESTAMP * 1000, ancho)
 
 def _get_player_profile_data(game_name):
     """
@@ -1956,7 +2721,8 @@ def _get_player_profile_data(game_name):
     """
     print(f"[_get_player_profile_data] Obteniendo datos de perfil para: {game_name}")
     todos_los_datos, _ = obtener_datos_jugadores()
-    datos_del_jugador = [j for j in todos_los_datos if j.get('game_name') == game_name]
+    # Copias mutables: se añaden peak_elo y rachas sin tocar la instantánea publicada.
+    datos_del_jugador = [dict(j) for j in todos_los_datos if j.get('game_name') == game_name]
     
     if not datos_del_jugador:
         print(f"[_get_player_profile_data] No se encontraron datos para el jugador {game_name} en la caché.")
@@ -1966,7 +2732,7 @@ def _get_player_profile_data(game_name):
     puuid = primer_perfil.get('puuid')
 
     # --- Cargar Peak Elo para el perfil ---
-    lectura_exitosa, peak_elo_dict = leer_peak_elo()
+    lectura_exitosa, peak_elo_dict = leer_peak_elo(permitir_obsoleto=True)
     if lectura_exitosa:
         for item in datos_del_jugador:
             key = get_peak_elo_key(item)
@@ -1976,22 +2742,26 @@ def _get_player_profile_data(game_name):
             item['peak_elo'] = peak
 
     # --- NUEVA LÓGICA DE CÁLCULO DE LP ---
-    lp_history = leer_lp_history()
-    player_lp_history = lp_history.get(puuid, {})
-    
+    # El historial procesado (con LP atribuido) se cachea por jugador en _historial_procesado
     historial_partidas_completo = {}
     processed_matches = []
     if puuid:
         historial_partidas_completo = get_player_match_history(puuid, riot_id=game_name)
-        matches = historial_partidas_completo.get('matches', [])
-        processed_matches = process_player_match_history(matches, player_lp_history)
+        processed_matches = _historial_procesado(puuid, riot_id=game_name)
 
+    # Solo la primera página del historial va en el HTML; el resto se pide a /api/player/<puuid>/matches
+    primera_pagina, siguiente_cursor = pagina_fusionada([processed_matches], PLAYER_MATCHES_PAGE_SIZE)
 
     perfil = {
         'nombre': primer_perfil.get('jugador', 'N/A'),
         'game_name': game_name,
+        'puuid': puuid,
         'perfil_icon_url': primer_perfil.get('perfil_icon_url', ''),
-        'historial_partidas': processed_matches
+        'historial_partidas': primera_pagina,
+        'historial_filas_html': _renderizar_filas(PLAYER_MATCH_ROW_TEMPLATE, primera_pagina, {'perfil': {'game_name': game_name}}),
+        'historial_siguiente_cursor': siguiente_cursor,
+        'colas_historial': sorted({m.get('queue_id') for m in processed_matches if m.get('queue_id') is not None}),
+        'campeones_historial': sorted({m['champion_name'] for m in processed_matches if m.get('champion_name')}),
     }
     
     for item in datos_del_jugador:
@@ -2000,72 +2770,30 @@ def _get_player_profile_data(game_name):
         elif item.get('queue_type') == 'RANKED_FLEX_SR':
             perfil['flexq'] = item
 
-    historial_total = perfil.get('historial_partidas', [])
+    historial_total = processed_matches
     
     # --- Lógica de Gráfico de Evolución basada en el historial de partidas ---
-    partidas_con_elo_soloq = sorted(
-        [p for p in historial_total if p.get('queue_id') == 420 and p.get('post_game_valor_clasificacion') is not None],
-        key=lambda x: x.get('game_end_timestamp', 0)
-    )
-    perfil['elo_history_soloq'] = [
-        {'timestamp': p['game_end_timestamp'], 'elo': p['post_game_valor_clasificacion']}
-        for p in partidas_con_elo_soloq
-    ]
-
-    partidas_con_elo_flexq = sorted(
-        [p for p in historial_total if p.get('queue_id') == 440 and p.get('post_game_valor_clasificacion') is not None],
-        key=lambda x: x.get('game_end_timestamp', 0)
-    )
-    perfil['elo_history_flexq'] = [
-        {'timestamp': p['game_end_timestamp'], 'elo': p['post_game_valor_clasificacion']}
-        for p in partidas_con_elo_flexq
-    ]
+    # Retención por niveles + LTTB: el tamaño de la serie embebida no crece con el historial.
+    perfil['elo_history_soloq'] = _serie_elo_para_grafico(historial_total, 420, ELO_CHART_DEFAULT_WIDTH)
+    perfil['elo_history_flexq'] = _serie_elo_para_grafico(historial_total, 440, ELO_CHART_DEFAULT_WIDTH)
 
-    if 'soloq' in perfil:
-        partidas_soloq = [p for p in historial_total if p.get('queue_id') == 420]
-        rachas_soloq = calcular_rachas(partidas_soloq)
-        perfil['soloq'].update(rachas_soloq)
-        print(f"[_get_player_profile_data] Rachas SoloQ calculadas para {game_name}.")
+    if 'soloq' in perfil and puuid:
+        perfil['soloq'].update(rachas_jugador(puuid, historial_partidas_completo.get('matches', []), 420,
+                                              SEASON_START_TIMESTAMP * 1000))
 
-    if 'flexq' in perfil:
-        partidas_flexq = [p for p in historial_total if p.get('queue_id') == 440]
-        rachas_flexq = calcular_rachas(partidas_flexq)
-        perfil['flexq'].update(rachas_flexq)
-        print(f"[_get_player_profile_data] Rachas FlexQ calculadas para {game_name}.")
+    if 'flexq' in perfil and puuid:
+        perfil['flexq'].update(rachas_jugador(puuid, historial_partidas_completo.get('matches', []), 440,
+                                              SEASON_START_TIMESTAMP * 1000))
 
     # --- Champion Specific Stats ---
-    champion_stats = {}
-    for match in historial_total:
-        champion_name = match.get('champion_name')
-        if champion_name and champion_name != "Desconocido":
-            if champion_name not in champion_stats:
-                champion_stats[champion_name] = {
-                    'games_played': 0,
-                    'wins': 0,
-                    'losses': 0,
-                    'kills': 0,
-                    'deaths': 0,
-                    'assists': 0
-                }
-            
-            stats = champion_stats[champion_name]
-            stats['games_played'] += 1
-            if match.get('win'):
-                stats['wins'] += 1
-            else:
-                stats['losses'] += 1
-            
-            stats['kills'] += match.get('kills', 0)
-            stats['deaths'] += match.get('deaths', 0)
-            stats['assists'] += match.get('assists', 0)
-
-    for champ, stats in champion_stats.items():
-        stats['win_rate'] = (stats['wins'] / stats['games_played'] * 100) if stats['games_played'] > 0 else 0
-        stats['kda'] = (stats['kills'] + stats['assists']) / max(1, stats['deaths'])
-
-    perfil['champion_stats'] = sorted(champion_stats.items(), key=lambda x: x[1]['games_played'], reverse=True)
+    # Filas precalculadas de la tabla agregada (todas las colas)
+    champion_stats = []
+    if puuid:
+        actualizar_campeones(puuid, historial_partidas_completo.get('matches', []), SEASON_START_TIMESTAMP * 1000)
+        champion_stats = [(fila['champion_name'], fila) for fila in filas_campeones(puuid)
+                          if fila['champion_name'] != "Desconocido"]
+    perfil['champion_stats'] = champion_stats
 
-    perfil['historial_partidas'].sort(key=lambda x: x.get('game_end_timestamp', 0), reverse=True)
     print(f"[_get_player_profile_data] Perfil de {game_name} preparado.")
     return perfil
 
@@ -2087,9 +2815,7 @@ def actualizar_historial_partidas_en_segundo_plano():
 
     while True:
         try:
-            if not ALL_CHAMPIONS or not ALL_RUNES or not ALL_SUMMONER_SPELLS:
-                print("[actualizar_historial_partidas_en_segundo_plano] Datos de DDragon no cargados, intentando actualizar.")
-                actualizar_ddragon_data()
+            asegurar_datos_ddragon(bloqueante=True)
 
             lp_history = leer_lp_history()
             cuentas = leer_cuentas()
@@ -2206,16 +2932,12 @@ def actualizar_historial_partidas_en_segundo_plano():
                     matches_without_lp = [m for m in current_all_matches if m.get('lp_change_this_game') is None]
                     
                     if matches_without_lp:
+                        # Las partidas se actualizan in situ: son los mismos objetos que current_all_matches
                         updated_matches = _process_lp_for_matches(matches_without_lp, player_lp_history, current_all_matches)
-                        for match_idx, match in enumerate(updated_matches):
+                        for match in updated_matches:
                             if match.get('lp_change_this_game') is not None:
                                 updated_existing_matches = True
-                                # Encontrar y actualizar el match original
-                                for i, orig_match in enumerate(current_all_matches):
-                                    if orig_match['match_id'] == match['match_id']:
-                                        current_all_matches[i].update(match)
-                                        print(f"[actualizar_historial_partidas_en_segundo_plano] LP re-calculado para match {match['match_id']} de {riot_id}: {match['lp_change_this_game']}")
-                                        break
+                                print(f"[actualizar_historial_partidas_en_segundo_plano] LP re-calculado para match {match['match_id']} de {riot_id}: {match['lp_change_this_game']}")
 
 
                 stats_have_changed = False # No longer calculated here
@@ -2236,22 +2958,31 @@ def actualizar_historial_partidas_en_segundo_plano():
 
                     # --- ACTUALIZAR LA CACHÉ EN MEMORIA DESPUÉS DE GUARDAR EN GITHUB ---
                     with PLAYER_MATCH_HISTORY_LOCK:
-                        PLAYER_MATCH_HISTORY_CACHE[puuid] = {
-                            'data': historial_existente,
-                            'timestamp': time.time()
-                        }
+                        _cachear_historial(puuid, historial_existente)
                         print(f"[actualizar_historial_partidas_en_segundo_plano] Historial de {puuid} actualizado y cacheado en memoria.", flush=True)
                         print(f"[actualizar_historial_partidas_en_segundo_plano] Historial de {riot_id} actualizado y cacheado en memoria.", flush=True)
 
 
-                    # Invalidate personal records cache for this player
+                    # Invalidate personal records cache for this player (todas sus claves '<puuid>_<campeón>')
                     with PERSONAL_RECORDS_LOCK:
-                        if puuid in PERSONAL_RECORDS_CACHE['data']:
-                            del PERSONAL_RECORDS_CACHE['data'][puuid]
-                            print(f"[actualizar_historial_partidas_en_segundo_plano] Récords personales cacheados para {riot_id} invalidados.")
+                        claves_jugador = [k for k in PERSONAL_RECORDS_CACHE['data'] if k.startswith(f"{puuid}_")]
+                        for clave in claves_jugador:
+                            del PERSONAL_RECORDS_CACHE['data'][clave]
+                        if claves_jugador:
+                            PERSONAL_RECORDS_CACHE['version'] += 1
+                    # Avanza la versión de cada clave: las ETag emitidas dejan de valer
+                    for clave in claves_jugador:
+                        DATA_VERSIONS.registrar(f"personal_records:{clave}")
+                    if claves_jugador:
+                        print(f"[actualizar_historial_partidas_en_segundo_plano] Récords personales cacheados para {riot_id} invalidados.")
                 else:
                     print(f"[actualizar_historial_partidas_en_segundo_plano] No hay cambios significativos para guardar en el historial de {riot_id}.")
 
+            try:
+                precalcular_historial_global()
+            except Exception as e:
+                print(f"[actualizar_historial_partidas_en_segundo_plano] Error precalculando el historial global: {e}")
+            _refrescar_en_segundo_plano('perfiles_calientes', prerenderizar_perfiles_calientes)
             print("[actualizar_historial_partidas_en_segundo_plano] Ciclo de actualización de historial completado. Próxima revisión en 5 minutos.")
             time.sleep(600)
 
@@ -2362,16 +3093,8 @@ def _create_record_dict(match, value, record_type):
 
     print(f"[_create_record_dict] Final champion_name: {champion_name}, actual_champion_id: {actual_champion_id}")
 
-    # Records where 0 should be displayed as N/A
-    na_if_zero_records = [
-        'largest_killing_spree', 'largest_multikill', 'most_turret_kills',
-        'most_inhibitor_kills', 'most_baron_kills', 'most_dragon_kills',
-        'most_objectives_stolen', 'most_double_kills', 'most_triple_kills',
-        'most_quadra_kills', 'most_penta_kills'
-    ]
-
     final_value = value
-    if record_type in na_if_zero_records and value == 0:
+    if record_type in RECORDS_NA_SI_CERO and value == 0:
         final_value = None # Set to None if 0 and should be N/A
 
     return {
@@ -2391,97 +3114,46 @@ def _create_record_dict(match, value, record_type):
         'record_type': record_type # Para identificar el tipo de récord
     }
 
-# Function to update a record with tie-breaking logic (smaller timestamp wins)
-def _update_record(current_record, new_value, new_match, record_type):
-    """Actualiza un récord con lógica de desempate: se prefiere mayor valor, o el más antiguo si los valores son iguales.
-    También actualiza si el registro actual es el valor predeterminado y el nuevo valor es >= 0.
+def _process_lp_for_matches(matches, player_lp_history, all_player_matches):
     """
-    new_record_data = _create_record_dict(new_match, new_value, record_type)
-
-    # Check if the current record is still the unpopulated default
-    is_current_record_default = (current_record['value'] == 0 and current_record['player'] == 'N/A' and current_record['achieved_timestamp'] == 0)
-
-    # Lógica de actualización:
-    # 1. Si el nuevo valor es estrictamente mayor, siempre actualiza.
-    # 2. Si los valores son iguales, prefiere la partida más antigua (timestamp más pequeño).
-    # 3. Si el récord actual es el valor por defecto (no inicializado), y el nuevo valor es >= 0, actualiza.
-    current_value_for_comparison = current_record['value'] if current_record['value'] is not None else -1
-    new_value_for_comparison = new_record_data['value'] if new_record_data['value'] is not None else -1
-
-    if new_value_for_comparison > current_value_for_comparison or \
-       (new_value_for_comparison == current_value_for_comparison and
-        new_record_data['achieved_timestamp'] < current_record['achieved_timestamp']) or \
-       (is_current_record_default and new_value_for_comparison >= 0): 
-        return new_record_data
-    return current_record
-
-def _find_lp_change(match, player_lp_history, all_player_matches, match_ids_set=None):
-    """Busca y calcula el cambio de LP para una partida específica.
-    OPTIMIZACIÓN: Recibe set de match_ids para validación O(1) en lugar de O(n).
+    Procesa y asigna LP a un conjunto de partidas en una sola pasada por cola
+    (attribute_lp_changes ordena snapshots y partidas una única vez).
     """
-    game_end_ts = match.get('game_end_timestamp', 0)
-    queue_id = match.get('queue_id')
-    queue_name = "RANKED_SOLO_5x5" if queue_id == 420 else "RANKED_FLEX_SR" if queue_id == 440 else None
-    
-    if not (game_end_ts > 0 and queue_name and queue_name in player_lp_history):
-        return None
-    
-    snapshots = sorted(player_lp_history[queue_name], key=lambda x: x['timestamp'])
-
-    # Búsqueda binaria para encontrar snapshots anterior y posterior
-    # bisect in the stdlib doesn't support a `key` argument, so build a list of timestamps
-    timestamps = [s['timestamp'] for s in snapshots]
-    idx = bisect.bisect_left(timestamps, game_end_ts)
-
-    snapshot_before = snapshots[idx - 1] if idx > 0 else None
-    snapshot_after = snapshots[idx] if idx < len(snapshots) else None
-    
-    if not (snapshot_before and snapshot_after):
-        return None
-    
-    # OPTIMIZACIÓN: Usar set de match_ids para búsqueda O(1) en lugar de O(n)
-    match_id = match['match_id']
-    if match_ids_set:
-        # Validación rápida: si hay otro match en ese rango, probablemente no sea limpio
-        # Nota: Esta es una heurística. Para ser 100% preciso usaría all_player_matches
-        pass
-    else:
-        # Fallback: validación completa si no se proporciona set
-        for other_match in all_player_matches:
-            if other_match['match_id'] != match_id and other_match.get('queue_id') == queue_id:
-                other_ts = other_match.get('game_end_timestamp', 0)
-                if snapshot_before['timestamp'] < other_ts < snapshot_after['timestamp']:
-                    return None  # No es cambio limpio
-    
-    elo_before = snapshot_before.get('elo', 0)
-    elo_after = snapshot_after.get('elo', 0)
-    
-    return {
-        'lp_change': elo_after - elo_before,
-        'pre_game': elo_before,
-        'post_game': elo_after
-    }
-
-def _process_lp_for_matches(matches, player_lp_history, all_player_matches):
-    """Procesa y asigna LP a un conjunto de partidas en una sola pasada."""
-    results = []
+    lp_por_partida = attribute_lp_changes(matches, all_player_matches, player_lp_history)
     for match in matches:
-        lp_info = _find_lp_change(match, player_lp_history, all_player_matches)
-        if lp_info:
-            match['lp_change_this_game'] = lp_info['lp_change']
-            match['pre_game_valor_clasificacion'] = lp_info['pre_game']
-            match['post_game_valor_clasificacion'] = lp_info['post_game']
-        results.append(match)
-    return results
+        lp_change, elo_before, elo_after = lp_por_partida.get(match['match_id'], (None, None, None))
+        if lp_change is not None:
+            match['lp_change_this_game'] = lp_change
+            match['pre_game_valor_clasificacion'] = elo_before
+            match['post_game_valor_clasificacion'] = elo_after
+    return matches
+
+
+GLOBAL_STATS_QUEUE_GROUPS = {
+    'all': None,
+    'all_rankeds': (420, 440),
+    'soloq': (420,),
+    'flex': (440,)
+}
+GLOBAL_RECORDS_TOP_N = 5 # Tamaño de los rankings por récord ('record_boards')
 
 
-def _calculate_stats_for_queue(all_matches, queue_id_filter, champion_filter=None):
+class _AcumuladorEstadisticasGlobales:
     """
-    Calculates global statistics for a specific queue from a list of all matches.
+    Acumulador de estadísticas globales de un grupo de partidas (ver services/aggregation).
+    Las partidas deben llegar en orden cronológico para actualizar las rachas de cada jugador en O(1).
     """
-    print(f"[_calculate_stats_for_queue] Calculating stats for queue_id: {queue_id_filter or 'all'}")
 
-    def default_record():
+    def __init__(self, grupo=None):
+        self.grupo = grupo
+        self.records = RecordTracker(top_n=GLOBAL_RECORDS_TOP_N)
+        self.total_games = 0
+        self.total_wins = 0
+        self.champion_counts = Counter()
+        self.streaks_by_player = {}
+
+    @staticmethod
+    def _default_record():
         return {
             'value': 0, 'player': 'N/A', 'riot_id': 'N/A', 'match_id': 'N/A', 'kda': 0,
             'game_date': 0, 'game_duration': 0, 'champion_name': 'N/A',
@@ -2489,145 +3161,64 @@ def _calculate_stats_for_queue(all_matches, queue_id_filter, champion_filter=Non
             'achieved_timestamp': 0, 'is_tied_record': False
         }
 
-    # Initialize records and counters for this specific queue
-    global_records = {k: default_record() for k in [
-        'longest_game', 'most_kills', 'most_deaths', 'most_assists', 'highest_kda',
-        'most_cs', 'most_damage_dealt', 'most_gold_earned', 'most_vision_score',
-        'largest_killing_spree', 'largest_multikill', 'most_time_spent_dead',
-        'most_wards_placed', 'most_wards_killed', 'most_turret_kills',
-        'most_inhibitor_kills', 'most_baron_kills', 'most_dragon_kills',
-        'most_damage_taken', 'most_total_heal', 'most_damage_shielded_on_teammates',
-        'most_time_ccing_others', 'most_objectives_stolen', 'highest_kill_participation',
-        'most_double_kills', 'most_triple_kills', 'most_quadra_kills', 'most_penta_kills',
-        'longest_win_streak', 'longest_loss_streak'
-    ]}
-    current_best_values = {key: 0 for key in global_records.keys()}
-    tied_counts = {key: 0 for key in global_records.keys()}
-    total_wins = 0
-    total_losses = 0
-    all_champions_played = []
-
-    # Filter matches
-    filtered_matches = all_matches
-    if champion_filter:
-        filtered_matches = [m for m in filtered_matches if m.get('champion_name') == champion_filter]
-    if queue_id_filter is not None:
-        if isinstance(queue_id_filter, list):
-            filtered_matches = [m for m in filtered_matches if m.get('queue_id') in queue_id_filter]
-        else:
-            filtered_matches = [m for m in filtered_matches if m.get('queue_id') == queue_id_filter]
-    
-    total_games_in_queue = len(filtered_matches)
-    if total_games_in_queue == 0:
-        return {
-            'overall_win_rate': 0,
-            'total_games': 0,
-            'most_played_champions': [],
-            'global_records': global_records
-        }
+    def anadir(self, match):
+        self.total_games += 1
+        if match.get('win'):
+            self.total_wins += 1
+        if match.get('champion_name'):
+            self.champion_counts[match['champion_name']] += 1
 
-    # --- Streak Calculation ---
-    matches_by_player = defaultdict(list)
-    for match in filtered_matches:
-        matches_by_player[match['puuid']].append(match)
+        streaks = self.streaks_by_player.get(match['puuid'])
+        if streaks is None:
+            streaks = self.streaks_by_player[match['puuid']] = EstadoRachas()
+        streaks.anadir(match)
 
-    best_win_streak = {'value': 0, 'match': None}
-    best_loss_streak = {'value': 0, 'match': None}
+        # Solo se guardan referencias (valor, partida); los dicts de récord se construyen una vez en resultado()
+        self.records.anadir(match)
 
-    for puuid, player_matches in matches_by_player.items():
-        player_matches.sort(key=lambda x: x.get('game_end_timestamp', 0))
-        streaks = calcular_rachas(player_matches)
-        
-        if streaks['max_win_streak'] > best_win_streak['value']:
-            best_win_streak['value'] = streaks['max_win_streak']
-            # Find the last match of this streak to represent the record
-            current_streak = 0
-            for match in player_matches:
-                if match.get('win'):
-                    current_streak += 1
-                    if current_streak == streaks['max_win_streak']:
-                        best_win_streak['match'] = match
-                        break
-                else:
-                    current_streak = 0
-
-        if streaks['max_loss_streak'] > best_loss_streak['value']:
-            best_loss_streak['value'] = streaks['max_loss_streak']
-            current_streak = 0
-            for match in player_matches:
-                if not match.get('win'):
-                    current_streak += 1
-                    if current_streak == streaks['max_loss_streak']:
-                        best_loss_streak['match'] = match
-                        break
-                else:
-                    current_streak = 0
-    
-    if best_win_streak['match']:
-        global_records['longest_win_streak'] = _update_record(global_records['longest_win_streak'], best_win_streak['value'], best_win_streak['match'], 'longest_win_streak')
-    if best_loss_streak['match']:
-        global_records['longest_loss_streak'] = _update_record(global_records['longest_loss_streak'], best_loss_streak['value'], best_loss_streak['match'], 'longest_loss_streak')
-    # --- End Streak Calculation ---
+    def resultado(self):
+        if self.total_games == 0:
+            return {
+                'overall_win_rate': 0,
+                'total_games': 0,
+                'most_played_champions': [],
+                'global_records': {k: self._default_record() for k in RECORD_KEYS},
+                'record_boards': {k: [] for k in RECORD_KEYS}
+            }
 
-    for match in filtered_matches:
-        if match.get('win'):
-            total_wins += 1
-        else:
-            total_losses += 1
-        
-        all_champions_played.append(match.get('champion_name'))
-
-        records_to_check = {
-            'longest_game': match.get('game_duration', 0),
-            'most_kills': match.get('kills', 0),
-            'most_deaths': match.get('deaths', 0),
-            'most_assists': match.get('assists', 0),
-            'highest_kda': match.get('kda', 0),
-            'most_cs': match.get('total_minions_killed', 0) + match.get('neutral_minions_killed', 0),
-            'most_damage_dealt': match.get('total_damage_dealt_to_champions', 0),
-            'most_gold_earned': match.get('gold_earned', 0),
-            'most_vision_score': match.get('vision_score', 0),
-            'largest_killing_spree': match.get('largest_killing_spree', 0),
-            'largest_multikill': match.get('largestMultiKill', 0),
-            'most_time_spent_dead': match.get('total_time_spent_dead', 0),
-            'most_wards_placed': match.get('wards_placed', 0),
-            'most_wards_killed': match.get('wards_killed', 0),
-            'most_turret_kills': match.get('turret_kills', 0),
-            'most_inhibitor_kills': match.get('inhibitor_kills', 0),
-            'most_baron_kills': match.get('baron_kills', 0),
-            'most_dragon_kills': match.get('dragon_kills', 0),
-            'most_damage_taken': match.get('total_damage_taken', 0),
-            'most_total_heal': match.get('total_heal', 0),
-            'most_damage_shielded_on_teammates': match.get('total_damage_shielded_on_teammates', 0),
-            'most_time_ccing_others': match.get('time_ccing_others', 0),
-            'most_objectives_stolen': match.get('objectives_stolen', 0),
-            'highest_kill_participation': match.get('kill_participation', 0),
-            'most_double_kills': match.get('doubleKills', 0),
-            'most_triple_kills': match.get('tripleKills', 0),
-            'most_quadra_kills': match.get('quadraKills', 0),
-            'most_penta_kills': match.get('pentaKills', 0),
-        }
+        # Rachas: la mejor racha de cada jugador ya lleva la partida en la que termina.
+        # Los empates entre jugadores se resuelven como cualquier otro récord (gana la partida más antigua).
+        for streaks in self.streaks_by_player.values():
+            for wins, record_key in ((True, 'longest_win_streak'), (False, 'longest_loss_streak')):
+                streak = streaks.mejor_racha(wins)
+                if streak['length'] > 0:
+                    self.records.registrar(record_key, streak['length'], streak['end'])
 
-        for record_key, current_value in records_to_check.items():
-            if current_value > current_best_values[record_key]:
-                current_best_values[record_key] = current_value
-                tied_counts[record_key] = 1
-            elif current_value == current_best_values[record_key] and current_value > 0:
-                tied_counts[record_key] += 1
-            
-            updated_record = _update_record(global_records[record_key], current_value, match, record_key)
-            global_records[record_key] = updated_record
-            global_records[record_key]['is_tied_record'] = (tied_counts[record_key] > 1)
+        return {
+            'overall_win_rate': self.total_wins / self.total_games * 100,
+            'total_games': self.total_games,
+            'most_played_champions': self.champion_counts.most_common(5),
+            'global_records': self.records.materializar(_create_record_dict, self._default_record, marcar_empates=True),
+            'record_boards': self.records.tablas(_create_record_dict)
+        }
 
-    overall_win_rate = (total_wins / total_games_in_queue * 100) if total_games_in_queue > 0 else 0
-    most_played_champions = Counter(c for c in all_champions_played if c).most_common(5)
 
-    return {
-        'overall_win_rate': overall_win_rate,
-        'total_games': total_games_in_queue,
-        'most_played_champions': most_played_champions,
-        'global_records': global_records
-    }
+def _calculate_stats_for_queue(all_matches, queue_id_filter, champion_filter=None):
+    """
+    Calculates global statistics for a specific queue from a list of all matches
+    (sorted from oldest to newest).
+    """
+    print(f"[_calculate_stats_for_queue] Calculating stats for queue_id: {queue_id_filter or 'all'}")
+    if queue_id_filter is None:
+        queues = None
+    elif isinstance(queue_id_filter, list):
+        queues = queue_id_filter
+    else:
+        queues = [queue_id_filter]
+    classifier = clasificador_por_cola({'selected': queues})
+    if champion_filter:
+        classifier = filtrar_clasificador(classifier, lambda m: m.get('champion_name') == champion_filter)
+    return agregar_por_grupos(all_matches, [classifier], _AcumuladorEstadisticasGlobales, grupos_fijos=['selected'])['selected']
 
 def _calculate_and_cache_global_stats():
     """
@@ -2652,24 +3243,31 @@ def _calculate_and_cache_global_stats():
                 match['jugador_nombre'] = jugador_nombre
                 match['riot_id'] = riot_id
                 all_matches.append(match)
-    
-    # Define the queue filters
-    queue_filters = {
-        'all': None,
-        'all_rankeds': [420, 440],
-        'soloq': 420,
-        'flex': 440
-    }
-    
-    # Calculate stats for each queue
-    all_stats = {}
-    for queue_name, queue_id in queue_filters.items():
-        all_stats[queue_name] = _calculate_stats_for_queue(all_matches, queue_id)
+
+    if not all_matches:
+        with GLOBAL_STATS_LOCK:
+            if GLOBAL_STATS_CACHE['data']:
+                # Fallo al descargar historiales: no pisar la caché (p. ej. la recargada al arrancar).
+                print("[_calculate_and_cache_global_stats] No se obtuvieron partidas. Se conserva la caché existente.")
+                return
+
+    # Un único recorrido cronológico reparte cada partida entre todas sus colas
+    all_matches.sort(key=lambda x: x.get('game_end_timestamp', 0))
+    all_stats = agregar_por_grupos(all_matches, [clasificador_por_cola(GLOBAL_STATS_QUEUE_GROUPS)],
+                                   _AcumuladorEstadisticasGlobales, grupos_fijos=GLOBAL_STATS_QUEUE_GROUPS)
+
+    champion_list = sorted(set(m.get('champion_name') for m in all_matches if m.get('champion_name')))
 
     with GLOBAL_STATS_LOCK:
         GLOBAL_STATS_CACHE['data'] = all_stats
         GLOBAL_STATS_CACHE['all_matches'] = all_matches
+        GLOBAL_STATS_CACHE['champion_list'] = champion_list
         GLOBAL_STATS_CACHE['timestamp'] = time.time()
+        GLOBAL_STATS_CACHE['version'] += 1
+        version = GLOBAL_STATS_CACHE['version']
+        timestamp = GLOBAL_STATS_CACHE['timestamp']
+    # Las partidas no se persisten (son el historial completo); solo los agregados.
+    guardar_cache('global_stats', {'stats': all_stats, 'champion_list': champion_list}, version, timestamp)
     print("[_calculate_and_cache_global_stats] Cálculo de estadísticas globales completado y caché actualizada para todas las colas.")
 
 
@@ -2694,15 +3292,21 @@ def estadisticas_globales():
     with GLOBAL_STATS_LOCK:
         all_global_stats = GLOBAL_STATS_CACHE['data']
         all_matches = GLOBAL_STATS_CACHE.get('all_matches', [])
+        champion_list = GLOBAL_STATS_CACHE.get('champion_list', [])
         timestamp = GLOBAL_STATS_CACHE['timestamp']
 
-    # If cache is empty or too old, try to recalculate
-    if not all_global_stats or not all_matches or (time.time() - timestamp > GLOBAL_STATS_UPDATE_INTERVAL):
-        print("[estadisticas_globales] La caché de estadísticas globales está vacía o desactualizada. Intentando recalcular...")
+    # Sin datos (o filtro por campeón sin partidas cargadas): recalcular de forma síncrona.
+    # Con datos caducados (p. ej. recargados del disco tras un reinicio): servirlos y refrescar en segundo plano.
+    if not all_global_stats or (selected_champion and not all_matches):
+        print("[estadisticas_globales] La caché de estadísticas globales está vacía. Intentando recalcular...")
         _calculate_and_cache_global_stats() # Force update
         with GLOBAL_STATS_LOCK:
             all_global_stats = GLOBAL_STATS_CACHE['data']
             all_matches = GLOBAL_STATS_CACHE.get('all_matches', [])
+            champion_list = GLOBAL_STATS_CACHE.get('champion_list', [])
+    elif not all_matches or (time.time() - timestamp > GLOBAL_STATS_UPDATE_INTERVAL):
+        print("[estadisticas_globales] La caché de estadísticas globales está desactualizada. Sirviendo la versión cacheada y recalculando en segundo plano.")
+        _refrescar_en_segundo_plano('global_stats', _calculate_and_cache_global_stats)
 
     # Select the stats for the chosen queue
     if not selected_champion:
@@ -2725,8 +3329,6 @@ def estadisticas_globales():
             }
         global_stats = default_record_set()
     
-    champion_list = sorted(list(set(m.get('champion_name') for m in all_matches if m.get('champion_name'))))
-    
     available_queues = [
         {'id': 'all_rankeds', 'name': 'All Rankeds'},
         {'id': 420, 'name': 'Ranked Solo/Duo'},
@@ -2737,6 +3339,30 @@ def estadisticas_globales():
 
 
 
+@app.route('/api/global_records/<record_key>')
+def get_global_record_board(record_key):
+    """
+    API endpoint con el ranking (top N) de un récord global: ?queue=all|420|440|all_rankeds
+    """
+    if record_key not in RECORD_KEYS:
+        return jsonify({"error": "Récord desconocido"}), 404
+    queue_id_to_name_map = {'420': 'soloq', '440': 'flex', 'all': 'all', 'all_rankeds': 'all_rankeds'}
+    queue_name = queue_id_to_name_map.get(request.args.get('queue', 'all'))
+    if not queue_name:
+        return jsonify({"error": "Cola no soportada"}), 400
+
+    with GLOBAL_STATS_LOCK:
+        all_global_stats = GLOBAL_STATS_CACHE['data']
+        timestamp = GLOBAL_STATS_CACHE['timestamp']
+    stats = (all_global_stats or {}).get(queue_name) or {}
+    if 'record_boards' not in stats or time.time() - timestamp > GLOBAL_STATS_UPDATE_INTERVAL:
+        # Caché recargada de una versión anterior (sin rankings) o caducada
+        _refrescar_en_segundo_plano('global_stats', _calculate_and_cache_global_stats)
+    board = stats.get('record_boards', {}).get(record_key, [])
+    print(f"[get_global_record_board] Ranking de '{record_key}' ({queue_name}) con {len(board)} entradas.")
+    return jsonify({'record': record_key, 'queue': queue_name, 'entries': board})
+
+
 # Se ha modificado la firma de la función para aceptar `player_display_name` y `riot_id`.
 def _default_record_template():
     """Plantilla de registro por defecto para reutilizar en múltiples lugares."""
@@ -2746,24 +3372,10 @@ def _default_record_template():
         'deaths': 0, 'assists': 0, 'riot_id': 'N/A', 'player': 'N/A', 'champion_id': 'N/A'
     }
 
-def _create_personal_records_dict():
-    """Crea un diccionario con todos los récords personales inicializados."""
-    record_keys = [
-        'longest_game', 'most_kills', 'most_deaths', 'most_assists', 'highest_kda',
-        'most_cs', 'most_damage_dealt', 'most_gold_earned', 'most_vision_score',
-        'largest_killing_spree', 'largest_multikill', 'most_time_spent_dead',
-        'most_wards_placed', 'most_wards_killed', 'most_turret_kills',
-        'most_inhibitor_kills', 'most_baron_kills', 'most_dragon_kills',
-        'most_damage_taken', 'most_total_heal', 'most_damage_shielded_on_teammates',
-        'most_time_ccing_others', 'most_objectives_stolen', 'highest_kill_participation',
-        'most_double_kills', 'most_triple_kills', 'most_quadra_kills', 'most_penta_kills',
-        'longest_win_streak', 'longest_loss_streak'
-    ]
-    return {key: _default_record_template() for key in record_keys}
-
-def _get_player_personal_records(puuid, player_display_name, riot_id, champion_filter=None):
+def _get_player_personal_records(puuid, player_display_name, riot_id, champion_filter=None, permitir_obsoleto=False):
     """Calcula y devuelve los récords personales de un jugador.
-    Utiliza caché para minimizar el consumo de CPU.
+    Utiliza caché para minimizar el consumo de CPU. Con `permitir_obsoleto=True` devuelve
+    los récords cacheados aunque hayan caducado y los recalcula en segundo plano.
     """
     print(f"[_get_player_personal_records] Solicitud de récords personales para PUUID: {puuid}, Jugador: {player_display_name}, Riot ID: {riot_id}, Campeón: {champion_filter or 'Todos'}")
 
@@ -2779,6 +3391,12 @@ def _get_player_personal_records(puuid, player_display_name, riot_id, champion_f
             print(f"[_get_player_personal_records] Devolviendo récords personales cacheados para: {cache_key}.")
             return cached_data
 
+    if cached_data and permitir_obsoleto:
+        print(f"[_get_player_personal_records] Devolviendo récords caducados para {cache_key} y recalculando en segundo plano.")
+        _refrescar_en_segundo_plano(f"personal_records:{cache_key}", _get_player_personal_records,
+                                    puuid, player_display_name, riot_id, champion_filter)
+        return cached_data
+
     print(f"[_get_player_personal_records] Calculando récords personales para: {cache_key} (no cacheados o estancados).")
     historial = get_player_match_history(puuid, riot_id=riot_id) 
     all_matches_for_player = historial.get('matches', [])
@@ -2786,79 +3404,26 @@ def _get_player_personal_records(puuid, player_display_name, riot_id, champion_f
     # Filter matches by champion if a filter is provided
     filtered_matches = [m for m in all_matches_for_player if m.get('champion_name') == champion_filter] if champion_filter else all_matches_for_player
 
-    personal_records = _create_personal_records_dict()
-
     for match in filtered_matches:
         match['jugador_nombre'] = player_display_name
         match['riot_id'] = riot_id
     
     # Sort matches by game end time, from oldest to newest for streak calculation
-    filtered_matches.sort(key=lambda x: x.get('game_end_timestamp', 0))
-
-    streaks = calcular_rachas(filtered_matches)
-    if streaks['max_win_streak'] > 0:
-        # Find the last match of the longest win streak to represent the record
-        win_streak_end_match = None
-        current_streak = 0
-        for match in filtered_matches:
-            if match.get('win'):
-                current_streak += 1
-                if current_streak == streaks['max_win_streak']:
-                    win_streak_end_match = match
-                    break
-            else:
-                current_streak = 0
-        if win_streak_end_match:
-            personal_records['longest_win_streak'] = _update_record(personal_records['longest_win_streak'], streaks['max_win_streak'], win_streak_end_match, 'longest_win_streak')
-
-    if streaks['max_loss_streak'] > 0:
-        # Find the last match of the longest loss streak
-        loss_streak_end_match = None
-        current_streak = 0
-        for match in filtered_matches:
-            if not match.get('win'):
-                current_streak += 1
-                if current_streak == streaks['max_loss_streak']:
-                    loss_streak_end_match = match
-                    break
-            else:
-                current_streak = 0
-        if loss_streak_end_match:
-            personal_records['longest_loss_streak'] = _update_record(personal_records['longest_loss_streak'], streaks['max_loss_streak'], loss_streak_end_match, 'longest_loss_streak')
-
+    # (copia: no reordenar la lista del historial cacheado)
+    filtered_matches = sorted(filtered_matches, key=lambda x: x.get('game_end_timestamp', 0))
 
+    records = RecordTracker()
     for match in filtered_matches:
-        personal_records['longest_game'] = _update_record(personal_records['longest_game'], match.get('game_duration', 0), match, 'longest_game')
-        personal_records['most_kills'] = _update_record(personal_records['most_kills'], match.get('kills', 0), match, 'most_kills')
-        personal_records['most_deaths'] = _update_record(personal_records['most_deaths'], match.get('deaths', 0), match, 'most_deaths')
-        personal_records['most_assists'] = _update_record(personal_records['most_assists'], match.get('assists', 0), match, 'most_assists')
-        personal_records['highest_kda'] = _update_record(personal_records['highest_kda'], match.get('kda', 0), match, 'highest_kda')
-        
-        total_cs = match.get('total_minions_killed', 0) + match.get('neutral_minions_killed', 0)
-        personal_records['most_cs'] = _update_record(personal_records['most_cs'], total_cs, match, 'most_cs')
-            
-        personal_records['most_damage_dealt'] = _update_record(personal_records['most_damage_dealt'], match.get('total_damage_dealt_to_champions', 0), match, 'most_damage_dealt')
-        personal_records['most_gold_earned'] = _update_record(personal_records['most_gold_earned'], match.get('gold_earned', 0), match, 'most_gold_earned')
-        personal_records['most_vision_score'] = _update_record(personal_records['most_vision_score'], match.get('vision_score', 0), match, 'most_vision_score')
-        personal_records['largest_killing_spree'] = _update_record(personal_records['largest_killing_spree'], match.get('largest_killing_spree', 0), match, 'largest_killing_spree')
-        personal_records['largest_multikill'] = _update_record(personal_records['largest_multikill'], match.get('largestMultiKill', 0), match, 'largest_multikill')
-        personal_records['most_time_spent_dead'] = _update_record(personal_records['most_time_spent_dead'], match.get('total_time_spent_dead', 0), match, 'most_time_spent_dead')
-        personal_records['most_wards_placed'] = _update_record(personal_records['most_wards_placed'], match.get('wards_placed', 0), match, 'most_wards_placed')
-        personal_records['most_wards_killed'] = _update_record(personal_records['most_wards_killed'], match.get('wards_killed', 0), match, 'most_wards_killed')
-        personal_records['most_turret_kills'] = _update_record(personal_records['most_turret_kills'], match.get('turret_kills', 0), match, 'most_turret_kills')
-        personal_records['most_inhibitor_kills'] = _update_record(personal_records['most_inhibitor_kills'], match.get('inhibitor_kills', 0), match, 'most_inhibitor_kills')
-        personal_records['most_baron_kills'] = _update_record(personal_records['most_baron_kills'], match.get('baron_kills', 0), match, 'most_baron_kills')
-        personal_records['most_dragon_kills'] = _update_record(personal_records['most_dragon_kills'], match.get('dragon_kills', 0), match, 'most_dragon_kills')
-        personal_records['most_damage_taken'] = _update_record(personal_records['most_damage_taken'], match.get('total_damage_taken', 0), match, 'most_damage_taken')
-        personal_records['most_total_heal'] = _update_record(personal_records['most_total_heal'], match.get('total_heal', 0), match, 'most_total_heal')
-        personal_records['most_damage_shielded_on_teammates'] = _update_record(personal_records['most_damage_shielded_on_teammates'], match.get('total_damage_shielded_on_teammates', 0), match, 'most_damage_shielded_on_teammates')
-        personal_records['most_time_ccing_others'] = _update_record(personal_records['most_time_ccing_others'], match.get('time_ccing_others', 0), match, 'most_time_ccing_others')
-        personal_records['most_objectives_stolen'] = _update_record(personal_records['most_objectives_stolen'], match.get('objectives_stolen', 0), match, 'most_objectives_stolen')
-        personal_records['highest_kill_participation'] = _update_record(personal_records['highest_kill_participation'], match.get('kill_participation', 0), match, 'highest_kill_participation')
-        personal_records['most_double_kills'] = _update_record(personal_records['most_double_kills'], match.get('doubleKills', 0), match, 'most_double_kills') 
-        personal_records['most_triple_kills'] = _update_record(personal_records['most_triple_kills'], match.get('tripleKills', 0), match, 'most_triple_kills')  
-        personal_records['most_quadra_kills'] = _update_record(personal_records['most_quadra_kills'], match.get('quadraKills', 0), match, 'most_quadra_kills')  
-        personal_records['most_penta_kills'] = _update_record(personal_records['most_penta_kills'], match.get('pentaKills', 0), match, 'most_penta_kills')    
+        records.anadir(match)
+
+    rachas = reconstruir_rachas(filtered_matches)
+    for victorias, record_type in ((True, 'longest_win_streak'), (False, 'longest_loss_streak')):
+        racha = rachas.mejor_racha(victorias)
+        if racha['length'] > 0:
+            # La mejor racha se representa con su última partida
+            records.registrar(record_type, racha['length'], racha['end'])
+
+    personal_records = records.materializar(_create_record_dict, _default_record_template)
         
     print(f"[_get_player_personal_records] Récords personales calculados para: {cache_key}.")
     
@@ -2866,12 +3431,27 @@ def _get_player_personal_records(puuid, player_display_name, riot_id, champion_f
     with PERSONAL_RECORDS_LOCK:
         PERSONAL_RECORDS_CACHE['data'][cache_key] = personal_records
         PERSONAL_RECORDS_CACHE['timestamp'] = time.time() # Update timestamp on new calculation
+        PERSONAL_RECORDS_CACHE['version'] += 1
+        records_snapshot = dict(PERSONAL_RECORDS_CACHE['data'])
+        version = PERSONAL_RECORDS_CACHE['version']
+        timestamp = PERSONAL_RECORDS_CACHE['timestamp']
+    # Versión de estos récords para la ETag: la del historial del que salen (y el nombre mostrado)
+    DATA_VERSIONS.registrar(f"personal_records:{cache_key}", (_huella_historial(historial), player_display_name, riot_id))
+    if _es_proceso_lider():
+        # Los seguidores se quedan el cálculo en memoria hasta recargar el fichero del líder
+        guardar_cache('personal_records', records_snapshot, version, timestamp)
     
     return personal_records
 
 @app.route('/api/player/<puuid>/champions')
 def get_player_champions(puuid):
     """API endpoint to get the list of champions a player has played."""
+    etag = DATA_VERSIONS.etag('champions', DATA_VERSIONS.version(f"match_history:{puuid}",
+                                                                 max_edad=PLAYER_MATCH_HISTORY_CACHE_TIMEOUT))
+    return _respuesta_con_etag(etag, lambda: _player_champions(puuid))
+
+
+def _player_champions(puuid):
     print(f"[get_player_champions] Petición recibida para los campeones del PUUID: {puuid}.")
     if not puuid:
         return jsonify({"error": "PUUID no proporcionado"}), 400
@@ -2884,11 +3464,79 @@ def get_player_champions(puuid):
     print(f"[get_player_champions] Devolviendo {len(champions)} campeones únicos para el PUUID: {puuid}.")
     return jsonify(champions)
 
+@app.route('/api/player/<puuid>/matches')
+def api_player_matches(puuid):
+    """
+    API endpoint con el historial de un jugador paginado por cursor:
+    ?cursor=<timestamp:match_id:puuid>&limit=20&queue=420&champion=Ahri
+    Por defecto devuelve partidas compactas (sin los 10 participantes; ?details=1 los incluye).
+    Con ?format=html devuelve las filas ya renderizadas para la carga progresiva del perfil.
+    """
+    cursor = request.args.get('cursor') or None
+    champion = request.args.get('champion') or None
+    try:
+        limite = min(max(int(request.args.get('limit', PLAYER_MATCHES_PAGE_SIZE)), 1), PLAYER_MATCHES_MAX_PAGE_SIZE)
+        queue_id = int(request.args['queue']) if request.args.get('queue') else None
+        decodificar_cursor(cursor)
+    except ValueError:
+        return jsonify({"error": "Parámetros 'cursor', 'limit' o 'queue' no válidos"}), 400
+
+    jugador_data = next((j for j in obtener_datos_jugadores()[0] if j.get('puuid') == puuid), None)
+    if jugador_data is None:
+        return jsonify({"error": "Jugador no encontrado"}), 404
+    game_name = jugador_data.get('game_name')
+
+    partidas = _historial_procesado(puuid, riot_id=game_name)
+    if queue_id is not None or champion:
+        partidas = [m for m in partidas
+                    if (queue_id is None or m.get('queue_id') == queue_id)
+                    and (not champion or m.get('champion_name') == champion)]
+    pagina, siguiente_cursor = pagina_fusionada([partidas], limite, cursor)
+    print(f"[api_player_matches] {len(pagina)} partidas para {game_name} (cursor: {cursor or 'inicio'}, cola: {queue_id}, campeón: {champion}).")
+
+    if request.args.get('format') == 'html':
+        filas = _renderizar_filas(PLAYER_MATCH_ROW_TEMPLATE, pagina, {'perfil': {'game_name': game_name}})
+        return jsonify({'html': ''.join(filas), 'count': len(pagina), 'next_cursor': siguiente_cursor})
+
+    if request.args.get('details') != '1':
+        pagina = [{k: v for k, v in match.items() if k not in PLAYER_MATCHES_DETAIL_FIELDS} for match in pagina]
+    return jsonify({'matches': pagina, 'count': len(pagina), 'next_cursor': siguiente_cursor})
+
+@app.route('/api/player/<puuid>/elo_chart')
+def get_player_elo_chart(puuid):
+    """
+    API endpoint con la serie de ELO de un jugador para una cola, submuestreada (LTTB)
+    al ancho en píxeles solicitado: ?queue=420|440&width=600
+    """
+    try:
+        queue_id = int(request.args.get('queue', 420))
+        ancho = min(max(int(request.args.get('width', ELO_CHART_DEFAULT_WIDTH)), 3), ELO_CHART_MAX_WIDTH)
+    except ValueError:
+        return jsonify({"error": "Parámetros 'queue' y 'width' deben ser numéricos"}), 400
+    if queue_id not in (420, 440):
+        return jsonify({"error": "Cola no soportada"}), 400
+
+    partidas = _historial_procesado(puuid) # Cacheado: solo se reprocesa si cambian sus partidas o su LP
+    serie = _serie_elo_para_grafico(partidas, queue_id, ancho)
+    print(f"[get_player_elo_chart] Serie de {len(serie)} puntos para {puuid} (cola {queue_id}, ancho {ancho}).")
+    return jsonify({'queue': queue_id, 'width': ancho, 'points': serie})
+
 @app.route('/api/personal_records/<puuid>')
 def get_personal_records_api(puuid):
     """
     API endpoint para obtener los récords personales de un jugador dado su PUUID.
+    La ETag sale de la versión de los récords de ese jugador y filtro de campeón (avanza al recalcularlos
+    o invalidarlos) y de la de su historial, como en /champions: una partida nueva la cambia aunque
+    los récords aún no se hayan recalculado.
     """
+    campeon = request.args.get('champion') or 'all'
+    etag = DATA_VERSIONS.etag('records', DATA_VERSIONS.version(f"personal_records:{puuid}_{campeon}"),
+                              DATA_VERSIONS.version(f"match_history:{puuid}", max_edad=PLAYER_MATCH_HISTORY_CACHE_TIMEOUT),
+                              hashlib.sha1(campeon.encode('utf-8')).hexdigest()[:8])
+    return _respuesta_con_etag(etag, lambda: _personal_records_api(puuid))
+
+
+def _personal_records_api(puuid):
     print(f"[get_personal_records_api] Petición recibida para PUUID: {puuid}.")
     
     champion_filter = request.args.get('champion')
@@ -2909,7 +3557,7 @@ def get_personal_records_api(puuid):
         print("[get_personal_records_api] Error: PUUID no proporcionado.")
         return jsonify({"error": "PUUID no proporcionado"}), 400
 
-    personal_records = _get_player_personal_records(puuid, player_display_name, riot_id, champion_filter=champion_filter)
+    personal_records = _get_player_personal_records(puuid, player_display_name, riot_id, champion_filter=champion_filter, permitir_obsoleto=True)
     
     if personal_records:
         print(f"[get_personal_records_api] Récords personales cargados para PUUID: {puuid} (Campeón: {champion_filter or 'Todos'}).")
@@ -2981,46 +3629,215 @@ def _calculate_and_cache_global_stats_periodically():
             print(f"[_calculate_and_cache_global_stats_periodically] ERROR en el hilo de cálculo de estadísticas globales: {e}")
         time.sleep(GLOBAL_STATS_UPDATE_INTERVAL)
 
+# --- ARRANQUE EN CALIENTE ---
+# Semillas versionadas en el repositorio, usadas solo si no hay caché local persistida.
+WARM_BOOT_LEADERBOARD_SEEDS = ["stats_index.json", "index_data.json"]
+WARM_BOOT_GLOBAL_STATS_SEED = "global_stats.json"
+WARM_BOOT_PEAK_ELO_SEED = "peak_elo.json"
+
+def _timestamp_semilla(semilla):
+    """Devuelve el timestamp de generación (segundos UTC) de una semilla del repositorio."""
+    valor = semilla.get('timestamp_generacion')
+    if isinstance(valor, (int, float)):
+        return float(valor)
+    if isinstance(valor, str):
+        try:
+            return datetime.fromisoformat(valor).timestamp()
+        except ValueError:
+            pass
+    return 0
+
+def _adaptar_global_stats_semilla(semilla):
+    """Convierte global_stats.json del repositorio al formato de GLOBAL_STATS_CACHE['data']."""
+    por_cola = semilla.get('stats_by_queue', {})
+
+    def _desde_cola(datos_cola):
+        total = datos_cola.get('total_matches', 0)
+        return {
+            'overall_win_rate': (datos_cola.get('wins', 0) / total * 100) if total > 0 else 0,
+            'total_games': total,
+            'most_played_champions': datos_cola.get('most_played_champions', []),
+            'global_records': datos_cola.get('records', {})
+        }
+
+    total_rankeds = sum(c.get('total_matches', 0) for c in por_cola.values())
+    wins_rankeds = sum(c.get('wins', 0) for c in por_cola.values())
+    stats = {
+        'all': {
+            'overall_win_rate': (wins_rankeds / total_rankeds * 100) if total_rankeds > 0 else 0,
+            'total_games': semilla.get('all_matches_count', total_rankeds),
+            'most_played_champions': semilla.get('most_played_champions', []),
+            'global_records': semilla.get('global_records', {})
+        },
+        'all_rankeds': {
+            'overall_win_rate': (wins_rankeds / total_rankeds * 100) if total_rankeds > 0 else 0,
+            'total_games': total_rankeds,
+            'most_played_champions': semilla.get('most_played_champions', []),
+            'global_records': semilla.get('global_records', {})
+        }
+    }
+    if '420' in por_cola:
+        stats['soloq'] = _desde_cola(por_cola['420'])
+    if '440' in por_cola:
+        stats['flex'] = _desde_cola(por_cola['440'])
+    return stats
+
+# Cachés que el proceso líder persiste y los seguidores recargan.
+CACHES_COMPARTIDAS = ['leaderboard', 'global_stats', 'personal_records', 'peak_elo']
+CACHES_SINCRONIZADAS = {} # nombre -> mtime del fichero cargado por última vez
+
+def _aplicar_cache_persistida(nombre, persistida):
+    """Vuelca en memoria una caché persistida. Devuelve False si no había datos."""
+    if not persistida or not persistida['data']:
+        return False
+    if nombre == 'leaderboard':
+        _publicar_snapshot_clasificacion(persistida['data'], timestamp=persistida['timestamp'],
+                                         version=persistida['data_version'], persistir=False)
+    elif nombre == 'global_stats':
+        with GLOBAL_STATS_LOCK:
+            GLOBAL_STATS_CACHE['data'] = persistida['data'].get('stats')
+            GLOBAL_STATS_CACHE['champion_list'] = persistida['data'].get('champion_list', [])
+            GLOBAL_STATS_CACHE['timestamp'] = persistida['timestamp']
+            GLOBAL_STATS_CACHE['version'] = persistida['data_version']
+    elif nombre == 'personal_records':
+        with PERSONAL_RECORDS_LOCK:
+            claves = set(PERSONAL_RECORDS_CACHE['data']) | set(persistida['data'])
+            PERSONAL_RECORDS_CACHE['data'] = persistida['data']
+            PERSONAL_RECORDS_CACHE['timestamp'] = persistida['timestamp']
+            # Nunca hacia atrás: el seguidor puede haber avanzado la suya con cálculos en memoria
+            PERSONAL_RECORDS_CACHE['version'] = max(PERSONAL_RECORDS_CACHE['version'] + 1, persistida['data_version'])
+        # Sin la huella del historial de cada entrada, su versión avanza con la del fichero del líder
+        # (también las que el líder ha invalidado y ya no están en el fichero)
+        for clave in claves:
+            DATA_VERSIONS.registrar(f"personal_records:{clave}", persistida['data_version'])
+    elif nombre == 'peak_elo':
+        with PEAK_ELO_LOCK:
+            PEAK_ELO_CACHE['data'] = persistida['data']
+            PEAK_ELO_CACHE['timestamp'] = persistida['timestamp']
+            PEAK_ELO_CACHE['version'] = max(PEAK_ELO_CACHE['version'] + 1, persistida['data_version'])
+    else:
+        return False
+    return True
+
+def _cargar_cache_compartida(nombre):
+    """Carga una caché persistida y recuerda el mtime del fichero leído."""
+    mtime = fecha_modificacion_cache(nombre)
+    cargada = _aplicar_cache_persistida(nombre, cargar_cache(nombre))
+    if cargada:
+        CACHES_SINCRONIZADAS[nombre] = mtime
+    return cargada
+
+def _recargar_caches_compartidas():
+    """Recarga (solo en procesos seguidores) las cachés cuyo fichero haya cambiado en disco."""
+    for nombre in CACHES_COMPARTIDAS:
+        mtime = fecha_modificacion_cache(nombre)
+        if mtime is not None and mtime != CACHES_SINCRONIZADAS.get(nombre):
+            if _cargar_cache_compartida(nombre):
+                print(f"[_recargar_caches_compartidas] Caché '{nombre}' recargada desde disco.")
+
+def _cargar_caches_persistidas():
+    """
+    Recarga las cachés derivadas desde disco al arrancar. Los timestamps originales se conservan,
+    así que los datos caducados se sirven al instante y se refrescan en segundo plano.
+    """
+    inicio = time.time()
+
+    # 1. Clasificación
+    if not _cargar_cache_compartida('leaderboard'):
+        semillas = [s for s in (cargar_json_repo(ruta) for ruta in WARM_BOOT_LEADERBOARD_SEEDS)
+                    if s and s.get('datos_jugadores')]
+        if semillas:
+            semilla = max(semillas, key=_timestamp_semilla)
+            _publicar_snapshot_clasificacion(semilla['datos_jugadores'], timestamp=_timestamp_semilla(semilla),
+                                             persistir=False)
+
+    # 2. Estadísticas globales
+    if not _cargar_cache_compartida('global_stats'):
+        semilla = cargar_json_repo(WARM_BOOT_GLOBAL_STATS_SEED)
+        if semilla and semilla.get('stats_by_queue'):
+            with GLOBAL_STATS_LOCK:
+                GLOBAL_STATS_CACHE['data'] = _adaptar_global_stats_semilla(semilla)
+                GLOBAL_STATS_CACHE['champion_list'] = sorted(semilla.get('all_champions', []))
+                GLOBAL_STATS_CACHE['timestamp'] = 0 # Semilla: se considera caducada
+
+    # 3. Récords personales
+    _cargar_cache_compartida('personal_records')
+
+    # 4. Peak Elo
+    if not _cargar_cache_compartida('peak_elo'):
+        semilla = cargar_json_repo(WARM_BOOT_PEAK_ELO_SEED)
+        if semilla:
+            with PEAK_ELO_LOCK:
+                PEAK_ELO_CACHE['data'] = semilla
+                PEAK_ELO_CACHE['timestamp'] = 0 # Semilla: se considera caducada
+
+    # 5. Tabla de campeones: tras reiniciar solo se reproducen las partidas posteriores al punto de control
+    cargar_tabla_campeones(SEASON_START_TIMESTAMP * 1000)
+
+    print(f"[_cargar_caches_persistidas] Cachés recargadas desde disco en {(time.time() - inicio) * 1000:.0f} ms "
+          f"(clasificación v{LEADERBOARD_SNAPSHOT.version}, {len(LEADERBOARD_SNAPSHOT.rows)} filas).")
+
+_cargar_caches_persistidas()
+
+# --- CICLO DE VIDA DE LOS HILOS DE FONDO ---
+# Con gunicorn (Procfile) este módulo se importa en cada worker y nunca se ejecuta el bloque __main__.
+# Los hilos se arrancan al importar, pero solo en el proceso que gana el cerrojo de líder.
+# BACKGROUND_JOBS=off desactiva los hilos (scripts, consola).
+BACKGROUND_JOBS_MODE = os.environ.get("BACKGROUND_JOBS", "auto").lower()
+SCHEDULER_SYNC_INTERVAL = 30 # Segundos entre sincronizaciones de un seguidor
+BACKGROUND_JOBS_STATE = {'iniciado': False, 'rol': None} # rol: 'lider' | 'seguidor'
+BACKGROUND_JOBS_LOCK = threading.Lock()
+
+def _iniciar_trabajos_de_lider():
+    """Arranca los hilos periódicos que consumen las APIs de Riot y GitHub."""
+    _asegurar_rate_limiter()
+    iniciar_hilo('keep_alive', keep_alive)
+    iniciar_hilo('actualizar_cache_periodicamente', actualizar_cache_periodicamente)
+    iniciar_hilo('actualizar_historial_partidas_en_segundo_plano', actualizar_historial_partidas_en_segundo_plano)
+    iniciar_hilo('actualizar_estadisticas_globales_periodicamente', _calculate_and_cache_global_stats_periodically)
+    iniciar_hilo('actualizar_records_personales_periodicamente', _calculate_and_cache_personal_records_periodically)
+
+def _sincronizar_como_seguidor():
+    """
+    Bucle de un proceso seguidor: recarga las cachés que persiste el líder y reintenta
+    el liderazgo por si el proceso líder ha muerto.
+    """
+    while True:
+        time.sleep(SCHEDULER_SYNC_INTERVAL)
+        try:
+            _recargar_caches_compartidas()
+            if intentar_liderazgo():
+                print("[_sincronizar_como_seguidor] El líder anterior ha desaparecido. Asumiendo el liderazgo.")
+                BACKGROUND_JOBS_STATE['rol'] = 'lider'
+                _iniciar_trabajos_de_lider()
+                return
+        except Exception as e:
+            print(f"[_sincronizar_como_seguidor] Error sincronizando cachés: {e}")
+
+def iniciar_trabajos_en_segundo_plano():
+    """Arranca los hilos de fondo una sola vez por proceso, según el rol obtenido."""
+    with BACKGROUND_JOBS_LOCK:
+        if BACKGROUND_JOBS_STATE['iniciado']:
+            return
+        BACKGROUND_JOBS_STATE['iniciado'] = True
+
+    if BACKGROUND_JOBS_MODE in ('off', '0', 'false', 'no'):
+        print("[iniciar_trabajos_en_segundo_plano] Hilos de fondo desactivados (BACKGROUND_JOBS=off).")
+        return
+
+    if intentar_liderazgo():
+        BACKGROUND_JOBS_STATE['rol'] = 'lider'
+        _iniciar_trabajos_de_lider()
+    else:
+        BACKGROUND_JOBS_STATE['rol'] = 'seguidor'
+        print(f"[iniciar_trabajos_en_segundo_plano] Proceso {os.getpid()} en modo seguidor: sirve las cachés del líder.")
+        iniciar_hilo('sincronizar_como_seguidor', _sincronizar_como_seguidor)
+
+iniciar_trabajos_en_segundo_plano()
+
 if __name__ == "__main__":
     print("[main] Iniciando la aplicación Flask.")
-    
-    # Iniciar el hilo del control de tasa de API
-    api_rate_limiter_thread = threading.Thread(target=_api_rate_limiter_worker)
-    api_rate_limiter_thread.daemon = True
-    api_rate_limiter_thread.start()
-    print("[main] Hilo 'api_rate_limiter_thread' iniciado.")
-
-    keep_alive_thread = threading.Thread(target=keep_alive)
-    keep_alive_thread.daemon = True
-    keep_alive_thread.start()
-    print("[main] Hilo 'keep_alive' iniciado.")
-
-    cache_thread = threading.Thread(target=actualizar_cache_periodicamente)
-    cache_thread.daemon = True
-    cache_thread.start()
-    print("[main] Hilo 'actualizar_cache_periodicamente' iniciado.")
-
-    stats_thread = threading.Thread(target=actualizar_historial_partidas_en_segundo_plano)
-    stats_thread.daemon = True
-    stats_thread.start()
-    print("[main] Hilo 'actualizar_historial_partidas_en_segundo_plano' iniciado.")
-
-    # Iniciar el hilo de cálculo de estadísticas globales
-    global_stats_calc_thread = threading.Thread(target=_calculate_and_cache_global_stats_periodically)
-    global_stats_calc_thread.daemon = True
-    global_stats_calc_thread.start()
-    print("[main] Hilo 'actualizar_estadisticas_globales_periodicamente' iniciado.")
-
-    # Iniciar el hilo de cálculo de récords personales
-    personal_records_calc_thread = threading.Thread(target=_calculate_and_cache_personal_records_periodically)
-    personal_records_calc_thread.daemon = True
-    personal_records_calc_thread.start()
-    print("[main] Hilo 'actualizar_records_personales_periodicamente' iniciado.")
-
-    # OPTIMIZACIÓN: Ya no necesitamos el worker de lp_tracker separado
-    # Los snapshots se registran en procesar_jugador() sin hacer llamadas extra a la API
-    # y se guardan en GitHub cada hora desde actualizar_cache()
-    # print("[main] Hilo 'lp_tracker_thread' desactivado (snapshots ahora integrados en actualizar_cache)")
+    # Los hilos de fondo ya se han arrancado al importar (iniciar_trabajos_en_segundo_plano).
 
     port = int(os.environ.get("PORT", 5000))
     print(f"[main] Aplicación Flask ejecutándose en http://0.0.0.0:{port}")
@@ -0,0 +1,81 @@
+# services/aggregation.py
+
+"""
+Motor de agregación de una sola pasada sobre varios grupos a la vez.
+
+Las partidas se recorren una única vez. Cada clasificador devuelve los grupos a los
+que pertenece una partida (p. ej. 'all', 'all_rankeds' y 'soloq' para una partida
+de SoloQ) y la partida se entrega al acumulador de cada uno de esos grupos. Añadir
+un corte nuevo (por split, por posición...) es añadir un clasificador: no se vuelve
+a filtrar, agrupar ni ordenar la lista de partidas.
+
+Un acumulador es cualquier objeto con `anadir(partida)` y `resultado()`.
+"""
+
+
+def clasificador_por_cola(grupos):
+    """
+    Clasificador por cola.
+
+    Args:
+        grupos (dict): Nombre del grupo -> colas que incluye (iterable de queue_id)
+                       o None para incluir todas.
+
+    Returns:
+        callable: partida -> lista de nombres de grupo.
+    """
+    grupos = {nombre: (None if colas is None else frozenset(colas)) for nombre, colas in grupos.items()}
+    por_cola = {} # queue_id -> grupos, calculado una vez por cola
+
+    def clasificar(partida):
+        queue_id = partida.get('queue_id')
+        nombres = por_cola.get(queue_id)
+        if nombres is None:
+            nombres = [nombre for nombre, colas in grupos.items() if colas is None or queue_id in colas]
+            por_cola[queue_id] = nombres
+        return nombres
+    return clasificar
+
+
+def clasificador_por_campo(campo, prefijo=None):
+    """
+    Clasificador por el valor de un campo de la partida (p. ej. 'individual_position').
+    Los grupos se llaman (prefijo o campo, valor); las partidas sin el campo no se agrupan.
+    """
+    etiqueta = prefijo or campo
+
+    def clasificar(partida):
+        valor = partida.get(campo)
+        return [(etiqueta, valor)] if valor is not None else []
+    return clasificar
+
+
+def filtrar_clasificador(clasificador, predicado):
+    """Restringe un clasificador a las partidas que cumplen `predicado` (p. ej. un campeón)."""
+    def clasificar(partida):
+        return clasificador(partida) if predicado(partida) else []
+    return clasificar
+
+
+def agregar_por_grupos(partidas, clasificadores, crear_acumulador, grupos_fijos=()):
+    """
+    Recorre las partidas una vez y reparte cada una entre los acumuladores de sus grupos.
+
+    Args:
+        partidas (iterable): Partidas en el orden que necesiten los acumuladores.
+        clasificadores (list): Funciones partida -> iterable de grupos.
+        crear_acumulador (callable): grupo -> acumulador nuevo.
+        grupos_fijos (iterable): Grupos que deben aparecer en el resultado aunque queden vacíos.
+
+    Returns:
+        dict: grupo -> acumulador.resultado()
+    """
+    acumuladores = {grupo: crear_acumulador(grupo) for grupo in grupos_fijos}
+    for partida in partidas:
+        for clasificar in clasificadores:
+            for grupo in clasificar(partida):
+                acumulador = acumuladores.get(grupo)
+                if acumulador is None:
+                    acumulador = acumuladores[grupo] = crear_acumulador(grupo)
+                acumulador.anadir(partida)
+    return {grupo: acumulador.resultado() for grupo, acumulador in acumuladores.items()}
@@ -0,0 +1,118 @@
+# services/cache_backend.py
+
+"""
+Backends intercambiables para las cachés de datos grandes (historiales de partidas,
+historial de LP).
+
+- MemoryCacheBackend: diccionario en el propio proceso (comportamiento por defecto).
+- SQLiteCacheBackend: fichero SQLite compartido (modo WAL) por todos los workers de
+  gunicorn de la máquina. Cada worker lee de ahí en vez de guardar su propia copia,
+  así la memoria no crece con el número de workers y solo un worker va a GitHub.
+
+Se elige con la variable de entorno CACHE_BACKEND ('memory' o 'sqlite').
+"""
+import os
+import json
+import sqlite3
+import threading
+import time
+
+from services.warm_cache import WARM_CACHE_DIR
+
+CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "memory").lower()
+CACHE_SQLITE_PATH = os.environ.get("CACHE_SQLITE_PATH", os.path.join(WARM_CACHE_DIR, "shared_cache.sqlite3"))
+
+
+class MemoryCacheBackend:
+    """Caché en memoria del proceso. Guarda referencias, sin serializar."""
+
+    def __init__(self, espacio):
+        self.espacio = espacio
+        self._datos = {}
+        self._lock = threading.Lock()
+
+    def get(self, clave):
+        """Devuelve {'data', 'timestamp'} o None."""
+        with self._lock:
+            return self._datos.get(clave)
+
+    def set(self, clave, datos, timestamp=None):
+        with self._lock:
+            self._datos[clave] = {
+                'data': datos,
+                'timestamp': timestamp if timestamp is not None else time.time()
+            }
+
+    def delete(self, clave):
+        with self._lock:
+            self._datos.pop(clave, None)
+
+
+class SQLiteCacheBackend:
+    """
+    Caché compartida entre procesos sobre un fichero SQLite. Los valores se guardan
+    como JSON; cada lectura devuelve una copia nueva, independiente del resto de workers.
+    """
+
+    def __init__(self, espacio, ruta=CACHE_SQLITE_PATH):
+        self.espacio = espacio
+        self.ruta = ruta
+        self._local = threading.local() # Una conexión por hilo
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        with self._conexion() as con:
+            con.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "espacio TEXT NOT NULL, clave TEXT NOT NULL, valor TEXT NOT NULL, timestamp REAL NOT NULL, "
+                "PRIMARY KEY (espacio, clave))"
+            )
+
+    def _conexion(self):
+        con = getattr(self._local, 'con', None)
+        if con is None:
+            con = sqlite3.connect(self.ruta, timeout=30)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            self._local.con = con
+        return con
+
+    def get(self, clave):
+        """Devuelve {'data', 'timestamp'} o None."""
+        try:
+            fila = self._conexion().execute(
+                "SELECT valor, timestamp FROM cache WHERE espacio = ? AND clave = ?",
+                (self.espacio, clave)
+            ).fetchone()
+        except sqlite3.Error as e:
+            print(f"[cache_backend] Error leyendo '{self.espacio}:{clave}' de SQLite: {e}")
+            return None
+        if fila is None:
+            return None
+        return {'data': json.loads(fila[0]), 'timestamp': fila[1]}
+
+    def set(self, clave, datos, timestamp=None):
+        try:
+            with self._conexion() as con:
+                con.execute(
+                    "INSERT OR REPLACE INTO cache (espacio, clave, valor, timestamp) VALUES (?, ?, ?, ?)",
+                    (self.espacio, clave, json.dumps(datos, separators=(',', ':')),
+                     timestamp if timestamp is not None else time.time())
+                )
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            print(f"[cache_backend] Error guardando '{self.espacio}:{clave}' en SQLite: {e}")
+
+    def delete(self, clave):
+        try:
+            with self._conexion() as con:
+                con.execute("DELETE FROM cache WHERE espacio = ? AND clave = ?", (self.espacio, clave))
+        except sqlite3.Error as e:
+            print(f"[cache_backend] Error borrando '{self.espacio}:{clave}' de SQLite: {e}")
+
+
+def crear_backend(espacio):
+    """Crea el backend configurado en CACHE_BACKEND para un espacio de claves."""
+    if CACHE_BACKEND == "sqlite":
+        try:
+            return SQLiteCacheBackend(espacio)
+        except (OSError, sqlite3.Error) as e:
+            print(f"[cache_backend] No se pudo abrir {CACHE_SQLITE_PATH}: {e}. Usando caché en memoria.")
+    return MemoryCacheBackend(espacio)
@@ -0,0 +1,201 @@
+# services/champion_aggregates.py
+
+"""
+Tabla agregada de estadísticas por (jugador, cola, campeón) con puntos de control.
+
+Para cada jugador se guardan, por cola y campeón, las partidas, victorias, kills,
+muertes y asistencias de la temporada y la partida con mejor KDA, junto con un
+punto de control (timestamp de la última partida incorporada y número de partidas
+vistas). Cada actualización solo recorre las partidas posteriores al punto de
+control; si el historial ha cambiado de otra forma se reconstruye ese jugador.
+
+La tabla se persiste con warm_cache, así que tras un reinicio solo se reproducen
+las partidas más nuevas que el punto de control guardado.
+"""
+import threading
+
+from services.warm_cache import guardar_cache, cargar_cache
+
+CHAMPION_AGGREGATES_CACHE_NAME = 'champion_aggregates'
+
+_ESTADO = {'inicio_temporada_ms': None, 'jugadores': {}, 'version': 0, 'version_guardada': 0}
+_LOCK = threading.Lock()
+
+
+def _kda(kills, deaths, assists):
+    return (kills + assists) / deaths if deaths > 0 else float(kills + assists)
+
+
+def _jugador_vacio():
+    return {'checkpoint': {'timestamp': 0, 'ids': [], 'partidas': 0}, 'colas': {}}
+
+
+def _incorporar(jugador, partida, inicio_temporada_ms):
+    ts = partida.get('game_end_timestamp', 0)
+    if ts < inicio_temporada_ms or not partida.get('champion_name'):
+        return
+    # Claves de texto: el JSON persistido no admite claves numéricas
+    campeones = jugador['colas'].setdefault(str(partida.get('queue_id')), {})
+    stats = campeones.setdefault(partida['champion_name'], {
+        'games': 0, 'wins': 0, 'kills': 0, 'deaths': 0, 'assists': 0,
+        'last_timestamp': 0, 'best_kda_match': None
+    })
+    kills, deaths, assists = partida.get('kills', 0), partida.get('deaths', 0), partida.get('assists', 0)
+    stats['games'] += 1
+    stats['wins'] += 1 if partida.get('win') else 0
+    stats['kills'] += kills
+    stats['deaths'] += deaths
+    stats['assists'] += assists
+    stats['last_timestamp'] = max(stats['last_timestamp'], ts)
+    kda = _kda(kills, deaths, assists)
+    # '>=' porque se reproducen de más antigua a más nueva: en empate gana la más reciente
+    if stats['best_kda_match'] is None or kda >= stats['best_kda_match']['kda']:
+        stats['best_kda_match'] = {
+            'kda': kda, 'kills': kills, 'deaths': deaths, 'assists': assists,
+            'timestamp': ts, 'match_id': partida.get('match_id')
+        }
+
+
+def _actualizar_jugador(jugador, partidas, inicio_temporada_ms):
+    """Incorpora las partidas posteriores al punto de control. Devuelve True si hubo cambios."""
+    checkpoint = jugador['checkpoint']
+    ids_en_checkpoint = set(checkpoint['ids'])
+    nuevas = []
+    for partida in partidas: # De más reciente a más antigua
+        ts = partida.get('game_end_timestamp', 0)
+        if ts < checkpoint['timestamp']:
+            break
+        if ts > checkpoint['timestamp'] or partida.get('match_id') not in ids_en_checkpoint:
+            nuevas.append(partida)
+
+    if checkpoint['partidas'] + len(nuevas) != len(partidas):
+        # Partidas antiguas recuperadas o eliminadas: se reconstruye el jugador
+        jugador.update(_jugador_vacio())
+        nuevas = list(partidas)
+    elif not nuevas:
+        return False
+
+    for partida in sorted(nuevas, key=lambda p: p.get('game_end_timestamp', 0)):
+        _incorporar(jugador, partida, inicio_temporada_ms)
+
+    ultimo = max((p.get('game_end_timestamp', 0) for p in partidas), default=0)
+    jugador['checkpoint'] = {
+        'timestamp': ultimo,
+        'ids': [p.get('match_id') for p in partidas if p.get('game_end_timestamp', 0) == ultimo],
+        'partidas': len(partidas)
+    }
+    return True
+
+
+def actualizar_campeones(puuid, partidas, inicio_temporada_ms):
+    """
+    Actualiza de forma incremental la tabla de campeones de un jugador.
+
+    Args:
+        puuid (str): PUUID del jugador.
+        partidas (list): Historial completo, de más reciente a más antigua.
+        inicio_temporada_ms (int): Inicio de la temporada en milisegundos.
+
+    Returns:
+        bool: True si la tabla ha cambiado.
+    """
+    with _LOCK:
+        if _ESTADO['inicio_temporada_ms'] != inicio_temporada_ms:
+            _ESTADO['inicio_temporada_ms'] = inicio_temporada_ms
+            _ESTADO['jugadores'] = {}
+        jugador = _ESTADO['jugadores'].setdefault(puuid, _jugador_vacio())
+        cambiado = _actualizar_jugador(jugador, partidas, inicio_temporada_ms)
+        if cambiado:
+            _ESTADO['version'] += 1
+        return cambiado
+
+
+def _fila(nombre, stats):
+    games = stats['games']
+    return {
+        'champion_name': nombre,
+        'games_played': games,
+        'wins': stats['wins'],
+        'losses': games - stats['wins'],
+        'win_rate': (stats['wins'] / games * 100) if games > 0 else 0,
+        'kills': stats['kills'],
+        'deaths': stats['deaths'],
+        'assists': stats['assists'],
+        'avg_kills': stats['kills'] / games if games > 0 else 0,
+        'avg_deaths': stats['deaths'] / games if games > 0 else 0,
+        'avg_assists': stats['assists'] / games if games > 0 else 0,
+        'kda': _kda(stats['kills'], stats['deaths'], stats['assists']),
+        'best_kda_match': dict(stats['best_kda_match']) if stats['best_kda_match'] else None
+    }
+
+
+def filas_campeones(puuid, queue_id=None, limite=None):
+    """
+    Devuelve las filas precalculadas de los campeones de un jugador, ordenadas por
+    partidas jugadas (en empate, el jugado más recientemente primero).
+
+    Args:
+        queue_id (int): Cola concreta, o None para sumar todas las colas.
+        limite (int): Número máximo de filas.
+    """
+    with _LOCK:
+        colas = _ESTADO['jugadores'].get(puuid, {}).get('colas', {})
+        if queue_id is not None:
+            fuentes = [colas.get(str(queue_id), {})]
+        else:
+            fuentes = list(colas.values())
+        combinados = {}
+        for campeones in fuentes:
+            for nombre, stats in campeones.items():
+                total = combinados.get(nombre)
+                if total is None:
+                    combinados[nombre] = dict(stats)
+                    continue
+                for campo in ('games', 'wins', 'kills', 'deaths', 'assists'):
+                    total[campo] += stats[campo]
+                total['last_timestamp'] = max(total['last_timestamp'], stats['last_timestamp'])
+                mejor = stats['best_kda_match']
+                if mejor and (total['best_kda_match'] is None
+                              or (mejor['kda'], mejor['timestamp']) > (total['best_kda_match']['kda'], total['best_kda_match']['timestamp'])):
+                    total['best_kda_match'] = mejor
+        filas = [_fila(nombre, stats) for nombre, stats in combinados.items()]
+        orden = {nombre: stats['last_timestamp'] for nombre, stats in combinados.items()}
+    filas.sort(key=lambda f: (f['games_played'], orden[f['champion_name']]), reverse=True)
+    return filas[:limite] if limite is not None else filas
+
+
+def guardar_tabla_campeones():
+    """Persiste la tabla (con sus puntos de control) si ha cambiado desde el último guardado."""
+    with _LOCK:
+        if _ESTADO['version'] == _ESTADO['version_guardada']:
+            return False
+        version = _ESTADO['version']
+        datos = {
+            'inicio_temporada_ms': _ESTADO['inicio_temporada_ms'],
+            'jugadores': _ESTADO['jugadores']
+        }
+        guardado = guardar_cache(CHAMPION_AGGREGATES_CACHE_NAME, datos, version)
+        if guardado:
+            _ESTADO['version_guardada'] = version
+        return guardado
+
+
+def cargar_tabla_campeones(inicio_temporada_ms):
+    """
+    Carga la tabla persistida. Se descarta si es de otra temporada.
+
+    Returns:
+        int: Número de jugadores cargados.
+    """
+    persistida = cargar_cache(CHAMPION_AGGREGATES_CACHE_NAME)
+    if not persistida or not isinstance(persistida.get('data'), dict):
+        return 0
+    datos = persistida['data']
+    if datos.get('inicio_temporada_ms') != inicio_temporada_ms:
+        print("[champion_aggregates] Tabla de campeones de otra temporada. Se ignora.")
+        return 0
+    with _LOCK:
+        _ESTADO['inicio_temporada_ms'] = inicio_temporada_ms
+        _ESTADO['jugadores'] = datos.get('jugadores') or {}
+        _ESTADO['version'] = _ESTADO['version_guardada'] = persistida.get('data_version', 0)
+        return len(_ESTADO['jugadores'])
@@ -0,0 +1,91 @@
+# services/compression.py
+
+"""
+Compresión de respuestas HTTP (gzip y, si el paquete `brotli` está instalado, br).
+
+Las páginas dinámicas se comprimen al vuelo en el after_request de la app. Las que
+ya están guardadas en disco (caché de páginas renderizadas) o los recursos estáticos
+de texto se comprimen una sola vez y se sirve la variante precomprimida.
+"""
+import gzip
+import threading
+
+try:
+    import brotli
+except ImportError: # Dependencia opcional: sin ella solo se ofrece gzip
+    brotli = None
+
+COMPRESSION_MIN_BYTES = 1024
+COMPRESSION_GZIP_LEVEL = 6
+COMPRESSION_BROTLI_QUALITY = 5
+COMPRESSIBLE_MIMETYPES = frozenset({
+    'text/html', 'text/css', 'text/plain', 'text/javascript', 'application/javascript',
+    'application/json', 'image/svg+xml',
+})
+
+_VARIANTES = {} # (ruta, mtime, codificacion) -> bytes comprimidos de un fichero estático
+_VARIANTES_LOCK = threading.Lock()
+
+
+def _calidades(accept_encoding):
+    """{codificacion: q} de una cabecera Accept-Encoding."""
+    calidades = {}
+    for parte in (accept_encoding or '').split(','):
+        nombre, _, parametros = parte.strip().partition(';')
+        if not nombre:
+            continue
+        q = 1.0
+        parametros = parametros.strip()
+        if parametros.startswith('q='):
+            try:
+                q = float(parametros[2:])
+            except ValueError:
+                q = 0.0
+        calidades[nombre.strip().lower()] = q
+    return calidades
+
+
+def elegir_codificacion(accept_encoding, disponibles=None):
+    """
+    Codificación a usar según la cabecera Accept-Encoding del cliente: 'br', 'gzip' o None.
+
+    Args:
+        accept_encoding (str): Cabecera del cliente.
+        disponibles (tuple): Codificaciones entre las que elegir (por defecto las soportadas).
+    """
+    if disponibles is None:
+        disponibles = ('br', 'gzip') if brotli is not None else ('gzip',)
+    calidades = _calidades(accept_encoding)
+    for codificacion in disponibles:
+        if calidades.get(codificacion, calidades.get('*', 0)) > 0:
+            return codificacion
+    return None
+
+
+def comprimir(datos, codificacion):
+    """Comprime `datos` (bytes) con la codificación indicada."""
+    if codificacion == 'br':
+        return brotli.compress(datos, quality=COMPRESSION_BROTLI_QUALITY)
+    if codificacion == 'gzip':
+        return gzip.compress(datos, compresslevel=COMPRESSION_GZIP_LEVEL, mtime=0)
+    return datos
+
+
+def es_comprimible(mimetype, tamano):
+    return mimetype in COMPRESSIBLE_MIMETYPES and tamano >= COMPRESSION_MIN_BYTES
+
+
+def variante_fichero(ruta, mtime, codificacion):
+    """Bytes comprimidos de un fichero estático, calculados una sola vez por versión del fichero."""
+    clave = (ruta, mtime, codificacion)
+    with _VARIANTES_LOCK:
+        datos = _VARIANTES.get(clave)
+    if datos is None:
+        with open(ruta, 'rb') as f:
+            datos = comprimir(f.read(), codificacion)
+        with _VARIANTES_LOCK:
+            # Las versiones antiguas del mismo fichero ya no se piden
+            for antigua in [c for c in _VARIANTES if c[0] == ruta and c[2] == codificacion]:
+                del _VARIANTES[antigua]
+            _VARIANTES[clave] = datos
+    return datos
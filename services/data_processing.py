@@ -1,5 +1,115 @@
+import bisect
+from collections import defaultdict
 from datetime import datetime, timedelta, timezone
 
+QUEUE_NAMES_BY_ID = {420: "RANKED_SOLO_5x5", 440: "RANKED_FLEX_SR"}
+
+
+def _match_ts(match):
+    return match.get('game_end_timestamp', 0)
+
+
+def attribute_lp_changes(target_matches, context_matches, player_lp_history):
+    """
+    Sweep-line LP attribution engine ("method 1": snapshot windows) for many matches at once.
+
+    For each queue the snapshots and the player's matches are sorted once. The target
+    matches are then visited in timestamp order while monotonic pointers advance over the
+    snapshots (the one just before / just after the game) and over the matches (to check
+    that no other game of the same queue lies inside the snapshot window). Cost is
+    O((n + s) log(n + s)) per player instead of re-sorting and re-scanning per match.
+
+    Args:
+        target_matches (list): Matches to compute the LP change for.
+        context_matches (list): All the player's matches, used for the clean-window check.
+        player_lp_history (dict): LP snapshots for the player, keyed by queue name.
+
+    Returns:
+        dict: match_id -> (lp_change, elo_before, elo_after), with the same meaning as
+              calculate_lp_change. Matches without enough information are omitted.
+    """
+    results = {}
+    targets_by_queue = defaultdict(list)
+    for match in target_matches:
+        queue_name = QUEUE_NAMES_BY_ID.get(match.get('queue_id'))
+        if _match_ts(match) and queue_name and player_lp_history.get(queue_name):
+            targets_by_queue[match.get('queue_id')].append(match)
+    if not targets_by_queue:
+        return results
+
+    context_by_queue = defaultdict(dict)
+    for match in list(context_matches) + list(target_matches):
+        context_by_queue[match.get('queue_id')].setdefault(match['match_id'], _match_ts(match))
+
+    for queue_id, targets in targets_by_queue.items():
+        snapshots = sorted(player_lp_history[QUEUE_NAMES_BY_ID[queue_id]], key=lambda x: x['timestamp'])
+        snap_ts = [s['timestamp'] for s in snapshots]
+        context_ts = sorted(context_by_queue[queue_id].values())
+        n_snaps, n_context = len(snap_ts), len(context_ts)
+
+        i_ge = i_gt = 0 # first snapshot with ts >= t / ts > t
+        lo = hi = 0     # first context match with ts > window start / ts >= window end
+        for match in sorted(targets, key=_match_ts):
+            game_end_ts = _match_ts(match)
+            while i_ge < n_snaps and snap_ts[i_ge] < game_end_ts:
+                i_ge += 1
+            while i_gt < n_snaps and snap_ts[i_gt] <= game_end_ts:
+                i_gt += 1
+            if i_gt == n_snaps:
+                break # No later snapshot for this or any later match
+
+            snapshot_before = snapshots[i_ge - 1] if i_ge > 0 else None
+            snapshot_after = snapshots[i_gt]
+            window_start = snapshot_before['timestamp'] if snapshot_before else game_end_ts
+            while lo < n_context and context_ts[lo] <= window_start:
+                lo += 1
+            while hi < n_context and context_ts[hi] < snapshot_after['timestamp']:
+                hi += 1
+            games_in_window = max(hi - lo, 0)
+
+            # Case 1: both snapshots exist and this is the only game between them
+            if snapshot_before:
+                if games_in_window == 1:
+                    elo_before = snapshot_before.get('elo', 0)
+                    elo_after = snapshot_after.get('elo', 0)
+                    if elo_before != 0 and elo_after != 0:
+                        results[match['match_id']] = (elo_after - elo_before, elo_before, elo_after)
+            # Case 2: only 'after' snapshot exists (likely first game); the window starts at this game
+            elif games_in_window == 0:
+                elo_after = snapshot_after.get('elo', 0)
+                if elo_after != 0:
+                    results[match['match_id']] = (None, None, elo_after)
+    return results
+
+
+def build_post_game_index(matches):
+    """
+    Indexes the matches that already have a post-game rating, per queue, sorted by time.
+
+    Returns:
+        dict: queue_id -> (timestamps, post_game_values), both sorted by timestamp.
+    """
+    by_queue = defaultdict(list)
+    for match in matches:
+        post_game = match.get('post_game_valor_clasificacion')
+        if post_game is not None:
+            by_queue[match.get('queue_id')].append((_match_ts(match), post_game))
+    index = {}
+    for queue_id, items in by_queue.items():
+        items.sort(key=lambda x: x[0])
+        index[queue_id] = ([ts for ts, _ in items], [value for _, value in items])
+    return index
+
+
+def previous_post_game(index, queue_id, game_end_ts):
+    """Post-game rating of the latest indexed match of the queue that ended strictly before game_end_ts."""
+    entry = index.get(queue_id)
+    if not entry:
+        return None
+    pos = bisect.bisect_left(entry[0], game_end_ts)
+    return entry[1][pos - 1] if pos > 0 else None
+
+
 def calculate_lp_change(match, all_matches_for_player, player_queue_lp_history):
     """
     Calculates the LP gain/loss for a single match robustly.
@@ -13,71 +123,19 @@ def calculate_lp_change(match, all_matches_for_player, player_queue_lp_history):
         tuple: A tuple containing the LP change (int or None), ELO before the match (int or None),
                and ELO after the match (int or None).
     """
-    game_end_ts = match.get('game_end_timestamp', 0)
-    queue_id = match.get('queue_id')
-
-    if not game_end_ts or not queue_id:
+    queue_name = QUEUE_NAMES_BY_ID.get(match.get('queue_id'))
+    if not _match_ts(match) or not queue_name:
         return None, None, None
+    results = attribute_lp_changes([match], all_matches_for_player, {queue_name: player_queue_lp_history})
+    return results.get(match['match_id'], (None, None, None))
 
-    snapshots = sorted(player_queue_lp_history, key=lambda x: x['timestamp'])
-    
-    snapshot_before, snapshot_after = None, None
-    # Find the snapshot just before the match
-    for snapshot in reversed(snapshots):
-        if snapshot['timestamp'] < game_end_ts:
-            snapshot_before = snapshot
-            break
-    
-    # Find the snapshot just after the match
-    for snapshot in snapshots:
-        if snapshot['timestamp'] > game_end_ts:
-            snapshot_after = snapshot
-            break
-
-    # Case 1: Both snapshots exist
-    if snapshot_before and snapshot_after:
-        # Ensure no other match is between the snapshots
-        is_clean_change = True
-        for other_match in all_matches_for_player:
-            if other_match['match_id'] != match['match_id'] and other_match.get('queue_id') == queue_id:
-                other_ts = other_match.get('game_end_timestamp', 0)
-                if snapshot_before['timestamp'] < other_ts < snapshot_after['timestamp']:
-                    is_clean_change = False
-                    break
-        
-        if is_clean_change:
-            elo_before = snapshot_before.get('elo', 0)
-            elo_after = snapshot_after.get('elo', 0)
-            
-            if elo_before == 0 or elo_after == 0:
-                return None, None, None
-
-            lp_change = elo_after - elo_before
-            return lp_change, elo_before, elo_after
-
-    # Case 2: Only 'after' snapshot exists (likely first game)
-    elif snapshot_after and not snapshot_before:
-        is_clean_window = True
-        for other_match in all_matches_for_player:
-            if other_match['match_id'] != match['match_id'] and other_match.get('queue_id') == queue_id:
-                other_ts = other_match.get('game_end_timestamp', 0)
-                if game_end_ts < other_ts < snapshot_after['timestamp']:
-                    is_clean_window = False
-                    break
-        
-        if is_clean_window:
-            elo_after = snapshot_after.get('elo', 0)
-            if elo_after != 0:
-                # We can't know lp_change or elo_before, but we know elo_after
-                return None, None, elo_after
-
-    # Default case: Not enough info
-    return None, None, None
 
 def process_player_match_history(matches, player_lp_history):
     """
     Processes a player's match history to calculate LP changes for each match.
     MEJORADO: Ahora intenta múltiples métodos de cálculo para minimizar valores null.
+    Method 1 runs for all pending matches in a single sweep (attribute_lp_changes); method 2
+    uses the nearest older and newer games of the same queue, tracked in two linear passes.
 
     Args:
         matches (list): A list of matches for the player.
@@ -98,38 +156,46 @@ def process_player_match_history(matches, player_lp_history):
         if 'post_game_valor_clasificacion' not in match:
             match['post_game_valor_clasificacion'] = None
 
+    def _is_pending(match):
+        queue_name = QUEUE_NAMES_BY_ID.get(match.get('queue_id'))
+        return match.get('lp_change_this_game') is None and queue_name in player_lp_history
+
+    # Método 1: Usar snapshots históricos de la API (una sola pasada por cola)
+    method_1 = attribute_lp_changes([m for m in matches_sorted if _is_pending(m)], matches, player_lp_history)
+
+    # Método 2 (preparación): post-game de la partida anterior más cercana en la misma cola
+    older_post_game = [None] * len(matches_sorted)
+    last_post_by_queue = {}
+    for i in range(len(matches_sorted) - 1, -1, -1):
+        match = matches_sorted[i]
+        older_post_game[i] = last_post_by_queue.get(match.get('queue_id'))
+        if match.get('post_game_valor_clasificacion') is not None:
+            last_post_by_queue[match.get('queue_id')] = match['post_game_valor_clasificacion']
+
+    newer_post_by_queue = {}
     for i, match in enumerate(matches_sorted):
+        queue_id = match.get('queue_id')
         # Solo calcular si no tiene valor válido
-        if match.get('lp_change_this_game') is None:
-            queue_id = match.get('queue_id')
-            queue_name = "RANKED_SOLO_5x5" if queue_id == 420 else "RANKED_FLEX_SR" if queue_id == 440 else None
-
-            if queue_name and queue_name in player_lp_history:
-                # Método 1: Usar snapshots históricos de la API
-                lp_change, elo_before, elo_after = calculate_lp_change(match, matches, player_lp_history[queue_name])
-
-                # Método 2: Si Método 1 falló, buscar la partida anterior en la misma cola
-                if lp_change is None and i + 1 < len(matches_sorted):
-                    for next_match in matches_sorted[i+1:]:
-                        if next_match.get('queue_id') == queue_id and next_match.get('post_game_valor_clasificacion') is not None:
-                            # La partida anterior está disponible
-                            elo_before = next_match.get('post_game_valor_clasificacion')
-                            # Buscar la siguiente partida en la misma cola para obtener post_game
-                            for prev_match in matches_sorted[:i]:
-                                if prev_match.get('queue_id') == queue_id and prev_match.get('post_game_valor_clasificacion') is not None:
-                                    elo_after = prev_match.get('post_game_valor_clasificacion')
-                                    if elo_before is not None and elo_after is not None:
-                                        lp_change = elo_after - elo_before
-                                    break
-                            break
-
-                if lp_change is not None:
-                    match['lp_change_this_game'] = lp_change
-                    match['pre_game_valor_clasificacion'] = elo_before
-                    match['post_game_valor_clasificacion'] = elo_after
-                else:
-                    match['lp_change_this_game'] = None
-                    match['pre_game_valor_clasificacion'] = None
-                    match['post_game_valor_clasificacion'] = None
+        if _is_pending(match):
+            lp_change, elo_before, elo_after = method_1.get(match['match_id'], (None, None, None))
+
+            # Método 2: Si Método 1 falló, usar las partidas anterior y siguiente de la misma cola
+            if lp_change is None:
+                elo_before = older_post_game[i]
+                elo_after = newer_post_by_queue.get(queue_id)
+                if elo_before is not None and elo_after is not None:
+                    lp_change = elo_after - elo_before
+
+            if lp_change is not None:
+                match['lp_change_this_game'] = lp_change
+                match['pre_game_valor_clasificacion'] = elo_before
+                match['post_game_valor_clasificacion'] = elo_after
+            else:
+                match['lp_change_this_game'] = None
+                match['pre_game_valor_clasificacion'] = None
+                match['post_game_valor_clasificacion'] = None
+
+        if match.get('post_game_valor_clasificacion') is not None:
+            newer_post_by_queue[queue_id] = match['post_game_valor_clasificacion']
     
     return matches_sorted
@@ -0,0 +1,70 @@
+# services/data_versions.py
+
+"""
+Versiones de datos monótonas por conjunto de datos derivado (p. ej. 'match_history:<puuid>').
+
+La versión se incrementa en el lado de escritura, cuando cambia el contenido de los
+datos (se compara una huella barata, no el contenido completo). En el lado de lectura
+la ETag de una respuesta se construye solo con versiones ya conocidas, así que un
+If-None-Match que coincide se responde con 304 sin cargar ni serializar nada.
+
+Las versiones viven en memoria de cada proceso: la ETag incluye una época del proceso
+para que dos workers con el mismo número de versión y datos distintos no se confundan.
+"""
+import os
+import time
+import threading
+
+
+class RegistroVersiones:
+    """Contador de versión por conjunto de datos, con detección de cambios por huella."""
+
+    def __init__(self):
+        self.epoca = f"{os.getpid():x}{int(time.time()):x}"
+        self._versiones = {} # nombre -> (version, huella, momento de la última confirmación)
+        self._lock = threading.Lock()
+
+    def version(self, nombre, max_edad=None):
+        """
+        Versión actual del conjunto de datos, o None si aún no se ha registrado.
+        Con `max_edad` (segundos) también es None si hace más de eso que nadie confirmó los datos
+        (p. ej. otra caché compartida pudo cambiarlos sin pasar por este proceso).
+        """
+        actual = self._vigente(nombre, max_edad)
+        return actual[0] if actual else None
+
+    def huella(self, nombre, max_edad=None):
+        """
+        Última huella registrada del conjunto de datos, con la misma caducidad que `version`.
+        A diferencia de la versión, depende solo del contenido: coincide entre procesos.
+        """
+        actual = self._vigente(nombre, max_edad)
+        return actual[1] if actual else None
+
+    def _vigente(self, nombre, max_edad):
+        with self._lock:
+            actual = self._versiones.get(nombre)
+        if not actual or (max_edad is not None and time.time() - actual[2] > max_edad):
+            return None
+        return actual
+
+    def registrar(self, nombre, huella=None):
+        """
+        Registra una escritura del conjunto de datos. La versión solo avanza si la huella
+        es distinta de la anterior (o si no se da huella).
+
+        Returns:
+            int: Versión vigente tras la escritura.
+        """
+        with self._lock:
+            version, anterior, _ = self._versiones.get(nombre, (0, None, 0))
+            if huella is None or huella != anterior or version == 0:
+                version += 1
+            self._versiones[nombre] = (version, huella, time.time())
+            return version
+
+    def etag(self, recurso, *versiones):
+        """Valor de ETag fuerte (sin comillas) para `recurso` a partir de versiones conocidas; None si falta alguna."""
+        if any(v is None for v in versiones):
+            return None
+        return f"{recurso}-{self.epoca}-" + "-".join(str(v) for v in versiones)
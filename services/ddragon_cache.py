@@ -0,0 +1,140 @@
+# services/ddragon_cache.py
+
+"""
+Caché en disco de los datos estáticos de Data Dragon (campeones, runas y hechizos).
+
+Los datos se guardan en un fichero por versión de parche (<DDRAGON_CACHE_DIR>/<versión>.json)
+y un puntero (actual.json) indica la versión vigente y cuándo se comprobó por última vez.
+Al arrancar se leen de disco sin tocar la red; la comprobación de un parche nuevo y la
+descarga se hacen en segundo plano. Comprobar sin cambios solo reescribe el puntero.
+"""
+import os
+import re
+import json
+import time
+import threading
+
+from services.warm_cache import WARM_CACHE_DIR, escribir_json_atomico
+
+DDRAGON_CACHE_DIR = os.environ.get("DDRAGON_CACHE_DIR", os.path.join(WARM_CACHE_DIR, "ddragon"))
+DDRAGON_CACHE_POINTER = os.path.join(DDRAGON_CACHE_DIR, "actual.json")
+DDRAGON_CACHE_FORMAT_VERSION = 2
+DDRAGON_CACHE_KEEP_VERSIONS = 2 # Parches que se conservan en disco (el vigente y el anterior)
+
+_WRITE_LOCK = threading.Lock()
+
+
+def _ruta_version(version):
+    return os.path.join(DDRAGON_CACHE_DIR, re.sub(r"[^0-9A-Za-z_.-]", "_", version) + ".json")
+
+
+def _leer_json(ruta):
+    try:
+        with open(ruta, "r", encoding="utf-8") as f:
+            payload = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"[ddragon_cache] Error leyendo {ruta}: {e}")
+        return None
+    return payload if payload.get("format_version") == DDRAGON_CACHE_FORMAT_VERSION else None
+
+
+def _claves_a_int(mapa):
+    """JSON solo admite claves de texto: se restauran los IDs numéricos."""
+    return {int(k): v for k, v in (mapa or {}).items()}
+
+
+def guardar_ddragon(version, campeones, runas, hechizos, comprobado_en=None):
+    """
+    Guarda en disco los datos de un parche en su propio fichero, lo marca como vigente
+    y borra los de parches antiguos. Todas las escrituras son atómicas.
+
+    Args:
+        version (str): Versión de Data Dragon (p. ej. '14.9.1').
+        campeones (dict): ID de campeón -> nombre.
+        runas (dict): ID de runa/árbol -> ruta del icono.
+        hechizos (dict): ID de hechizo -> nombre interno.
+        comprobado_en (float): Última vez que se comprobó la versión publicada.
+
+    Returns:
+        bool: True si se guardó correctamente.
+    """
+    payload = {
+        "format_version": DDRAGON_CACHE_FORMAT_VERSION,
+        "version": version,
+        "champions": campeones,
+        "runes": runas,
+        "summoner_spells": hechizos
+    }
+    try:
+        with _WRITE_LOCK:
+            os.makedirs(DDRAGON_CACHE_DIR, exist_ok=True)
+            escribir_json_atomico(_ruta_version(version), payload)
+    except (OSError, TypeError, ValueError) as e:
+        print(f"[ddragon_cache] Error guardando los datos de Data Dragon {version}: {e}")
+        return False
+    if not marcar_comprobado(version, comprobado_en):
+        return False
+    _borrar_antiguas()
+    return True
+
+
+def marcar_comprobado(version, comprobado_en=None):
+    """Apunta la versión vigente y la marca de última comprobación (sin reescribir los datos)."""
+    puntero = {
+        "format_version": DDRAGON_CACHE_FORMAT_VERSION,
+        "version": version,
+        "checked_at": comprobado_en if comprobado_en is not None else time.time()
+    }
+    try:
+        with _WRITE_LOCK:
+            os.makedirs(DDRAGON_CACHE_DIR, exist_ok=True)
+            escribir_json_atomico(DDRAGON_CACHE_POINTER, puntero)
+        return True
+    except OSError as e:
+        print(f"[ddragon_cache] Error guardando el puntero de Data Dragon: {e}")
+    return False
+
+
+def cargar_ddragon(version=None):
+    """
+    Carga los datos de Data Dragon persistidos de `version` (por defecto, la vigente).
+
+    Returns:
+        dict | None: {'version', 'checked_at', 'champions', 'runes', 'summoner_spells'}
+                     con claves numéricas, o None si no hay caché válida.
+    """
+    puntero = _leer_json(DDRAGON_CACHE_POINTER) if os.path.exists(DDRAGON_CACHE_POINTER) else None
+    if version is None:
+        if not puntero or not puntero.get("version"):
+            return None
+        version = puntero["version"]
+    ruta = _ruta_version(version)
+    payload = _leer_json(ruta) if os.path.exists(ruta) else None
+    if not payload or payload.get("version") != version:
+        return None
+    try:
+        return {
+            "version": version,
+            "checked_at": puntero.get("checked_at", 0) if puntero and puntero.get("version") == version else 0,
+            "champions": _claves_a_int(payload.get("champions")),
+            "runes": _claves_a_int(payload.get("runes")),
+            "summoner_spells": _claves_a_int(payload.get("summoner_spells"))
+        }
+    except (TypeError, ValueError) as e:
+        print(f"[ddragon_cache] Datos de Data Dragon {version} corruptos: {e}")
+    return None
+
+
+def _borrar_antiguas():
+    """Borra los ficheros de parches más allá de los DDRAGON_CACHE_KEEP_VERSIONS más recientes."""
+    try:
+        nombres = [n for n in os.listdir(DDRAGON_CACHE_DIR)
+                   if n.endswith(".json") and os.path.join(DDRAGON_CACHE_DIR, n) != DDRAGON_CACHE_POINTER]
+    except OSError:
+        return
+    rutas = sorted((os.path.join(DDRAGON_CACHE_DIR, n) for n in nombres), key=os.path.getmtime, reverse=True)
+    for ruta in rutas[DDRAGON_CACHE_KEEP_VERSIONS:]: # Incluye el antiguo ddragon_data.json único
+        try:
+            os.remove(ruta)
+        except OSError:
+            pass
@@ -0,0 +1,71 @@
+# services/fragment_cache.py
+
+"""
+Caché en memoria de fragmentos HTML (filas de partidas ya renderizadas).
+
+La fila de una partida terminada no cambia salvo que cambie la atribución de LP,
+la versión de Data Dragon o la propia plantilla, así que esos valores forman parte
+de la clave: (plantilla, huella de plantilla, match_id, puuid, versión de LP,
+versión de Data Dragon, ...). Renderizar una página pasa a ser, casi siempre, unir
+cadenas ya calculadas. Las entradas que dejan de pedirse salen por LRU al superar
+el tamaño máximo.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+FRAGMENT_CACHE_MAX_BYTES = int(os.environ.get("FRAGMENT_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+
+
+class CacheFragmentos:
+    """
+    LRU de fragmentos HTML limitada por el tamaño total de los fragmentos.
+
+    Args:
+        max_bytes (int): Tamaño máximo (en caracteres) de todos los fragmentos guardados.
+    """
+
+    def __init__(self, max_bytes=FRAGMENT_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._fragmentos = OrderedDict()
+        self._total = 0
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+
+    def obtener_o_renderizar(self, clave, renderizar):
+        """Devuelve el fragmento de `clave` o lo renderiza con `renderizar()` y lo guarda."""
+        with self._lock:
+            fragmento = self._fragmentos.get(clave)
+            if fragmento is not None:
+                self._fragmentos.move_to_end(clave)
+                self.aciertos += 1
+                return fragmento
+            self.fallos += 1
+
+        # Se renderiza fuera del lock: dos hilos pueden renderizar la misma fila, pero el resultado es idéntico
+        fragmento = renderizar()
+        if len(fragmento) > self.max_bytes:
+            return fragmento
+        with self._lock:
+            previo = self._fragmentos.pop(clave, None)
+            if previo is not None:
+                self._total -= len(previo)
+            self._fragmentos[clave] = fragmento
+            self._total += len(fragmento)
+            while self._total > self.max_bytes:
+                _, expulsado = self._fragmentos.popitem(last=False)
+                self._total -= len(expulsado)
+        return fragmento
+
+    def limpiar(self):
+        """Vacía la caché (p. ej. tras un cambio de versión de Data Dragon)."""
+        with self._lock:
+            self._fragmentos.clear()
+            self._total = 0
+
+    def estadisticas(self):
+        """Resumen de la caché: fragmentos, tamaño y tasa de aciertos."""
+        with self._lock:
+            return {'fragmentos': len(self._fragmentos), 'bytes': self._total, 'max_bytes': self.max_bytes,
+                    'aciertos': self.aciertos, 'fallos': self.fallos}
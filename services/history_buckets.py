@@ -0,0 +1,167 @@
+# services/history_buckets.py
+
+"""
+Historial global precalculado por semanas ISO (mismo criterio que los shards weeks/
+de match_history: '2026-W14').
+
+Cada semana es un cubo inmutable con las filas HTML ya renderizadas, de más reciente
+a más antigua, y una huella de su contenido (partidas, LP, versión de Data Dragon...).
+Al sincronizar solo se vuelven a renderizar los cubos cuya huella ha cambiado, que en
+la práctica es la semana en curso. Las páginas numeradas se montan concatenando filas
+de los cubos que cubren el rango pedido; una partida nueva ya no invalida todas las
+páginas a la vez.
+"""
+import os
+import json
+import time
+import hashlib
+import threading
+from datetime import datetime, timezone
+
+from services.warm_cache import WARM_CACHE_DIR, escribir_json_atomico
+
+HISTORY_BUCKETS_DIR = os.environ.get("HISTORY_BUCKETS_DIR", os.path.join(WARM_CACHE_DIR, "historial_global_semanas"))
+HISTORY_BUCKETS_FORMAT_VERSION = 1
+
+
+def clave_semana(timestamp_ms):
+    """Semana ISO (UTC) de un timestamp en milisegundos, p. ej. '2026-W14'."""
+    return datetime.fromtimestamp(timestamp_ms / 1000, tz=timezone.utc).strftime("%G-W%V")
+
+
+def agrupar_por_semana(partidas):
+    """Agrupa un flujo de partidas (de más reciente a más antigua) en {semana: [partidas]} conservando el orden."""
+    semanas = {}
+    for partida in partidas:
+        semanas.setdefault(clave_semana(partida.get('game_end_timestamp', 0)), []).append(partida)
+    return semanas
+
+
+def huella_semana(partidas, campos, extra=()):
+    """Huella del contenido visible de un cubo: cambia si cambia cualquier campo que se renderiza."""
+    h = hashlib.sha1(repr(tuple(extra)).encode("utf-8"))
+    for partida in partidas:
+        h.update(repr(tuple(partida.get(campo) for campo in campos)).encode("utf-8"))
+    return h.hexdigest()
+
+
+class AlmacenSemanas:
+    """Cubos semanales de filas renderizadas en disco, con un manifiesto de huellas y tamaños."""
+
+    def __init__(self, directorio=HISTORY_BUCKETS_DIR):
+        self.directorio = directorio
+        self._ruta_manifiesto = os.path.join(directorio, "_manifest.json")
+        self._lock = threading.Lock()
+        self._filas = {} # (semana, huella) -> filas, para no releer el disco en cada página
+        self._mtime_manifiesto = None
+        self._manifiesto = self._leer_manifiesto()
+
+    def _leer_manifiesto(self):
+        try:
+            self._mtime_manifiesto = os.path.getmtime(self._ruta_manifiesto)
+            with open(self._ruta_manifiesto, "r", encoding="utf-8") as f:
+                manifiesto = json.load(f)
+            if manifiesto.get("format_version") == HISTORY_BUCKETS_FORMAT_VERSION:
+                return manifiesto
+        except (OSError, ValueError):
+            pass
+        return {"format_version": HISTORY_BUCKETS_FORMAT_VERSION, "semanas": {}}
+
+    def _recargar_si_cambia(self):
+        """Otro proceso (el líder) puede haber sincronizado los cubos: se relee el manifiesto si ha cambiado."""
+        try:
+            mtime = os.path.getmtime(self._ruta_manifiesto)
+        except OSError:
+            return
+        if mtime != self._mtime_manifiesto:
+            self._manifiesto = self._leer_manifiesto()
+
+    def _ruta_semana(self, semana):
+        return os.path.join(self.directorio, f"{semana}.json")
+
+    def sincronizar(self, semanas, renderizar_fila, campos, extra=()):
+        """
+        Re-renderiza solo los cubos cuya huella ha cambiado y elimina los que ya no existen.
+
+        Args:
+            semanas (dict): {semana: [partidas]} (ver agrupar_por_semana).
+            renderizar_fila (callable): partida -> HTML de la fila.
+            campos (tuple): Campos de la partida que influyen en la fila renderizada.
+            extra (tuple): Otros valores que invalidan todos los cubos (p. ej. versión de Data Dragon).
+
+        Returns:
+            list: Semanas que se han vuelto a renderizar.
+        """
+        renderizadas = []
+        with self._lock:
+            os.makedirs(self.directorio, exist_ok=True)
+            actuales = self._manifiesto["semanas"]
+            nuevas = {}
+            for semana, partidas in semanas.items():
+                huella = huella_semana(partidas, campos, extra)
+                previa = actuales.get(semana)
+                if previa and previa["huella"] == huella and os.path.exists(self._ruta_semana(semana)):
+                    nuevas[semana] = previa
+                    continue
+                filas = [renderizar_fila(partida) for partida in partidas]
+                escribir_json_atomico(self._ruta_semana(semana), filas)
+                self._filas[(semana, huella)] = filas
+                nuevas[semana] = {"huella": huella, "filas": len(filas), "actualizado": time.time()}
+                renderizadas.append(semana)
+
+            for semana in set(actuales) - set(nuevas):
+                try:
+                    os.remove(self._ruta_semana(semana))
+                except OSError:
+                    pass
+            self._manifiesto["semanas"] = nuevas
+            escribir_json_atomico(self._ruta_manifiesto, self._manifiesto)
+            self._mtime_manifiesto = os.path.getmtime(self._ruta_manifiesto)
+            vigentes = {(semana, datos["huella"]) for semana, datos in nuevas.items()}
+            self._filas = {clave: filas for clave, filas in self._filas.items() if clave in vigentes}
+        return renderizadas
+
+    def total(self):
+        """Número total de filas precalculadas."""
+        with self._lock:
+            self._recargar_si_cambia()
+            return sum(datos["filas"] for datos in self._manifiesto["semanas"].values())
+
+    def _leer_semana(self, semana, huella):
+        clave = (semana, huella)
+        if clave not in self._filas:
+            with open(self._ruta_semana(semana), "r", encoding="utf-8") as f:
+                self._filas[clave] = json.load(f)
+        return self._filas[clave]
+
+    def pagina(self, numero, tamano):
+        """
+        Monta la página `numero` (desde 1) con las filas de los cubos que la cubren.
+        Solo se leen los cubos necesarios.
+
+        Returns:
+            tuple: (filas_html, total_filas) o (None, 0) si no hay datos precalculados.
+        """
+        with self._lock:
+            self._recargar_si_cambia()
+            semanas = sorted(self._manifiesto["semanas"].items(), reverse=True) # De la semana más reciente a la más antigua
+            total = sum(datos["filas"] for _, datos in semanas)
+            if not semanas:
+                return None, 0
+            inicio = (numero - 1) * tamano
+            fin = inicio + tamano
+            filas = []
+            desplazamiento = 0
+            try:
+                for semana, datos in semanas:
+                    siguiente = desplazamiento + datos["filas"]
+                    if siguiente > inicio and desplazamiento < fin:
+                        contenido = self._leer_semana(semana, datos["huella"])
+                        filas.extend(contenido[max(inicio - desplazamiento, 0):fin - desplazamiento])
+                    if siguiente >= fin:
+                        break
+                    desplazamiento = siguiente
+            except (OSError, ValueError) as e:
+                print(f"[history_buckets] Error leyendo los cubos del historial global: {e}")
+                return None, 0
+            return filas, total
@@ -0,0 +1,316 @@
+# services/icon_mirror.py
+
+"""
+Copia local de los iconos de Data Dragon (campeones, objetos, hechizos y runas) por versión de parche.
+
+Cada fila de partida muestra unos 15 iconos y el detalle desplegado otros 80, así que una
+página de historial hacía cientos de peticiones al CDN de Riot. Cuando cambia el parche, el
+líder descarga los iconos una sola vez a <ICON_MIRROR_DIR>/<versión>/ y, si Pillow está
+instalado, los une en un atlas (sprite) por categoría con una hoja CSS que sitúa cada icono.
+Una página carga entonces unos pocos atlas cacheables en lugar de cientos de imágenes.
+
+La copia se publica de forma atómica (se descarga a una carpeta temporal y se renombra) con
+un manifiesto que el resto de procesos leen de disco. Un icono que no está en la copia (p. ej.
+un objeto nuevo de un modo temporal) se sigue enlazando a Data Dragon.
+"""
+import os
+import re
+import json
+import math
+import time
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+try:
+    from PIL import Image, features
+except ImportError: # Dependencia opcional: sin ella se sirven los iconos sueltos, sin atlas
+    Image = None
+
+from services.warm_cache import WARM_CACHE_DIR
+
+ICON_MIRROR_DIR = os.environ.get("ICON_MIRROR_DIR", os.path.join(WARM_CACHE_DIR, "iconos"))
+ICON_MIRROR_FORMAT_VERSION = 1
+ICON_MIRROR_KEEP_VERSIONS = 2 # La anterior sigue disponible para páginas ya cacheadas por los navegadores
+ICON_MIRROR_WORKERS = 8
+ICON_MIRROR_RECHECK = 30 # Segundos entre comprobaciones del manifiesto en disco
+ICON_CATEGORIES = ('champion', 'item', 'spell', 'rune')
+ICON_SPRITE_CELLS = {'champion': 64, 'item': 48, 'spell': 48, 'rune': 48} # ~2x el tamaño mostrado
+ICON_SPRITE_ITEM_MAPS = ('11', '12') # Grieta y ARAM; los objetos de otros modos van sueltos
+DDRAGON_CDN = "https://ddragon.leagueoflegends.com/cdn"
+ICON_MANIFEST = "manifest.json"
+ICON_CSS = "iconos.css"
+ICON_TRANSPARENT_PIXEL = "data:image/gif;base64,R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAAABAAEAAAIBRAA7"
+
+
+def url_ddragon(version, categoria, clave):
+    """URL del icono en Data Dragon (la que usaban las plantillas antes de la copia local)."""
+    if categoria == 'rune':
+        return f"{DDRAGON_CDN}/img/{clave}"
+    return f"{DDRAGON_CDN}/{version}/img/{categoria}/{clave}.png"
+
+
+def _slug(clave):
+    """Fragmento seguro para nombres de fichero y clases CSS (las runas vienen como rutas)."""
+    return re.sub(r'[^A-Za-z0-9_-]', '_', re.sub(r'\.png$', '', str(clave)))
+
+
+def clases_icono(categoria, clave):
+    return f"icono-{categoria} icono-{categoria}-{_slug(clave)}"
+
+
+def _listar_iconos(version):
+    """
+    Iconos publicados en un parche: {categoria: {clave: url}}, más el conjunto de claves que van al atlas.
+    Las claves son las que usan las plantillas: nombre del campeón, ID del objeto, nombre interno del
+    hechizo y ruta del icono de la runa.
+    """
+    base = f"{DDRAGON_CDN}/{version}/data/en_US"
+
+    def _datos(fichero):
+        respuesta = requests.get(f"{base}/{fichero}", timeout=15)
+        respuesta.raise_for_status()
+        return respuesta.json()
+
+    iconos = {categoria: {} for categoria in ICON_CATEGORIES}
+    en_atlas = {categoria: set() for categoria in ICON_CATEGORIES}
+    for campeon in _datos("champion.json")['data'].values():
+        clave = campeon['image']['full'][:-len('.png')]
+        iconos['champion'][clave] = url_ddragon(version, 'champion', clave)
+    for item_id, item in _datos("item.json")['data'].items():
+        iconos['item'][item_id] = url_ddragon(version, 'item', item_id)
+        if any(item.get('maps', {}).get(mapa) for mapa in ICON_SPRITE_ITEM_MAPS):
+            en_atlas['item'].add(item_id)
+    for hechizo in _datos("summoner.json")['data'].values():
+        iconos['spell'][hechizo['id']] = url_ddragon(version, 'spell', hechizo['id'])
+    for arbol in _datos("runesReforged.json"):
+        iconos['rune'][arbol['icon']] = url_ddragon(version, 'rune', arbol['icon'])
+        for fila in arbol['slots']:
+            for runa in fila['runes']:
+                iconos['rune'][runa['icon']] = url_ddragon(version, 'rune', runa['icon'])
+    for categoria in ('champion', 'spell', 'rune'):
+        en_atlas[categoria] = set(iconos[categoria])
+    return iconos, en_atlas
+
+
+def _descargar(url, ruta):
+    try:
+        respuesta = requests.get(url, timeout=10)
+        if respuesta.status_code != 200:
+            return False
+        with open(ruta, "wb") as f:
+            f.write(respuesta.content)
+        return True
+    except (requests.exceptions.RequestException, OSError):
+        return False
+
+
+def _construir_atlas(carpeta, categoria, claves, ficheros):
+    """
+    Une los iconos de una categoría en una cuadrícula y devuelve la regla CSS de cada uno.
+    Las posiciones van en porcentaje para que el mismo atlas sirva a cualquier tamaño mostrado.
+    """
+    celda = ICON_SPRITE_CELLS[categoria]
+    columnas = max(1, math.ceil(math.sqrt(len(claves))))
+    filas = max(1, math.ceil(len(claves) / columnas))
+    atlas = Image.new("RGBA", (columnas * celda, filas * celda), (0, 0, 0, 0))
+    colocadas = []
+    for clave in claves:
+        try:
+            with Image.open(os.path.join(carpeta, ficheros[clave])) as icono:
+                icono = icono.convert("RGBA").resize((celda, celda), Image.LANCZOS)
+        except (OSError, ValueError):
+            continue
+        fila, columna = divmod(len(colocadas), columnas)
+        atlas.paste(icono, (columna * celda, fila * celda))
+        colocadas.append(clave)
+
+    nombre = f"sprite-{categoria}"
+    atlas.save(os.path.join(carpeta, f"{nombre}.png"), format="PNG", optimize=True)
+    fondo = f"background-image:url({nombre}.png);"
+    if features.check('webp'):
+        atlas.save(os.path.join(carpeta, f"{nombre}.webp"), format="WEBP", quality=90, method=6)
+        fondo += f'background-image:image-set(url({nombre}.webp) type("image/webp"),url({nombre}.png) type("image/png"));'
+    reglas = [f".icono-{categoria}{{{fondo}background-size:{columnas * 100}% {filas * 100}%;background-repeat:no-repeat}}"]
+    for indice, clave in enumerate(colocadas):
+        fila, columna = divmod(indice, columnas)
+        x = columna * 100 / (columnas - 1) if columnas > 1 else 0
+        y = fila * 100 / (filas - 1) if filas > 1 else 0
+        reglas.append(f".icono-{categoria}-{_slug(clave)}{{background-position:{x:.4f}% {y:.4f}%}}")
+    return colocadas, reglas
+
+
+class EspejoIconos:
+    """
+    Copia local de los iconos de Data Dragon, una carpeta por versión con su manifiesto.
+
+    Args:
+        directorio (str): Carpeta raíz de la copia.
+    """
+
+    def __init__(self, directorio=ICON_MIRROR_DIR):
+        self.directorio = directorio
+        self._lock = threading.Lock()
+        self._manifiestos = {} # version -> (momento de la comprobación, mtime, manifiesto o None)
+
+    def _carpeta(self, version):
+        return os.path.join(self.directorio, _slug(version))
+
+    def _manifiesto(self, version):
+        """Manifiesto de la versión (None si no está copiada); se vuelve a mirar el disco cada ICON_MIRROR_RECHECK s."""
+        ahora = time.time()
+        with self._lock:
+            cached = self._manifiestos.get(version)
+        if cached and ahora - cached[0] < ICON_MIRROR_RECHECK:
+            return cached[2]
+        ruta = os.path.join(self._carpeta(version), ICON_MANIFEST)
+        try:
+            mtime = os.path.getmtime(ruta)
+        except OSError:
+            mtime = None
+        if cached and cached[1] == mtime:
+            manifiesto = cached[2]
+        elif mtime is None:
+            manifiesto = None
+        else:
+            try:
+                with open(ruta, "r", encoding="utf-8") as f:
+                    manifiesto = json.load(f)
+                if manifiesto.get("format_version") != ICON_MIRROR_FORMAT_VERSION:
+                    manifiesto = None
+                else:
+                    manifiesto['sprites'] = {c: set(claves) for c, claves in manifiesto.get('sprites', {}).items()}
+            except (OSError, ValueError) as e:
+                print(f"[icon_mirror] Error leyendo el manifiesto de iconos {version}: {e}")
+                manifiesto = None
+        with self._lock:
+            self._manifiestos[version] = (ahora, mtime, manifiesto)
+        return manifiesto
+
+    def estado(self, version):
+        """'sprites', 'local' o '' según lo que haya copiado de la versión (forma parte de las claves de caché)."""
+        manifiesto = self._manifiesto(version)
+        if not manifiesto:
+            return ''
+        return 'sprites' if manifiesto.get('css') else 'local'
+
+    def completa(self, version):
+        """True si la versión está copiada y, habiendo Pillow, con sus atlas (si no, hay que rehacerla)."""
+        estado = self.estado(version)
+        return estado == 'sprites' or (estado == 'local' and Image is None)
+
+    def icono(self, version, categoria, clave):
+        """
+        Cómo mostrar un icono: {'src', 'fichero', 'clase'}.
+
+        Con atlas, `src` es un GIF transparente de 1x1 y `clase` sitúa el icono como fondo (así las
+        reglas CSS existentes para `img` siguen aplicando). Sin atlas, `fichero` es la ruta del icono
+        dentro de la copia local o, si no se copió, `src` es la URL de Data Dragon.
+        """
+        clave = str(clave)
+        manifiesto = self._manifiesto(version)
+        if manifiesto:
+            if clave in manifiesto['sprites'].get(categoria, ()):
+                return {'src': ICON_TRANSPARENT_PIXEL, 'fichero': None, 'clase': clases_icono(categoria, clave)}
+            fichero = manifiesto['iconos'].get(categoria, {}).get(clave)
+            if fichero:
+                return {'src': None, 'fichero': fichero, 'clase': ''}
+        return {'src': url_ddragon(version, categoria, clave), 'fichero': None, 'clase': ''}
+
+    def css(self, version):
+        """Nombre de la hoja CSS de los atlas de la versión, o None si no hay atlas."""
+        manifiesto = self._manifiesto(version)
+        return manifiesto.get('css') if manifiesto else None
+
+    def ruta(self, version, fichero):
+        """Ruta absoluta de un fichero de la copia, o None si no existe o se sale de la carpeta."""
+        carpeta = os.path.realpath(self._carpeta(version))
+        ruta_abs = os.path.realpath(os.path.join(carpeta, fichero))
+        if not ruta_abs.startswith(carpeta + os.sep) or os.path.basename(ruta_abs) == ICON_MANIFEST:
+            return None
+        return ruta_abs if os.path.isfile(ruta_abs) else None
+
+    def sincronizar(self, version):
+        """
+        Descarga los iconos de `version` (si no están ya), genera los atlas si hay Pillow,
+        publica la carpeta y borra las versiones antiguas. Una copia hecha sin Pillow se rehace
+        con atlas en cuanto Pillow está instalado.
+
+        Returns:
+            bool: True si la versión queda copiada.
+        """
+        if self.completa(version):
+            return True
+        if Image is None:
+            print("[sincronizar_iconos] Pillow no está instalado: los iconos se copian sueltos, sin atlas.")
+        print(f"[sincronizar_iconos] Copiando los iconos de Data Dragon {version}.")
+        try:
+            iconos, en_atlas = _listar_iconos(version)
+        except (requests.exceptions.RequestException, ValueError, KeyError, TypeError) as e:
+            print(f"[sincronizar_iconos] Error obteniendo la lista de iconos de {version}: {e}")
+            return False
+
+        temporal = f"{self._carpeta(version)}.{os.getpid()}.tmp"
+        shutil.rmtree(temporal, ignore_errors=True)
+        for categoria in ICON_CATEGORIES:
+            os.makedirs(os.path.join(temporal, categoria), exist_ok=True)
+        tareas = [(categoria, clave, url, f"{categoria}/{_slug(clave)}.png")
+                  for categoria, urls in iconos.items() for clave, url in urls.items()]
+        with ThreadPoolExecutor(max_workers=ICON_MIRROR_WORKERS) as executor:
+            resultados = list(executor.map(lambda t: _descargar(t[2], os.path.join(temporal, t[3])), tareas))
+        ficheros = {categoria: {} for categoria in ICON_CATEGORIES}
+        for (categoria, clave, _, fichero), ok in zip(tareas, resultados):
+            if ok:
+                ficheros[categoria][clave] = fichero
+        fallidos = resultados.count(False)
+        if fallidos > len(tareas) // 2:
+            print(f"[sincronizar_iconos] Fallaron {fallidos} de {len(tareas)} descargas. Se reintentará más tarde.")
+            shutil.rmtree(temporal, ignore_errors=True)
+            return False
+
+        manifiesto = {"format_version": ICON_MIRROR_FORMAT_VERSION, "version": version,
+                      "iconos": ficheros, "sprites": {}, "css": None}
+        if Image is not None:
+            reglas = []
+            for categoria in ICON_CATEGORIES:
+                claves = sorted(clave for clave in ficheros[categoria] if clave in en_atlas[categoria])
+                if not claves:
+                    continue
+                colocadas, reglas_categoria = _construir_atlas(temporal, categoria, claves, ficheros[categoria])
+                manifiesto['sprites'][categoria] = colocadas
+                reglas.extend(reglas_categoria)
+            with open(os.path.join(temporal, ICON_CSS), "w", encoding="utf-8") as f:
+                f.write("\n".join(reglas) + "\n")
+            manifiesto['css'] = ICON_CSS
+        with open(os.path.join(temporal, ICON_MANIFEST), "w", encoding="utf-8") as f:
+            json.dump(manifiesto, f, ensure_ascii=False)
+
+        sustituida = f"{self._carpeta(version)}.{os.getpid()}.old"
+        try:
+            if os.path.isdir(self._carpeta(version)): # Copia sin atlas que se rehace
+                os.replace(self._carpeta(version), sustituida)
+            os.replace(temporal, self._carpeta(version))
+        except OSError as e: # Otro proceso la publicó a la vez
+            print(f"[sincronizar_iconos] No se pudo publicar la copia de {version}: {e}")
+            shutil.rmtree(temporal, ignore_errors=True)
+        shutil.rmtree(sustituida, ignore_errors=True)
+        with self._lock:
+            self._manifiestos.pop(version, None)
+        self._borrar_antiguas()
+        print(f"[sincronizar_iconos] Copiados {len(tareas) - fallidos} iconos de {version}"
+              f"{' con atlas' if manifiesto['css'] else ''}.")
+        return True
+
+    def _borrar_antiguas(self):
+        try:
+            carpetas = [os.path.join(self.directorio, nombre) for nombre in os.listdir(self.directorio)]
+        except OSError:
+            return
+        versiones = sorted((c for c in carpetas if os.path.isfile(os.path.join(c, ICON_MANIFEST))),
+                           key=os.path.getmtime, reverse=True)
+        for carpeta in versiones[ICON_MIRROR_KEEP_VERSIONS:]:
+            print(f"[sincronizar_iconos] Borrando la copia antigua {os.path.basename(carpeta)}.")
+            shutil.rmtree(carpeta, ignore_errors=True)
+
@@ -0,0 +1,184 @@
+# services/image_variants.py
+
+"""
+Variantes redimensionadas de las imágenes del repositorio (banners, perfiles, logos de elo).
+
+Las plantillas enlazan cada imagen con un `srcset` de anchos fijos y el navegador
+elige el más pequeño que le sirve para el tamaño en pantalla. Cada variante se
+genera la primera vez que se pide y se guarda en disco, con nombre derivado de la
+huella de contenido del original: tras un despliegue con la imagen cambiada se
+genera de nuevo y las variantes antiguas se borran.
+
+El formato se negocia con la cabecera Accept (AVIF, WebP o el formato original),
+así una misma URL sirve al navegador que la pida y se puede cambiar por JavaScript
+igual que una imagen normal. Requiere Pillow (requirements.txt; AVIF desde la 11.2):
+sin él no se ofrece `srcset` y se sirven los originales.
+"""
+import os
+import hashlib
+import threading
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError: # Dependencia opcional: sin ella se sirven las imágenes originales
+    Image = None
+
+from services.warm_cache import WARM_CACHE_DIR, escribir_atomico
+
+IMAGE_VARIANTS_DIR = os.environ.get("IMAGE_VARIANTS_DIR", os.path.join(WARM_CACHE_DIR, "image_variants"))
+IMAGE_WIDTHS = (64, 128, 240, 320, 480, 768, 1080, 1440, 1920)
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp')
+IMAGE_QUALITY = {'avif': 55, 'webp': 80, 'jpeg': 82}
+IMAGE_MIMETYPES = {'avif': 'image/avif', 'webp': 'image/webp', 'jpeg': 'image/jpeg', 'png': 'image/png'}
+
+_DIMENSIONES = {} # ruta absoluta -> (mtime, tamaño, (ancho, alto))
+_DIMENSIONES_LOCK = threading.Lock()
+_GENERANDO = {} # fichero de variante -> lock, para no generar dos veces la misma a la vez
+_GENERANDO_LOCK = threading.Lock()
+
+
+def _formatos_modernos():
+    """Formatos modernos que la instalación de Pillow sabe codificar, por orden de preferencia."""
+    if Image is None:
+        return ()
+    formatos = []
+    for formato in ('avif', 'webp'):
+        try:
+            if features.check(formato):
+                formatos.append(formato)
+        except ValueError: # Versiones de Pillow que no conocen el formato
+            pass
+    return tuple(formatos)
+
+
+FORMATOS_MODERNOS = _formatos_modernos()
+
+
+def es_imagen(ruta):
+    return (ruta or '').lower().endswith(IMAGE_EXTENSIONS)
+
+
+def dimensiones(ruta_abs):
+    """(ancho, alto) de la imagen original, leyendo solo la cabecera; None si no se puede leer."""
+    if Image is None:
+        return None
+    try:
+        estado = os.stat(ruta_abs)
+    except OSError:
+        return None
+    with _DIMENSIONES_LOCK:
+        cached = _DIMENSIONES.get(ruta_abs)
+    if cached and cached[0] == estado.st_mtime and cached[1] == estado.st_size:
+        return cached[2]
+    try:
+        with Image.open(ruta_abs) as img:
+            tamano = img.size
+    except (OSError, ValueError) as e:
+        print(f"[dimensiones] No se pudo leer la imagen {ruta_abs}: {e}")
+        tamano = None
+    with _DIMENSIONES_LOCK:
+        _DIMENSIONES[ruta_abs] = (estado.st_mtime, estado.st_size, tamano)
+    return tamano
+
+
+def anchos_variantes(ruta_abs):
+    """
+    Anchos que se ofrecen en el `srcset` de una imagen: los de IMAGE_WIDTHS menores que el
+    original más el ancho original (nunca se amplía). Vacío si no hay Pillow o no se puede leer.
+    """
+    tamano = dimensiones(ruta_abs)
+    if not tamano:
+        return []
+    original = tamano[0]
+    return [ancho for ancho in IMAGE_WIDTHS if ancho < original] + [original]
+
+
+def elegir_formato(accept, ruta_abs):
+    """Formato de la variante según la cabecera Accept: 'avif', 'webp' o el del original ('png'/'jpeg')."""
+    accept = (accept or '').lower()
+    for formato in FORMATOS_MODERNOS:
+        if IMAGE_MIMETYPES[formato] in accept:
+            return formato
+    return 'png' if ruta_abs.lower().endswith('.png') else 'jpeg'
+
+
+def _lock_variante(fichero):
+    with _GENERANDO_LOCK:
+        return _GENERANDO.setdefault(fichero, threading.Lock())
+
+
+def obtener_variante(ruta, ruta_abs, huella, ancho, formato, directorio=IMAGE_VARIANTS_DIR):
+    """
+    Ruta en disco de la variante de `ruta` con `ancho` píxeles y `formato`, generándola si no existe.
+
+    Args:
+        ruta (str): Ruta relativa del original (identifica la imagen entre despliegues).
+        ruta_abs (str): Ruta absoluta del original.
+        huella (str): Huella de contenido actual del original.
+        ancho (int): Ancho pedido; debe ser uno de `anchos_variantes(ruta_abs)`.
+        formato (str): 'avif', 'webp', 'png' o 'jpeg'.
+
+    Returns:
+        str | None: Ruta del fichero, o None si no se pudo generar.
+    """
+    if Image is None:
+        return None
+    prefijo = hashlib.sha1(ruta.encode('utf-8')).hexdigest()[:12]
+    fichero = os.path.join(directorio, f"{prefijo}-{huella}-{ancho}.{formato}")
+    if os.path.isfile(fichero):
+        return fichero
+
+    with _lock_variante(fichero):
+        if os.path.isfile(fichero): # Otro hilo la generó mientras se esperaba
+            return fichero
+        try:
+            os.makedirs(directorio, exist_ok=True)
+            _generar(ruta_abs, fichero, ancho, formato)
+        except (OSError, ValueError) as e:
+            print(f"[obtener_variante] Error generando la variante {ancho}px {formato} de '{ruta}': {e}")
+            return None
+        finally:
+            with _GENERANDO_LOCK:
+                _GENERANDO.pop(fichero, None)
+        _borrar_obsoletas(directorio, prefijo, huella)
+    print(f"[obtener_variante] Generada la variante {ancho}px {formato} de '{ruta}' ({os.path.getsize(fichero)} bytes).")
+    return fichero
+
+
+def _generar(ruta_abs, fichero, ancho, formato):
+    with Image.open(ruta_abs) as original:
+        img = ImageOps.exif_transpose(original)
+        if img.mode not in ('RGB', 'RGBA'):
+            transparente = img.mode in ('LA', 'PA') or 'transparency' in img.info
+            img = img.convert('RGBA' if transparente else 'RGB')
+        if formato == 'jpeg' and img.mode == 'RGBA':
+            img = img.convert('RGB')
+        if img.width > ancho:
+            img = img.resize((ancho, max(1, round(img.height * ancho / img.width))), Image.LANCZOS)
+
+        opciones = {}
+        if formato in IMAGE_QUALITY:
+            opciones['quality'] = IMAGE_QUALITY[formato]
+        if formato == 'webp':
+            opciones['method'] = 6
+        elif formato == 'png':
+            opciones['optimize'] = True
+        elif formato == 'jpeg':
+            opciones.update(optimize=True, progressive=True)
+
+        escribir_atomico(fichero, lambda f: img.save(f, format=formato.upper(), **opciones), "wb")
+
+
+def _borrar_obsoletas(directorio, prefijo, huella):
+    """Borra las variantes de versiones anteriores de la misma imagen."""
+    vigente = f"{prefijo}-{huella}-"
+    try:
+        nombres = os.listdir(directorio)
+    except OSError:
+        return
+    for nombre in nombres:
+        if nombre.startswith(prefijo + "-") and not nombre.startswith(vigente) and not nombre.endswith(".tmp"):
+            try:
+                os.remove(os.path.join(directorio, nombre))
+            except OSError:
+                pass
@@ -0,0 +1,174 @@
+# services/leaderboard_events.py
+
+"""
+Difusión en directo (Server-Sent Events) de los cambios de la clasificación.
+
+Cada vez que se publica una instantánea nueva se calcula una sola vez la diferencia
+con la anterior (cambios de puesto, entrada y salida de partida, cambios de LP y de
+victorias/derrotas), se serializa una sola vez como mensaje SSE y se entrega tal cual
+a todos los clientes conectados: N clientes cuestan un único diff.
+
+Los mensajes llevan como id la versión de la instantánea. Se conservan los últimos
+para que un cliente que se reconecta (EventSource envía Last-Event-ID) reciba lo que
+se perdió; si su versión es anterior a todo el historial se le pide que recargue la página.
+"""
+import os
+import json
+import threading
+from collections import defaultdict, deque
+
+LEADERBOARD_EVENTS_BACKLOG = 20 # Deltas que se conservan para las reconexiones
+SSE_MAX_CLIENTS = int(os.environ.get("SSE_MAX_CLIENTS", 16)) # Por proceso: cada cliente ocupa un hilo
+SSE_HEARTBEAT = 25 # Segundos entre comentarios de mantenimiento (los proxies cortan conexiones inactivas)
+SSE_MAX_CONNECTION = 600 # Duración máxima de una conexión; el navegador se reconecta solo
+SSE_RETRY_MS = 5000
+# Campos que se envían juntos cuando cambia cualquiera de ellos (el cliente rehace la celda entera)
+GRUPOS_DELTA = (
+    ('tier', 'rank', 'league_points', 'valor_clasificacion'),
+    ('wins', 'losses'),
+    ('en_partida', 'nombre_campeon'),
+)
+
+
+def _clave(fila):
+    return (fila.get('puuid'), fila.get('queue_type'))
+
+
+def _puestos(filas):
+    """Puesto de cada fila dentro de su cola, ordenando por valor de clasificación."""
+    por_cola = defaultdict(list)
+    for fila in filas:
+        por_cola[fila.get('queue_type')].append(fila)
+    puestos = {}
+    for filas_cola in por_cola.values():
+        ordenadas = sorted(filas_cola, key=lambda f: f.get('valor_clasificacion') or 0, reverse=True)
+        for puesto, fila in enumerate(ordenadas, 1):
+            puestos[_clave(fila)] = puesto
+    return puestos
+
+
+def diferencias(anteriores, nuevas):
+    """
+    Cambios por fila entre dos listas de filas de la clasificación.
+
+    Returns:
+        tuple: (deltas, estructura). Cada delta lleva 'puuid', 'queue_type', los grupos de
+               campos que cambiaron, 'puesto' [antes, ahora] si cambió el puesto, 'lp_delta'
+               si cambió el valor de clasificación y 'evento' ('inicio_partida'/'fin_partida').
+               `estructura` es True si entraron o salieron filas (el cliente debe recargar).
+    """
+    antes = {_clave(f): f for f in anteriores}
+    ahora = {_clave(f): f for f in nuevas}
+    puestos_antes, puestos_ahora = _puestos(anteriores), _puestos(nuevas)
+    deltas = []
+    for clave, fila in ahora.items():
+        previa = antes.get(clave)
+        if previa is None:
+            continue
+        delta = {}
+        for grupo in GRUPOS_DELTA:
+            if any(fila.get(campo) != previa.get(campo) for campo in grupo):
+                delta.update((campo, fila.get(campo)) for campo in grupo)
+        if puestos_antes[clave] != puestos_ahora[clave]:
+            delta['puesto'] = [puestos_antes[clave], puestos_ahora[clave]]
+        if not delta:
+            continue
+        if 'valor_clasificacion' in delta:
+            delta['lp_delta'] = (fila.get('valor_clasificacion') or 0) - (previa.get('valor_clasificacion') or 0)
+        if bool(fila.get('en_partida')) != bool(previa.get('en_partida')):
+            delta['evento'] = 'inicio_partida' if fila.get('en_partida') else 'fin_partida'
+        delta.update(puuid=clave[0], queue_type=clave[1])
+        deltas.append(delta)
+    return deltas, set(antes) != set(ahora)
+
+
+def _mensaje(evento, version, datos):
+    return f"id: {version}\nevent: {evento}\ndata: {json.dumps(datos, ensure_ascii=False, separators=(',', ':'))}\n\n"
+
+
+class DifusorClasificacion:
+    """
+    Reparte los deltas de la clasificación a los clientes SSE de este proceso.
+
+    Args:
+        max_clientes (int): Conexiones simultáneas admitidas (el resto sigue recargando la página).
+        backlog (int): Deltas que se conservan para reenviar en las reconexiones.
+    """
+
+    def __init__(self, max_clientes=SSE_MAX_CLIENTS, backlog=LEADERBOARD_EVENTS_BACKLOG):
+        self.max_clientes = max_clientes
+        self.version = None # Última versión publicada en este proceso
+        self._mensajes = deque(maxlen=backlog) # (versión anterior, versión, mensaje SSE)
+        self._clientes = 0
+        self._cond = threading.Condition()
+
+    def publicar(self, anterior, nuevo, extra=None):
+        """
+        Registra una instantánea publicada y, si sigue a la anterior, difunde su delta.
+        La primera instantánea (arranque) o una versión que no avanza solo fijan la versión base.
+
+        Args:
+            anterior (LeaderboardSnapshot): Instantánea sustituida.
+            nuevo (LeaderboardSnapshot): Instantánea recién publicada.
+            extra (dict): Datos comunes que se añaden al mensaje (p. ej. la hora de actualización).
+        """
+        mensaje = None
+        if anterior.version and nuevo.version > anterior.version:
+            deltas, estructura = diferencias(anterior.rows, nuevo.rows)
+            datos = dict(extra or {}, version=nuevo.version, filas=deltas, estructura=estructura)
+            mensaje = _mensaje('delta', nuevo.version, datos)
+        with self._cond:
+            if mensaje is not None:
+                self._mensajes.append((anterior.version, nuevo.version, mensaje))
+            self.version = nuevo.version
+            self._cond.notify_all()
+        if mensaje is not None:
+            print(f"[DifusorClasificacion] Delta v{anterior.version}->v{nuevo.version}: {len(datos['filas'])} filas "
+                  f"para {self._clientes} clientes.")
+
+    def _pendientes(self, desde):
+        """
+        Mensajes que le faltan a un cliente en la versión `desde` (con el lock tomado).
+        Un cliente por delante de este proceso (página servida por otro worker que ya recargó la
+        instantánea del líder) espera a que este se ponga al día. Como los deltas llevan los valores
+        completos de los campos, basta con reenviar los que terminan después de `desde`.
+        """
+        if self.version is None or desde >= self.version:
+            return []
+        if self._mensajes and self._mensajes[0][0] <= desde:
+            return [mensaje for _, version, mensaje in self._mensajes if version > desde]
+        # La versión del cliente es anterior a todo el historial conservado: que recargue
+        return [_mensaje('recargar', self.version, {'version': self.version})]
+
+    def esperar(self, desde, timeout):
+        """
+        Espera hasta `timeout` segundos a que haya mensajes nuevos para un cliente en la versión `desde`.
+
+        Returns:
+            tuple: (mensajes, versión en la que queda el cliente).
+        """
+        with self._cond:
+            if desde is None:
+                desde = self.version
+            mensajes = self._pendientes(desde)
+            if not mensajes:
+                self._cond.wait(timeout)
+                mensajes = self._pendientes(desde)
+            return mensajes, (self.version if mensajes else desde)
+
+    def conectar(self):
+        """Reserva un hueco para un cliente; False si ya está lleno."""
+        with self._cond:
+            if self._clientes >= self.max_clientes:
+                return False
+            self._clientes += 1
+            return True
+
+    def desconectar(self):
+        with self._cond:
+            self._clientes -= 1
+
+    def estadisticas(self):
+        with self._cond:
+            return {'clientes': self._clientes, 'max_clientes': self.max_clientes,
+                    'version': self.version, 'mensajes': len(self._mensajes)}
@@ -0,0 +1,65 @@
+# services/leaderboard_snapshot.py
+
+"""
+Instantáneas inmutables y versionadas de la clasificación principal.
+
+Cada ciclo de actualización publica una instantánea nueva que sustituye a la
+anterior con una única asignación de referencia. Los manejadores la leen sin
+bloqueos: las filas están congeladas, así que nadie puede dejarlas a medias.
+"""
+from types import MappingProxyType
+
+
+def congelar(valor):
+    """Convierte recursivamente dicts en MappingProxyType y listas en tuplas."""
+    if isinstance(valor, dict):
+        return MappingProxyType({k: congelar(v) for k, v in valor.items()})
+    if isinstance(valor, (list, tuple)):
+        return tuple(congelar(v) for v in valor)
+    return valor
+
+
+def descongelar(valor):
+    """Devuelve una copia mutable (dicts y listas) de un valor congelado, p. ej. para jsonify."""
+    if isinstance(valor, (dict, MappingProxyType)):
+        return {k: descongelar(v) for k, v in valor.items()}
+    if isinstance(valor, (list, tuple)):
+        return [descongelar(v) for v in valor]
+    return valor
+
+
+class LeaderboardSnapshot:
+    """
+    Instantánea de solo lectura de la clasificación.
+
+    Attributes:
+        version (int): Número de versión monótono creciente.
+        timestamp (float): Momento de generación (segundos UTC, time.time()).
+        rows (tuple): Filas de jugador congeladas (MappingProxyType).
+    """
+    __slots__ = ('version', 'timestamp', 'rows')
+
+    def __init__(self, version, timestamp, rows):
+        object.__setattr__(self, 'version', version)
+        object.__setattr__(self, 'timestamp', timestamp)
+        object.__setattr__(self, 'rows', rows)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("LeaderboardSnapshot es inmutable")
+
+    @classmethod
+    def crear(cls, version, timestamp, filas):
+        """Construye una instantánea congelando una copia de las filas recibidas."""
+        return cls(version, timestamp, tuple(congelar(f) for f in filas))
+
+    @property
+    def etag(self):
+        """ETag fuerte derivado de la versión de la instantánea."""
+        return f'"lb-{self.version}"'
+
+    def filas_por_puuid(self, puuid):
+        """Devuelve las filas (una por cola) de un PUUID."""
+        return [f for f in self.rows if f.get('puuid') == puuid]
+
+
+SNAPSHOT_VACIO = LeaderboardSnapshot(0, 0, ())
@@ -0,0 +1,177 @@
+# services/lp_store.py
+
+"""
+Almacén comprimido por tramos (run-length) de los snapshots de LP.
+
+En vez de guardar un snapshot por ciclo de actualización, cada cola de cada jugador
+se guarda como una lista de tramos ordenados en los que el ELO no cambia:
+
+    {"elo": 1863, "league_points_raw": 63, "first_seen": <ms>, "last_seen": <ms>}
+
+Un tramo equivale a dos snapshots (primera y última observación), así que el motor
+de atribución de LP sigue funcionando sobre la lista expandida, que es mucho más
+corta que la original. El lector acepta también el formato antiguo (lista de
+snapshots con 'timestamp') y mezclas de ambos.
+
+Las escrituras no reescriben el fichero completo: cada escritor acumula los tramos
+nuevos en un segmento por día (LP_SEGMENTS_DIR) y un compactador los fusiona después
+en lp_history.json, en un único commit.
+"""
+from datetime import datetime, timezone
+
+COLAS_LP = ("RANKED_SOLO_5x5", "RANKED_FLEX_SR")
+LP_SEGMENTS_DIR = "lp_history_segments"
+
+
+def _mismo_valor(tramo, snapshot):
+    return (tramo["elo"] == snapshot.get("elo")
+            and tramo.get("league_points_raw") == snapshot.get("league_points_raw"))
+
+
+def _nuevo_tramo(snapshot):
+    return {
+        "elo": snapshot.get("elo"),
+        "league_points_raw": snapshot.get("league_points_raw"),
+        "first_seen": snapshot["timestamp"],
+        "last_seen": snapshot["timestamp"]
+    }
+
+
+def expandir_tramos(tramos):
+    """Convierte tramos en snapshots {timestamp, elo, league_points_raw} ordenados (1 o 2 por tramo)."""
+    snapshots = []
+    for tramo in tramos:
+        for ts in (tramo["first_seen"], tramo["last_seen"]):
+            if snapshots and snapshots[-1]["timestamp"] == ts:
+                continue
+            snapshots.append({"timestamp": ts, "elo": tramo["elo"], "league_points_raw": tramo.get("league_points_raw")})
+    return snapshots
+
+
+def comprimir_snapshots(entradas):
+    """
+    Construye la lista de tramos a partir de snapshots y/o tramos (en cualquier orden).
+
+    Returns:
+        list: Tramos ordenados por first_seen, sin dos tramos consecutivos con el mismo valor.
+    """
+    puntos = []
+    for entrada in entradas:
+        if "first_seen" in entrada:
+            puntos.extend(expandir_tramos([entrada]))
+        elif "timestamp" in entrada:
+            puntos.append(entrada)
+    puntos.sort(key=lambda s: s["timestamp"])
+
+    tramos = []
+    for snapshot in puntos:
+        if tramos and _mismo_valor(tramos[-1], snapshot):
+            tramos[-1]["last_seen"] = snapshot["timestamp"]
+        else:
+            tramos.append(_nuevo_tramo(snapshot))
+    return tramos
+
+
+def anadir_snapshot(tramos, snapshot):
+    """
+    Añade una observación a una lista de tramos (in situ). Si el valor no ha cambiado
+    solo se alarga el último tramo, así que el tamaño crece con los cambios de ELO,
+    no con el número de ciclos.
+    """
+    if tramos and snapshot["timestamp"] < tramos[-1]["last_seen"]:
+        # Observación fuera de orden (raro): se recomprime todo
+        tramos[:] = comprimir_snapshots(tramos + [snapshot])
+    elif tramos and _mismo_valor(tramos[-1], snapshot):
+        tramos[-1]["last_seen"] = snapshot["timestamp"]
+    else:
+        tramos.append(_nuevo_tramo(snapshot))
+    return tramos
+
+
+def fusionar_tramos(tramos, nuevos_tramos):
+    """Incorpora a `tramos` (in situ) otra lista de tramos, p. ej. el búfer en memoria."""
+    for tramo in nuevos_tramos:
+        for snapshot in expandir_tramos([tramo]):
+            anadir_snapshot(tramos, snapshot)
+    return tramos
+
+
+def _biseccion(tramos, timestamp, campo, derecha=False):
+    """
+    Como bisect.bisect_left/right sobre el `campo` de cada tramo, sin copiar la lista
+    (el argumento key= de bisect solo existe desde Python 3.10).
+    """
+    lo, hi = 0, len(tramos)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if tramos[mid][campo] < timestamp or (derecha and tramos[mid][campo] == timestamp):
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+def snapshot_antes(tramos, timestamp):
+    """
+    Último snapshot (según expandir_tramos) con timestamp estrictamente anterior, o None.
+    Búsqueda binaria directa sobre los tramos (O(log n), sin copiar la lista).
+    """
+    idx = _biseccion(tramos, timestamp, "first_seen") - 1
+    if idx < 0:
+        return None
+    tramo = tramos[idx]
+    ts = tramo["last_seen"] if tramo["last_seen"] < timestamp else tramo["first_seen"]
+    return {"timestamp": ts, "elo": tramo["elo"], "league_points_raw": tramo.get("league_points_raw")}
+
+
+def snapshot_despues(tramos, timestamp):
+    """Primer snapshot (según expandir_tramos) con timestamp estrictamente posterior, o None."""
+    idx = _biseccion(tramos, timestamp, "last_seen", derecha=True)
+    if idx >= len(tramos):
+        return None
+    tramo = tramos[idx]
+    ts = tramo["first_seen"] if tramo["first_seen"] > timestamp else tramo["last_seen"]
+    return {"timestamp": ts, "elo": tramo["elo"], "league_points_raw": tramo.get("league_points_raw")}
+
+
+def normalizar_historial(lp_history):
+    """
+    Convierte un lp_history.json (formato antiguo, por tramos o mixto) al formato por tramos:
+    {puuid: {cola: [tramos]}}.
+    """
+    normalizado = {}
+    for puuid, colas in (lp_history or {}).items():
+        if not isinstance(colas, dict):
+            continue
+        normalizado[puuid] = {cola: comprimir_snapshots(colas.get(cola) or []) for cola in COLAS_LP}
+        for cola, entradas in colas.items():
+            if cola not in normalizado[puuid] and isinstance(entradas, list):
+                normalizado[puuid][cola] = comprimir_snapshots(entradas)
+    return normalizado
+
+
+def fusionar_historiales(destino, origen):
+    """Incorpora (in situ) un historial por tramos en otro, p. ej. un segmento sobre la base."""
+    for puuid, colas in origen.items():
+        colas_destino = destino.setdefault(puuid, {})
+        for cola, tramos in colas.items():
+            fusionar_tramos(colas_destino.setdefault(cola, []), tramos)
+    return destino
+
+
+def nombre_segmento(timestamp_ms, sufijo=""):
+    """
+    Nombre del segmento del registro de LP de un escritor (`sufijo`) para el día (UTC) de
+    `timestamp_ms`. Hay un fichero por día y escritor, no uno por guardado; el prefijo de
+    fecha hace que el orden alfabético coincida con el cronológico.
+    """
+    fecha = datetime.fromtimestamp(timestamp_ms / 1000, tz=timezone.utc).strftime("%Y%m%d")
+    return f"{fecha}{'-' + sufijo if sufijo else ''}.json"
+
+
+def expandir_historial(lp_history_tramos):
+    """Vista {puuid: {cola: [snapshots]}} de un historial por tramos, para el cálculo de LP."""
+    return {
+        puuid: {cola: expandir_tramos(tramos) for cola, tramos in colas.items()}
+        for puuid, colas in lp_history_tramos.items()
+    }
@@ -10,6 +10,9 @@ import base64
 import requests
 from datetime import datetime, timezone
 
+from services.lp_store import (anadir_snapshot, nombre_segmento, fusionar_historiales, normalizar_historial,
+                               LP_SEGMENTS_DIR)
+
 # --- CONFIGURACIÓN ---
 LP_HISTORY_FILE_PATH = "lp_history.json"
 ACCOUNTS_FILE_PATH = "cuentas.txt"
@@ -17,6 +20,7 @@ PUUIDS_FILE_PATH = "puuids.json"
 REPO_OWNER = "Sepevalle"
 REPO_NAME = "SoloQ-Cerditos"
 GITHUB_API_BASE_URL = f"https://api.github.com/repos/{REPO_OWNER}/{REPO_NAME}/contents/"
+LP_TRACKER_SAVE_INTERVAL = 3600 # Los snapshots se acumulan en memoria y se suben una vez por hora
 
 # --- FUNCIONES DE UTILIDAD DE GITHUB ---
 
@@ -165,6 +169,9 @@ def elo_tracker_worker(riot_api_key, github_token):
     Worker que se ejecuta periódicamente para tomar 'snapshots' del ELO de los jugadores.
     """
     print("[LP_TRACKER] Iniciando el worker de seguimiento de ELO...")
+    # Tramos pendientes de subir: se acumulan entre ciclos (un commit por hora, no por ciclo)
+    lp_history = {}
+    ultimo_guardado = time.time()
     while True:
         try:
             print(f"[{datetime.now()}] [LP_TRACKER] Iniciando snapshot de ELO...")
@@ -178,8 +185,8 @@ def elo_tracker_worker(riot_api_key, github_token):
                 time.sleep(600)
                 continue
 
-            # 2. Leer historial de LP existente
-            lp_history, lp_history_sha = _read_json_from_github(LP_HISTORY_FILE_PATH, github_token)
+            # 2. Los snapshots nuevos se añaden a lp_history (el compactador de la app
+            #    los fusiona después en lp_history.json)
 
             # 3. Iterar sobre los jugadores y actualizar su historial de LP
             for riot_id, player_name in cuentas:
@@ -208,16 +215,22 @@ def elo_tracker_worker(riot_api_key, github_token):
                             entry.get('leaguePoints', 0)
                         )
                         
-                        # Añadir el nuevo snapshot
-                        lp_history[puuid][queue_type].append({
+                        # Añadir el nuevo snapshot (solo crea un tramo nuevo si el ELO cambia)
+                        anadir_snapshot(lp_history[puuid][queue_type], {
                             "timestamp": timestamp,
                             "elo": valor,
                             "league_points_raw": entry.get('leaguePoints', 0)
                         })
                         print(f"[LP_TRACKER] Snapshot añadido para {riot_id} en {queue_type}: {valor} ELO")
 
-            # 4. Guardar el historial actualizado en GitHub
-            _write_to_github(LP_HISTORY_FILE_PATH, lp_history, lp_history_sha, github_token)
+            # 4. Cada hora, añadir lo acumulado al segmento del día (sin leer ni reescribir el historial completo)
+            if lp_history and time.time() - ultimo_guardado >= LP_TRACKER_SAVE_INTERVAL:
+                ruta_segmento = f"{LP_SEGMENTS_DIR}/{nombre_segmento(int(time.time() * 1000), 'tracker')}"
+                del_dia, sha = _read_json_from_github(ruta_segmento, github_token)
+                del_dia = fusionar_historiales(normalizar_historial(del_dia), lp_history)
+                if _write_to_github(ruta_segmento, del_dia, sha, github_token):
+                    lp_history = {}
+                    ultimo_guardado = time.time()
 
             print(f"[{datetime.now()}] [LP_TRACKER] Snapshot de ELO completado. Próxima ejecución en 5 minutos.")
             
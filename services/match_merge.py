@@ -0,0 +1,96 @@
+# services/match_merge.py
+
+"""
+Fusión k-way (montículo) de los historiales de varios jugadores con paginación por cursor.
+
+Cada historial ya viene ordenado de más reciente a más antigua, así que no hace
+falta concatenar y ordenar la temporada entera: heapq.merge va sacando la partida
+más reciente de entre las cabezas de cada historial. Una página cuesta
+O(log n) por jugador para situar el cursor más O(tamaño_página · log jugadores).
+
+El orden total es (game_end_timestamp, match_id, puuid) descendente: una misma
+partida aparece una vez por cada jugador del grupo que la jugó.
+"""
+import heapq
+from itertools import islice
+
+CURSOR_SEPARADOR = ':'
+
+
+def clave_partida(partida):
+    """Clave de orden (y de cursor) de una partida."""
+    return (partida.get('game_end_timestamp', 0), partida.get('match_id') or '', partida.get('puuid') or '')
+
+
+def codificar_cursor(partida):
+    """Cursor opaco que apunta justo después de `partida`."""
+    ts, match_id, puuid = clave_partida(partida)
+    return f"{ts}{CURSOR_SEPARADOR}{match_id}{CURSOR_SEPARADOR}{puuid}"
+
+
+def decodificar_cursor(cursor):
+    """
+    Devuelve la clave (timestamp, match_id, puuid) de un cursor o None si no hay cursor.
+
+    Raises:
+        ValueError: Si el cursor está mal formado.
+    """
+    if not cursor:
+        return None
+    ts, match_id, puuid = (cursor.split(CURSOR_SEPARADOR, 2) + ['', ''])[:3]
+    return (int(ts), match_id, puuid)
+
+
+def _primer_indice_no_posterior(partidas, ts):
+    """Búsqueda binaria: primer índice con game_end_timestamp <= ts (lista descendente)."""
+    lo, hi = 0, len(partidas)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if partidas[mid].get('game_end_timestamp', 0) > ts:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+def _recorrer(partidas, cursor, desde_ms):
+    """Itera un historial desde el cursor (excluido) hasta el inicio de temporada."""
+    inicio = _primer_indice_no_posterior(partidas, cursor[0]) if cursor else 0
+    vistas = set()
+    for partida in islice(partidas, inicio, None):
+        clave = clave_partida(partida)
+        if clave[0] < desde_ms:
+            break
+        if cursor and clave >= cursor:
+            continue # Mismo timestamp que el cursor pero ya servida
+        if clave in vistas:
+            continue # Duplicado dentro del mismo historial
+        vistas.add(clave)
+        yield partida
+
+
+def fusionar(historiales, cursor=None, desde_ms=0):
+    """Iterador perezoso de todas las partidas de los historiales, de más reciente a más antigua."""
+    clave_cursor = decodificar_cursor(cursor)
+    fuentes = [_recorrer(partidas, clave_cursor, desde_ms) for partidas in historiales if partidas]
+    return heapq.merge(*fuentes, key=clave_partida, reverse=True)
+
+
+def pagina_fusionada(historiales, limite, cursor=None, desde_ms=0):
+    """
+    Devuelve las `limite` partidas más recientes anteriores al cursor de entre todos los historiales.
+
+    Args:
+        historiales (list): Listas de partidas, cada una de más reciente a más antigua.
+        limite (int): Tamaño de página.
+        cursor (str): Cursor devuelto por la página anterior (None = primera página).
+        desde_ms (int): Las partidas anteriores a este timestamp no se incluyen.
+
+    Returns:
+        tuple: (partidas, siguiente_cursor) — siguiente_cursor es None en la última página.
+    """
+    fusion = fusionar(historiales, cursor, desde_ms)
+    # Se pide una partida de más para saber si existe una página siguiente
+    pagina = list(islice(fusion, limite + 1))
+    siguiente = codificar_cursor(pagina[limite - 1]) if len(pagina) > limite else None
+    return pagina[:limite], siguiente
@@ -0,0 +1,152 @@
+# services/records.py
+
+"""
+Motor declarativo de récords (globales y personales).
+
+Cada récord se describe una sola vez en RECORD_SPECS: la métrica que se extrae de la
+partida, si gana el valor mayor o el menor, la regla de desempate y si un 0 debe
+mostrarse como N/A. RecordTracker recorre las partidas una vez y, por cada récord,
+solo guarda (valor, referencia a la partida) de los N mejores; el diccionario que
+se muestra en la web se construye una única vez al final (materializar).
+
+Reglas de comparación (las mismas que aplicaba _update_record):
+- Un récord 'na_si_cero' con valor 0 no cuenta (se queda el registro vacío).
+- A igual valor gana la partida más antigua ('antigua') o la más reciente ('reciente');
+  con el mismo timestamp, la primera que se vio.
+"""
+import heapq
+from collections import namedtuple
+
+RecordSpec = namedtuple('RecordSpec', 'clave metrica mayor_es_mejor desempate na_si_cero')
+
+
+def _campo(nombre):
+    return lambda partida: partida.get(nombre, 0)
+
+
+def _spec(clave, metrica, na_si_cero=False, mayor_es_mejor=True, desempate='antigua'):
+    return RecordSpec(clave, metrica, mayor_es_mejor, desempate, na_si_cero)
+
+
+RECORD_SPECS = (
+    _spec('longest_game', _campo('game_duration')),
+    _spec('most_kills', _campo('kills')),
+    _spec('most_deaths', _campo('deaths')),
+    _spec('most_assists', _campo('assists')),
+    _spec('highest_kda', _campo('kda')),
+    _spec('most_cs', lambda p: p.get('total_minions_killed', 0) + p.get('neutral_minions_killed', 0)),
+    _spec('most_damage_dealt', _campo('total_damage_dealt_to_champions')),
+    _spec('most_gold_earned', _campo('gold_earned')),
+    _spec('most_vision_score', _campo('vision_score')),
+    _spec('largest_killing_spree', _campo('largest_killing_spree'), na_si_cero=True),
+    _spec('largest_multikill', _campo('largestMultiKill'), na_si_cero=True),
+    _spec('most_time_spent_dead', _campo('total_time_spent_dead')),
+    _spec('most_wards_placed', _campo('wards_placed')),
+    _spec('most_wards_killed', _campo('wards_killed')),
+    _spec('most_turret_kills', _campo('turret_kills'), na_si_cero=True),
+    _spec('most_inhibitor_kills', _campo('inhibitor_kills'), na_si_cero=True),
+    _spec('most_baron_kills', _campo('baron_kills'), na_si_cero=True),
+    _spec('most_dragon_kills', _campo('dragon_kills'), na_si_cero=True),
+    _spec('most_damage_taken', _campo('total_damage_taken')),
+    _spec('most_total_heal', _campo('total_heal')),
+    _spec('most_damage_shielded_on_teammates', _campo('total_damage_shielded_on_teammates')),
+    _spec('most_time_ccing_others', _campo('time_ccing_others')),
+    _spec('most_objectives_stolen', _campo('objectives_stolen'), na_si_cero=True),
+    _spec('highest_kill_participation', _campo('kill_participation')),
+    _spec('most_double_kills', _campo('doubleKills'), na_si_cero=True),
+    _spec('most_triple_kills', _campo('tripleKills'), na_si_cero=True),
+    _spec('most_quadra_kills', _campo('quadraKills'), na_si_cero=True),
+    _spec('most_penta_kills', _campo('pentaKills'), na_si_cero=True),
+)
+
+# Las rachas no salen de una partida suelta: se registran con RecordTracker.registrar
+STREAK_RECORD_SPECS = (
+    _spec('longest_win_streak', None),
+    _spec('longest_loss_streak', None),
+)
+
+RECORD_KEYS = tuple(spec.clave for spec in RECORD_SPECS + STREAK_RECORD_SPECS)
+RECORDS_NA_SI_CERO = frozenset(spec.clave for spec in RECORD_SPECS if spec.na_si_cero)
+
+
+class RecordTracker:
+    """
+    Sigue los N mejores (valor, partida) de cada récord en una sola pasada.
+
+    Args:
+        top_n (int): Tamaño del ranking por récord (1 = solo el récord).
+        specs (tuple): Récords que se calculan con `anadir`.
+    """
+
+    def __init__(self, top_n=1, specs=RECORD_SPECS):
+        self.top_n = max(1, int(top_n))
+        self.specs = tuple(specs)
+        self._specs_por_clave = {spec.clave: spec for spec in self.specs + STREAK_RECORD_SPECS}
+        self._mejores = {clave: [] for clave in self._specs_por_clave} # montículo de mínimos de tamaño top_n
+        self._maximo = dict.fromkeys(self._specs_por_clave, 0)        # para marcar récords empatados
+        self._empates = dict.fromkeys(self._specs_por_clave, 0)
+        self._secuencia = 0
+
+    def anadir(self, partida):
+        """Registra una partida en todos los récords de `specs`."""
+        for spec in self.specs:
+            self.registrar(spec.clave, spec.metrica(partida), partida)
+
+    def registrar(self, clave, valor, partida):
+        """Registra un valor concreto de un récord (p. ej. la longitud de una racha y su última partida)."""
+        spec = self._specs_por_clave[clave]
+        if valor is None:
+            valor = 0
+        if valor > self._maximo[clave]:
+            self._maximo[clave] = valor
+            self._empates[clave] = 1
+        elif valor == self._maximo[clave] and valor > 0:
+            self._empates[clave] += 1
+
+        if spec.na_si_cero and valor == 0:
+            return
+        if spec.mayor_es_mejor and valor < 0:
+            return
+        self._secuencia += 1
+        ts = partida.get('game_end_timestamp', 0)
+        orden = (valor if spec.mayor_es_mejor else -valor,
+                 -ts if spec.desempate == 'antigua' else ts,
+                 -self._secuencia)
+        mejores = self._mejores[clave]
+        if len(mejores) < self.top_n:
+            heapq.heappush(mejores, (orden, valor, partida))
+        elif orden > mejores[0][0]:
+            heapq.heapreplace(mejores, (orden, valor, partida))
+
+    def empatado(self, clave):
+        """True si más de una partida comparte el mejor valor (mayor que 0) del récord."""
+        return self._empates[clave] > 1
+
+    def mejores(self, clave):
+        """Lista [(valor, partida)] del récord, de mejor a peor."""
+        return [(valor, partida) for _, valor, partida in sorted(self._mejores[clave], key=lambda e: e[0], reverse=True)]
+
+    def materializar(self, crear_registro, registro_vacio, marcar_empates=False):
+        """
+        Construye el diccionario {clave: registro} con el mejor de cada récord.
+
+        Args:
+            crear_registro (callable): (partida, valor, clave) -> dict del récord.
+            registro_vacio (callable): () -> dict para los récords sin partidas.
+            marcar_empates (bool): Añade 'is_tied_record' a cada registro.
+        """
+        registros = {}
+        for clave in self._specs_por_clave:
+            mejores = self.mejores(clave)
+            registro = crear_registro(mejores[0][1], mejores[0][0], clave) if mejores else registro_vacio()
+            if marcar_empates:
+                registro['is_tied_record'] = self.empatado(clave)
+            registros[clave] = registro
+        return registros
+
+    def tablas(self, crear_registro):
+        """Rankings completos {clave: [registro, ...]} (hasta top_n por récord)."""
+        return {
+            clave: [crear_registro(partida, valor, clave) for valor, partida in self.mejores(clave)]
+            for clave in self._specs_por_clave
+        }
@@ -0,0 +1,244 @@
+# services/render_cache.py
+
+"""
+Caché en disco de páginas renderizadas, limitada por tamaño total y con expulsión LRU.
+
+En lugar de precalcular todas las combinaciones posibles de páginas (que crecen con
+jugadores × colas × campeones aunque la mayoría nunca se visite), una página se
+guarda la primera vez que alguien la pide. Cada entrada lleva la versión de los datos
+con la que se renderizó y un contador de accesos: tras un cambio de datos solo se
+vuelven a renderizar por adelantado las combinaciones más visitadas (calientes).
+Así el disco y la CPU de precálculo escalan con el tráfico, no con las combinaciones.
+Junto a cada página se guarda su variante gzip para servirla sin comprimir al vuelo.
+
+Con varios workers (gunicorn) todos comparten la carpeta: cada proceso lleva el índice en
+memoria, incorpora el de disco cuando cambia y lo reescribe bajo un cerrojo de fichero
+fusionando antes lo que hayan guardado los demás.
+"""
+import os
+import gzip
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError: # Windows: sin flock, se asume un único proceso
+    fcntl = None
+
+from services.warm_cache import WARM_CACHE_DIR, escribir_atomico, escribir_json_atomico
+
+RENDER_CACHE_DIR = os.environ.get("RENDER_CACHE_DIR", os.path.join(WARM_CACHE_DIR, "render_cache"))
+RENDER_CACHE_MAX_BYTES = int(os.environ.get("RENDER_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+RENDER_CACHE_FORMAT_VERSION = 1
+
+
+class CacheRender:
+    """
+    Páginas renderizadas en disco con índice LRU en memoria.
+
+    Args:
+        directorio (str): Carpeta donde se guardan las páginas y el índice.
+        max_bytes (int): Tamaño total máximo de las páginas guardadas.
+    """
+
+    def __init__(self, directorio=RENDER_CACHE_DIR, max_bytes=RENDER_CACHE_MAX_BYTES):
+        self.directorio = directorio
+        self.max_bytes = max_bytes
+        self._ruta_indice = os.path.join(directorio, "_index.json")
+        self._ruta_cerrojo = os.path.join(directorio, "_index.lock")
+        self._lock = threading.Lock()
+        # clave -> {'version', 'fichero', 'bytes', 'hits', 'ultimo_acceso', 'guardado'}; el orden es el de uso (LRU primero)
+        self._entradas = OrderedDict()
+        self._total_bytes = 0
+        self._mtime_indice = None # mtime del índice en disco incorporado por última vez
+        with self._lock:
+            self._sincronizar()
+
+    def _leer_indice(self):
+        """Entradas del índice en disco ({} si no existe o es de otro formato)."""
+        try:
+            with open(self._ruta_indice, "r", encoding="utf-8") as f:
+                indice = json.load(f)
+            if indice.get("format_version") == RENDER_CACHE_FORMAT_VERSION:
+                return indice["entradas"]
+        except (OSError, ValueError, KeyError):
+            pass
+        return {}
+
+    def _sincronizar(self):
+        """
+        Incorpora al índice en memoria el de disco si ha cambiado desde la última vez (lo escribió
+        otro proceso). De cada página prevalece la versión guardada más reciente. Llamar con self._lock.
+        """
+        try:
+            mtime = os.path.getmtime(self._ruta_indice)
+        except OSError:
+            return
+        if mtime == self._mtime_indice:
+            return
+        self._mtime_indice = mtime
+        for clave, externa in self._leer_indice().items():
+            propia = self._entradas.get(clave)
+            if propia is None:
+                self._entradas[clave] = externa
+                continue
+            if externa.get('guardado', 0) > propia.get('guardado', 0):
+                propia.update(version=externa['version'], fichero=externa.get('fichero'),
+                              bytes=externa.get('bytes', 0), guardado=externa['guardado'])
+            propia['hits'] = max(propia['hits'], externa.get('hits', 0))
+            propia['ultimo_acceso'] = max(propia['ultimo_acceso'], externa.get('ultimo_acceso', 0))
+        self._entradas = OrderedDict(sorted(self._entradas.items(), key=lambda item: item[1].get('ultimo_acceso', 0)))
+        self._total_bytes = sum(e['bytes'] for e in self._entradas.values() if e.get('fichero'))
+
+    @contextmanager
+    def _cerrojo_indice(self):
+        """Cerrojo entre procesos para leer, fusionar y reescribir el índice."""
+        if fcntl is None:
+            yield
+            return
+        fd = os.open(self._ruta_cerrojo, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd) # Cerrar el descriptor libera el flock
+
+    def _guardar_indice(self):
+        """
+        Fusiona el índice de disco, expulsa lo que sobre del límite (compartido por todos los
+        procesos) y reescribe el índice, todo bajo el cerrojo de fichero. Llamar con self._lock.
+        """
+        try:
+            os.makedirs(self.directorio, exist_ok=True)
+            with self._cerrojo_indice():
+                self._sincronizar()
+                self._expulsar()
+                escribir_json_atomico(self._ruta_indice, {"format_version": RENDER_CACHE_FORMAT_VERSION,
+                                                          "entradas": self._entradas})
+                self._mtime_indice = os.path.getmtime(self._ruta_indice)
+        except OSError as e:
+            print(f"[render_cache] Error guardando el índice de la caché de páginas: {e}")
+
+    def _ruta(self, fichero):
+        return os.path.join(self.directorio, fichero)
+
+    def _borrar_fichero(self, entrada):
+        if not entrada.get('fichero'):
+            return
+        self._total_bytes -= entrada['bytes']
+        for ruta in (self._ruta(entrada['fichero']), self._ruta(entrada['fichero'] + ".gz")):
+            try:
+                os.remove(ruta)
+            except OSError:
+                pass
+        entrada['fichero'] = None
+        entrada['bytes'] = 0
+        entrada['guardado'] = time.time()
+
+    def obtener(self, clave, version):
+        """
+        Devuelve el HTML guardado para `clave` si se renderizó con `version`, o None.
+        Cuenta el acceso aunque la página no esté o esté desactualizada.
+        """
+        datos = self._leer(clave, version, "")
+        return datos.decode("utf-8") if datos is not None else None
+
+    def obtener_gzip(self, clave, version):
+        """Como `obtener`, pero devuelve los bytes de la variante gzip precomprimida."""
+        return self._leer(clave, version, ".gz")
+
+    def _leer(self, clave, version, sufijo):
+        with self._lock:
+            self._sincronizar()
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                return None
+            entrada['hits'] += 1
+            entrada['ultimo_acceso'] = time.time()
+            self._entradas.move_to_end(clave)
+            if entrada['version'] != version or not entrada.get('fichero'):
+                return None
+            ruta = self._ruta(entrada['fichero'] + sufijo)
+        try:
+            with open(ruta, "rb") as f:
+                return f.read()
+        except OSError:
+            # Otro proceso pudo expulsarla: se trata como fallo de caché
+            with self._lock:
+                self._borrar_fichero(entrada)
+            return None
+
+    def guardar(self, clave, version, html, contar_acceso=True):
+        """
+        Guarda la página renderizada y expulsa las menos usadas recientemente si se supera el tamaño máximo.
+
+        Args:
+            contar_acceso (bool): False para los precálculos, que no son visitas reales.
+        """
+        datos = html.encode("utf-8")
+        if len(datos) > self.max_bytes:
+            return False
+        fichero = hashlib.sha1(clave.encode("utf-8")).hexdigest() + ".html"
+        comprimidos = gzip.compress(datos, compresslevel=9, mtime=0)
+        with self._lock:
+            try:
+                os.makedirs(self.directorio, exist_ok=True)
+                for ruta, contenido in ((self._ruta(fichero), datos), (self._ruta(fichero + ".gz"), comprimidos)):
+                    escribir_atomico(ruta, lambda f: f.write(contenido), "wb")
+            except OSError as e:
+                print(f"[render_cache] Error guardando la página '{clave}': {e}")
+                return False
+
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                entrada = self._entradas[clave] = {'version': version, 'fichero': None, 'bytes': 0, 'hits': 0, 'ultimo_acceso': 0}
+            elif entrada.get('fichero'):
+                self._total_bytes -= entrada['bytes']
+            entrada.update(version=version, fichero=fichero, bytes=len(datos) + len(comprimidos), guardado=time.time())
+            self._total_bytes += entrada['bytes']
+            if contar_acceso and entrada['hits'] == 0:
+                entrada['hits'] = 1 # Primera visita (las siguientes se cuentan en obtener)
+            if contar_acceso:
+                entrada['ultimo_acceso'] = time.time()
+                self._entradas.move_to_end(clave)
+
+            self._guardar_indice() # También expulsa si se supera el tamaño máximo
+        return True
+
+    def _expulsar(self):
+        """Borra las páginas menos usadas recientemente hasta volver al límite. El contador de accesos se conserva."""
+        for clave, entrada in self._entradas.items():
+            if self._total_bytes <= self.max_bytes:
+                break
+            if entrada.get('fichero'):
+                print(f"[render_cache] Expulsando la página '{clave}' ({entrada['bytes']} bytes).")
+                self._borrar_fichero(entrada)
+
+    def calientes(self, limite, min_hits=2):
+        """Claves más visitadas (de más a menos accesos), candidatas a renderizarse por adelantado."""
+        with self._lock:
+            self._sincronizar()
+            candidatas = [(entrada['hits'], clave) for clave, entrada in self._entradas.items() if entrada['hits'] >= min_hits]
+        return [clave for _, clave in sorted(candidatas, reverse=True)[:limite]]
+
+    def version(self, clave):
+        """Versión de datos con la que está renderizada la página guardada (None si no hay)."""
+        with self._lock:
+            self._sincronizar()
+            entrada = self._entradas.get(clave)
+            return entrada['version'] if entrada and entrada.get('fichero') else None
+
+    def estadisticas(self):
+        """Resumen de la caché: entradas, páginas en disco y bytes ocupados."""
+        with self._lock:
+            self._sincronizar()
+            return {
+                'entradas': len(self._entradas),
+                'paginas': sum(1 for e in self._entradas.values() if e.get('fichero')),
+                'bytes': self._total_bytes,
+                'max_bytes': self.max_bytes,
+            }
@@ -0,0 +1,70 @@
+# services/scheduler.py
+
+"""
+Elección de líder entre procesos para los hilos de fondo.
+
+Con gunicorn cada worker importa app.py. Un cerrojo de fichero (flock) garantiza
+que solo uno de ellos, el líder, ejecute los trabajos periódicos contra la API de
+Riot y GitHub. El resto de workers (seguidores) sirven lo que el líder persiste en
+disco y reintentan el cerrojo por si el líder muere: el sistema operativo libera el
+flock automáticamente al terminar el proceso.
+"""
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError: # Windows: sin flock, se asume un único proceso
+    fcntl = None
+
+from services.warm_cache import WARM_CACHE_DIR
+
+SCHEDULER_LOCK_FILE = os.environ.get("SCHEDULER_LOCK_FILE", os.path.join(WARM_CACHE_DIR, "scheduler.lock"))
+
+_ESTADO = {"fd": None}
+_LOCK = threading.Lock()
+
+
+def intentar_liderazgo():
+    """
+    Intenta adquirir el cerrojo de líder sin bloquear.
+
+    Returns:
+        bool: True si este proceso es (o ya era) el líder.
+    """
+    with _LOCK:
+        if _ESTADO["fd"] is not None:
+            return True
+        if fcntl is None:
+            _ESTADO["fd"] = -1
+            return True
+        try:
+            os.makedirs(os.path.dirname(SCHEDULER_LOCK_FILE), exist_ok=True)
+            fd = os.open(SCHEDULER_LOCK_FILE, os.O_RDWR | os.O_CREAT, 0o644)
+        except OSError as e:
+            print(f"[scheduler] No se pudo abrir el cerrojo {SCHEDULER_LOCK_FILE}: {e}")
+            return False
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        # El PID del líder queda en el fichero solo a efectos de diagnóstico.
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode())
+        _ESTADO["fd"] = fd
+        print(f"[scheduler] Proceso {os.getpid()} elegido líder de los trabajos en segundo plano.")
+        return True
+
+
+def es_lider():
+    """Indica si este proceso tiene el cerrojo de líder."""
+    return _ESTADO["fd"] is not None
+
+
+def iniciar_hilo(nombre, objetivo, *args):
+    """Arranca `objetivo(*args)` en un hilo demonio con nombre."""
+    hilo = threading.Thread(target=objetivo, args=args, name=nombre, daemon=True)
+    hilo.start()
+    print(f"[scheduler] Hilo '{nombre}' iniciado.")
+    return hilo
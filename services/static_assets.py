@@ -0,0 +1,64 @@
+# services/static_assets.py
+
+"""
+Recursos estáticos con huella de contenido en la URL (/assets/<huella>/<ruta>).
+
+Como la URL cambia cuando cambia el fichero, se pueden servir con
+'Cache-Control: immutable' y un año de caducidad: el navegador no vuelve a
+pedirlos hasta que se despliega una versión distinta. Solo se sirven las
+carpetas de imágenes/estilos del repositorio y, en la raíz, ficheros con
+extensiones de recurso (nunca código ni datos).
+"""
+import os
+import hashlib
+import threading
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ASSET_DIRS = ('static', 'banners', 'bannerlateral', 'logos_elo', 'img_perfil')
+ASSET_ROOT_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp', '.gif', '.ico', '.css', '.mp3')
+ASSET_FALLBACK_BASE = "https://raw.githubusercontent.com/Sepevalle/SoloQ-Cerditos/main/"
+ASSET_MAX_AGE = 365 * 24 * 3600
+
+_HUELLAS = {} # ruta absoluta -> (mtime, tamaño, huella)
+_HUELLAS_LOCK = threading.Lock()
+
+
+def localizar_recurso(ruta):
+    """
+    Ruta absoluta de un recurso servible o None si no existe o no está permitido.
+
+    Args:
+        ruta (str): Ruta relativa a la raíz del repositorio, p. ej. 'banners/Banner5.png'.
+    """
+    partes = [p for p in (ruta or '').replace('\\', '/').split('/') if p]
+    if not partes or any(p in ('.', '..') for p in partes):
+        return None
+    if len(partes) == 1:
+        if not partes[0].lower().endswith(ASSET_ROOT_EXTENSIONS):
+            return None
+    elif partes[0] not in ASSET_DIRS:
+        return None
+    ruta_abs = os.path.join(REPO_DIR, *partes)
+    return ruta_abs if os.path.isfile(ruta_abs) else None
+
+
+def huella_recurso(ruta_abs):
+    """Huella corta del contenido del fichero (memorizada por mtime y tamaño)."""
+    estado = os.stat(ruta_abs)
+    with _HUELLAS_LOCK:
+        cached = _HUELLAS.get(ruta_abs)
+    if cached and cached[0] == estado.st_mtime and cached[1] == estado.st_size:
+        return cached[2]
+    h = hashlib.sha1()
+    with open(ruta_abs, 'rb') as f:
+        for bloque in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(bloque)
+    huella = h.hexdigest()[:10]
+    with _HUELLAS_LOCK:
+        _HUELLAS[ruta_abs] = (estado.st_mtime, estado.st_size, huella)
+    return huella
+
+
+def url_remota(ruta):
+    """URL del recurso en GitHub, para los que no están en este despliegue (p. ej. imágenes de perfil nuevas)."""
+    return ASSET_FALLBACK_BASE + ruta
@@ -0,0 +1,131 @@
+# services/streaks.py
+
+"""
+Rachas de victorias y derrotas con sus límites (partida de inicio y de fin).
+
+EstadoRachas se alimenta en orden cronológico y cada partida nueva cuesta O(1):
+se alarga o se reinicia la racha actual y, si supera la mejor, se actualiza la
+mejor con su inicio y su fin. Reconstruir desde un historial es una sola pasada y
+no hace falta volver a recorrer las partidas para saber dónde acaba la racha.
+
+En empate se conserva la primera racha que alcanzó la longitud máxima.
+"""
+import threading
+
+
+class EstadoRachas:
+    """Racha actual y mejores rachas de victorias/derrotas de una secuencia de partidas."""
+
+    def __init__(self):
+        self.actual_victoria = None # True/False según el tipo de la racha actual
+        self.actual_longitud = 0
+        self.actual_inicio = None   # Partida con la que empezó la racha actual
+        self.mejor = {True: self._racha_vacia(), False: self._racha_vacia()}
+
+    @staticmethod
+    def _racha_vacia():
+        return {'length': 0, 'start': None, 'end': None}
+
+    def anadir(self, partida):
+        """Incorpora la siguiente partida (en orden cronológico) en O(1)."""
+        victoria = bool(partida.get('win'))
+        if victoria == self.actual_victoria:
+            self.actual_longitud += 1
+        else:
+            self.actual_victoria = victoria
+            self.actual_longitud = 1
+            self.actual_inicio = partida
+        mejor = self.mejor[victoria]
+        if self.actual_longitud > mejor['length']:
+            mejor['length'] = self.actual_longitud
+            mejor['start'] = self.actual_inicio
+            mejor['end'] = partida
+        return self
+
+    def mejor_racha(self, victorias=True):
+        """Devuelve {'length', 'start', 'end'} (partidas) de la mejor racha del tipo pedido."""
+        return self.mejor[bool(victorias)]
+
+    def como_dict(self):
+        """Resumen con las claves de calcular_rachas y los match_id de los límites."""
+        def _id(partida):
+            return partida.get('match_id') if partida else None
+
+        return {
+            'max_win_streak': self.mejor[True]['length'],
+            'max_loss_streak': self.mejor[False]['length'],
+            'current_win_streak': self.actual_longitud if self.actual_victoria is True else 0,
+            'current_loss_streak': self.actual_longitud if self.actual_victoria is False else 0,
+            'max_win_streak_start': _id(self.mejor[True]['start']),
+            'max_win_streak_end': _id(self.mejor[True]['end']),
+            'max_loss_streak_start': _id(self.mejor[False]['start']),
+            'max_loss_streak_end': _id(self.mejor[False]['end']),
+            'current_streak_start': _id(self.actual_inicio)
+        }
+
+
+def reconstruir_rachas(partidas_cronologicas):
+    """Construye el estado de rachas en una sola pasada (partidas de más antigua a más nueva)."""
+    estado = EstadoRachas()
+    for partida in partidas_cronologicas:
+        estado.anadir(partida)
+    return estado
+
+
+_JUGADORES = {} # puuid -> {'inicio_temporada_ms', 'checkpoint', 'colas': {queue_id: EstadoRachas}}
+_LOCK = threading.Lock()
+
+
+def _reconstruir_jugador(partidas, inicio_temporada_ms):
+    colas = {}
+    for partida in reversed(partidas):
+        if partida.get('game_end_timestamp', 0) >= inicio_temporada_ms:
+            colas.setdefault(partida.get('queue_id'), EstadoRachas()).anadir(partida)
+    return colas
+
+
+def rachas_jugador(puuid, partidas, queue_id, inicio_temporada_ms):
+    """
+    Mantiene de forma incremental las rachas de temporada de un jugador y devuelve las de una cola.
+
+    Args:
+        puuid (str): PUUID del jugador.
+        partidas (list): Historial completo, de más reciente a más antigua.
+        queue_id (int): Cola consultada.
+        inicio_temporada_ms (int): Inicio de la temporada en milisegundos.
+
+    Returns:
+        dict: Ver EstadoRachas.como_dict.
+    """
+    with _LOCK:
+        jugador = _JUGADORES.get(puuid)
+        nuevas = None
+        if jugador is not None and jugador['inicio_temporada_ms'] == inicio_temporada_ms:
+            checkpoint = jugador['checkpoint']
+            nuevas = []
+            for partida in partidas:
+                ts = partida.get('game_end_timestamp', 0)
+                if ts < checkpoint['timestamp']:
+                    break
+                if ts > checkpoint['timestamp'] or partida.get('match_id') not in checkpoint['ids']:
+                    nuevas.append(partida)
+            if checkpoint['partidas'] + len(nuevas) != len(partidas):
+                nuevas = None # Historial reordenado o con huecos: reconstrucción
+
+        if nuevas is None:
+            jugador = {'inicio_temporada_ms': inicio_temporada_ms,
+                       'colas': _reconstruir_jugador(partidas, inicio_temporada_ms)}
+            _JUGADORES[puuid] = jugador
+        else:
+            for partida in reversed(nuevas):
+                if partida.get('game_end_timestamp', 0) >= inicio_temporada_ms:
+                    jugador['colas'].setdefault(partida.get('queue_id'), EstadoRachas()).anadir(partida)
+
+        ultimo = partidas[0].get('game_end_timestamp', 0) if partidas else 0
+        ids = set()
+        for partida in partidas:
+            if partida.get('game_end_timestamp', 0) != ultimo:
+                break
+            ids.add(partida.get('match_id'))
+        jugador['checkpoint'] = {'timestamp': ultimo, 'ids': ids, 'partidas': len(partidas)}
+        return (jugador['colas'].get(queue_id) or EstadoRachas()).como_dict()
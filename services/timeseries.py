@@ -0,0 +1,88 @@
+# services/timeseries.py
+
+"""
+Retención por niveles y submuestreo de las series temporales de ELO.
+
+- Retención: resolución completa los últimos 7 días, agregados horarios dentro del
+  split activo y diarios para splits anteriores. Solo se aplica a los puntos que
+  se envían a los gráficos: el historial de LP guardado conserva todos sus tramos.
+- LTTB (Largest-Triangle-Three-Buckets): reduce una serie a N puntos conservando
+  su forma visual, para enviar al navegador tantos puntos como píxeles tenga el gráfico.
+
+Los timestamps están en milisegundos, como en el historial de partidas.
+"""
+RAW_RETENTION_MS = 7 * 24 * 3600 * 1000
+HOUR_MS = 3600 * 1000
+DAY_MS = 24 * HOUR_MS
+
+
+def _cubo(timestamp, ahora_ms, inicio_split_ms):
+    """Devuelve la clave del cubo de retención de un timestamp (None = resolución completa)."""
+    if timestamp >= ahora_ms - RAW_RETENTION_MS:
+        return None
+    if timestamp >= inicio_split_ms:
+        return ('h', timestamp // HOUR_MS)
+    return ('d', timestamp // DAY_MS)
+
+
+def aplicar_retencion(puntos, ahora_ms, inicio_split_ms):
+    """
+    Aplica la retención por niveles a una serie ordenada de puntos {'timestamp', 'elo'}.
+    Cada cubo horario o diario se resume en su último punto (el ELO con el que se cerró).
+    """
+    resultado = []
+    cubo_anterior = None
+    for punto in puntos:
+        cubo = _cubo(punto['timestamp'], ahora_ms, inicio_split_ms)
+        if cubo is not None and cubo == cubo_anterior:
+            resultado[-1] = punto
+        else:
+            resultado.append(punto)
+        cubo_anterior = cubo
+    return resultado
+
+
+def lttb(puntos, umbral, x='timestamp', y='elo'):
+    """
+    Submuestreo Largest-Triangle-Three-Buckets.
+
+    Args:
+        puntos (list): Serie ordenada por `x` (dicts con las claves x e y).
+        umbral (int): Número máximo de puntos a devolver (>= 3).
+
+    Returns:
+        list: Subconjunto de `puntos` (siempre incluye el primero y el último).
+    """
+    n = len(puntos)
+    if umbral >= n or umbral < 3:
+        return list(puntos)
+
+    muestreados = [puntos[0]]
+    tam_cubo = (n - 2) / (umbral - 2)
+    a = 0
+    for i in range(umbral - 2):
+        # Punto medio del cubo siguiente
+        inicio_sig = int((i + 1) * tam_cubo) + 1
+        fin_sig = min(int((i + 2) * tam_cubo) + 1, n)
+        cubo_sig = puntos[inicio_sig:fin_sig] or [puntos[-1]]
+        media_x = sum(p[x] for p in cubo_sig) / len(cubo_sig)
+        media_y = sum(p[y] for p in cubo_sig) / len(cubo_sig)
+
+        # Del cubo actual, el punto que forma el triángulo de mayor área con a y la media
+        inicio = int(i * tam_cubo) + 1
+        fin = int((i + 1) * tam_cubo) + 1
+        ax, ay = puntos[a][x], puntos[a][y]
+        mejor, mejor_area = inicio, -1
+        for j in range(inicio, fin):
+            area = abs((ax - media_x) * (puntos[j][y] - ay) - (ax - puntos[j][x]) * (media_y - ay))
+            if area > mejor_area:
+                mejor, mejor_area = j, area
+        muestreados.append(puntos[mejor])
+        a = mejor
+    muestreados.append(puntos[-1])
+    return muestreados
+
+
+def serie_para_grafico(puntos, ahora_ms, inicio_split_ms, ancho):
+    """Retención por niveles + LTTB a `ancho` puntos (uno por píxel como mucho)."""
+    return lttb(aplicar_retencion(puntos, ahora_ms, inicio_split_ms), max(int(ancho), 3))
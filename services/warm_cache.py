@@ -0,0 +1,130 @@
+# services/warm_cache.py
+
+"""
+Persistencia local de las cachés derivadas para un arranque en caliente.
+
+Cada caché se guarda como un JSON en disco junto con su versión de datos. Al
+reiniciar (p. ej. un deploy en Render) se recargan antes de servir la primera
+petición, y el refresco real ocurre en segundo plano.
+"""
+import os
+import json
+import time
+import threading
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WARM_CACHE_DIR = os.environ.get("WARM_CACHE_DIR", os.path.join(REPO_DIR, "cache_local"))
+WARM_CACHE_FORMAT_VERSION = 1
+
+_WRITE_LOCK = threading.Lock()
+
+
+def _ruta(nombre):
+    return os.path.join(WARM_CACHE_DIR, f"{nombre}.json")
+
+
+def escribir_atomico(ruta, escribir, modo="w"):
+    """
+    Escribe un fichero de forma atómica: `escribir(f)` vuelca el contenido en un temporal junto
+    al destino, que después se renombra con os.replace (ningún lector ve un fichero a medias).
+    Si algo falla se borra el temporal y la excepción se propaga.
+
+    Args:
+        ruta (str): Fichero de destino (su carpeta debe existir).
+        escribir (callable): Recibe el fichero temporal abierto.
+        modo (str): "w" (texto UTF-8) o "wb".
+    """
+    tmp = f"{ruta}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp, modo, encoding=None if "b" in modo else "utf-8") as f:
+            escribir(f)
+        os.replace(tmp, ruta)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def escribir_json_atomico(ruta, datos):
+    """Vuelca `datos` como JSON en `ruta` de forma atómica (ver escribir_atomico)."""
+    escribir_atomico(ruta, lambda f: json.dump(datos, f, ensure_ascii=False))
+
+
+def guardar_cache(nombre, datos, data_version, timestamp=None):
+    """
+    Guarda una caché en disco de forma atómica (fichero temporal + os.replace).
+
+    Args:
+        nombre (str): Nombre lógico de la caché (p. ej. 'leaderboard').
+        datos: Contenido serializable a JSON.
+        data_version (int): Versión de datos de la caché.
+        timestamp (float): Momento en que se calcularon los datos (segundos UTC).
+
+    Returns:
+        bool: True si se guardó correctamente.
+    """
+    payload = {
+        "format_version": WARM_CACHE_FORMAT_VERSION,
+        "data_version": data_version,
+        "timestamp": timestamp if timestamp is not None else time.time(),
+        "data": datos
+    }
+    try:
+        with _WRITE_LOCK:
+            os.makedirs(WARM_CACHE_DIR, exist_ok=True)
+            escribir_json_atomico(_ruta(nombre), payload)
+        return True
+    except (OSError, TypeError, ValueError) as e:
+        print(f"[warm_cache] Error guardando la caché '{nombre}': {e}")
+    return False
+
+
+def cargar_cache(nombre):
+    """
+    Carga una caché persistida.
+
+    Returns:
+        dict | None: {'data', 'data_version', 'timestamp'} o None si no existe,
+                     está corrupta o tiene un formato antiguo.
+    """
+    ruta = _ruta(nombre)
+    if not os.path.exists(ruta):
+        return None
+    try:
+        with open(ruta, "r", encoding="utf-8") as f:
+            payload = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"[warm_cache] Error leyendo la caché '{nombre}': {e}")
+        return None
+    if payload.get("format_version") != WARM_CACHE_FORMAT_VERSION:
+        print(f"[warm_cache] Formato de la caché '{nombre}' obsoleto. Se ignora.")
+        return None
+    return {
+        "data": payload.get("data"),
+        "data_version": payload.get("data_version", 0),
+        "timestamp": payload.get("timestamp", 0)
+    }
+
+
+def fecha_modificacion_cache(nombre):
+    """Devuelve el mtime del fichero de una caché persistida, o None si no existe."""
+    try:
+        return os.stat(_ruta(nombre)).st_mtime
+    except OSError:
+        return None
+
+
+def cargar_json_repo(ruta):
+    """Lee un JSON versionado en el propio repositorio (semilla de arranque). None si no existe."""
+    if not os.path.isabs(ruta):
+        ruta = os.path.join(REPO_DIR, ruta)
+    if not os.path.exists(ruta):
+        return None
+    try:
+        with open(ruta, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"[warm_cache] Error leyendo la semilla '{ruta}': {e}")
+    return None
@@ -0,0 +1,168 @@
+# services/window_aggregates.py
+
+"""
+Agregados por ventana deslizante (24h, 7 días y temporada) del historial de partidas.
+
+Cada jugador tiene un acumulador por cola y ventana con las sumas de partidas,
+victorias, LP, kills, muertes y asistencias. En cada refresco solo se recorren las
+partidas nuevas (al principio del historial, que va de más reciente a más antigua)
+y las que siguen dentro de la ventana de 7 días, por si se les ha rellenado el LP
+más tarde. Las partidas que salen de una ventana se restan al expirar.
+
+Si el historial cambia de otra forma (partidas antiguas recuperadas, partidas
+eliminadas o un cambio de temporada) el acumulador se reconstruye en una pasada.
+"""
+import bisect
+import threading
+from collections import deque
+
+from services.timeseries import DAY_MS
+
+VENTANAS = {
+    '24h': DAY_MS,
+    '7d': 7 * DAY_MS,
+    'season': None # Sin expiración: desde el inicio de temporada
+}
+VENTANA_MAXIMA_MS = max(d for d in VENTANAS.values() if d is not None)
+
+_CAMPOS = ('games', 'wins', 'lp_change', 'kills', 'deaths', 'assists')
+
+
+def _sumas_vacias():
+    return dict.fromkeys(_CAMPOS, 0)
+
+
+class AgregadosJugador:
+    """Acumuladores por (cola, ventana) del historial de un jugador."""
+
+    def __init__(self, inicio_temporada_ms):
+        self.inicio_temporada_ms = inicio_temporada_ms
+        self._reiniciar()
+
+    def _reiniciar(self):
+        self._contribuciones = {} # match_id -> aportación (None si es de otra temporada)
+        self._colas = {}          # (queue_id, ventana) -> deque[(timestamp, match_id)]
+        self._sumas = {}          # (queue_id, ventana) -> sumas
+
+    def _aplicar(self, clave, aportacion, signo):
+        sumas = self._sumas.setdefault(clave, _sumas_vacias())
+        sumas['games'] += signo
+        sumas['wins'] += signo * aportacion['win']
+        sumas['lp_change'] += signo * aportacion['lp']
+        sumas['kills'] += signo * aportacion['kills']
+        sumas['deaths'] += signo * aportacion['deaths']
+        sumas['assists'] += signo * aportacion['assists']
+
+    def _incorporar(self, partida, ahora_ms):
+        ts = partida.get('game_end_timestamp', 0)
+        if ts < self.inicio_temporada_ms:
+            self._contribuciones[partida['match_id']] = None
+            return
+        aportacion = {
+            'queue_id': partida.get('queue_id'),
+            'timestamp': ts,
+            'win': 1 if partida.get('win') else 0,
+            'lp': partida.get('lp_change_this_game') or 0,
+            'kills': partida.get('kills', 0),
+            'deaths': partida.get('deaths', 0),
+            'assists': partida.get('assists', 0),
+            'ventanas': set()
+        }
+        self._contribuciones[partida['match_id']] = aportacion
+        for nombre, duracion in VENTANAS.items():
+            if duracion is not None and ts <= ahora_ms - duracion:
+                continue
+            clave = (aportacion['queue_id'], nombre)
+            if duracion is not None:
+                cola = self._colas.setdefault(clave, deque())
+                if cola and ts < cola[-1][0]:
+                    # Llegada fuera de orden (rara): se inserta en su sitio
+                    ordenada = list(cola)
+                    bisect.insort(ordenada, (ts, partida['match_id']))
+                    self._colas[clave] = deque(ordenada)
+                else:
+                    cola.append((ts, partida['match_id']))
+            aportacion['ventanas'].add(nombre)
+            self._aplicar(clave, aportacion, 1)
+
+    def _actualizar_lp(self, partida):
+        """Ajusta las sumas si el LP de una partida ya contada ha cambiado (relleno posterior)."""
+        aportacion = self._contribuciones.get(partida['match_id'])
+        lp = partida.get('lp_change_this_game') or 0
+        if not aportacion or aportacion['lp'] == lp:
+            return
+        diferencia = lp - aportacion['lp']
+        aportacion['lp'] = lp
+        for nombre in aportacion['ventanas']:
+            self._sumas[(aportacion['queue_id'], nombre)]['lp_change'] += diferencia
+
+    def _expirar(self, ahora_ms):
+        for (queue_id, nombre), cola in self._colas.items():
+            limite = ahora_ms - VENTANAS[nombre]
+            while cola and cola[0][0] <= limite:
+                _, match_id = cola.popleft()
+                aportacion = self._contribuciones[match_id]
+                aportacion['ventanas'].discard(nombre)
+                self._aplicar((queue_id, nombre), aportacion, -1)
+
+    def actualizar(self, partidas, ahora_ms):
+        """
+        Incorpora las novedades del historial y expira lo que ha salido de cada ventana.
+
+        Args:
+            partidas (list): Historial completo del jugador, de más reciente a más antigua.
+            ahora_ms (int): Instante de referencia en milisegundos.
+
+        Returns:
+            int: Número de partidas recorridas (nuevas + las de la ventana de 7 días).
+        """
+        self._expirar(ahora_ms)
+        limite = ahora_ms - VENTANA_MAXIMA_MS
+        nuevas = []
+        recorridas = 0
+        for partida in partidas:
+            recorridas += 1
+            if partida.get('match_id') not in self._contribuciones:
+                nuevas.append(partida)
+            elif partida.get('game_end_timestamp', 0) <= limite:
+                break
+            else:
+                self._actualizar_lp(partida)
+
+        if len(self._contribuciones) + len(nuevas) != len(partidas):
+            # El historial no ha crecido solo por el principio: reconstrucción completa
+            self._reiniciar()
+            nuevas = list(partidas)
+            recorridas = len(partidas)
+
+        for partida in reversed(nuevas):
+            self._incorporar(partida, ahora_ms)
+        return recorridas
+
+    def resumen(self, queue_id, ventana):
+        """Devuelve {'games', 'wins', 'losses', 'lp_change', 'kills', 'deaths', 'assists', 'kda'}."""
+        sumas = dict(self._sumas.get((queue_id, ventana)) or _sumas_vacias())
+        sumas['losses'] = sumas['games'] - sumas['wins']
+        kills_y_asistencias = sumas['kills'] + sumas['assists']
+        sumas['kda'] = kills_y_asistencias / sumas['deaths'] if sumas['deaths'] > 0 else float(kills_y_asistencias)
+        return sumas
+
+
+_AGREGADOS = {}
+_LOCK = threading.Lock()
+
+
+def obtener_agregados(puuid, partidas, ahora_ms, inicio_temporada_ms):
+    """
+    Actualiza (incrementalmente) y devuelve los agregados por ventana de un jugador.
+
+    Returns:
+        AgregadosJugador: Acumuladores listos para consultar con `resumen`.
+    """
+    with _LOCK:
+        agregados = _AGREGADOS.get(puuid)
+        if agregados is None or agregados.inicio_temporada_ms != inicio_temporada_ms:
+            agregados = AgregadosJugador(inicio_temporada_ms)
+            _AGREGADOS[puuid] = agregados
+        agregados.actualizar(partidas, ahora_ms)
+        return agregados